@@ -0,0 +1,12 @@
+"""Measure how fast lint381 is on large synthetic corpora.
+
+Run the suite, and compare it against a saved baseline:
+
+    $ python -m benchmarks run --output=baseline.json
+    $ python -m benchmarks run --output=results.json
+    $ python -m benchmarks compare baseline.json results.json
+
+The corpora are generated from the snippets in `test/integ` (see
+`corpus.py`), and each benchmark is a rate, where higher is faster (see
+`suite.py`).
+"""
@@ -0,0 +1,109 @@
+"""Run the benchmarks, and compare their results against a baseline."""
+import collections
+import json
+import tempfile
+
+import click
+
+from .corpus import VARIANTS, write_corpus
+from .suite import (
+    BENCHMARKS,
+    compare,
+    environment,
+    format_comparisons,
+    run_suite,
+)
+
+
+@click.group()
+def main():
+    """Measure how fast lint381 is on large synthetic corpora."""
+
+
+@main.command()
+@click.option("--output", "-o", type=click.Path(dir_okay=False),
+              default="benchmarks.json", show_default=True,
+              help="The file to write the results to, as JSON.")
+@click.option("--scale", type=float, default=1.0,
+              show_default=True,
+              help="How much to multiply the number and size of the files "
+                   "in the corpus by.")
+@click.option("--seed", type=int, default=0, show_default=True,
+              help="The seed to generate the corpus with.")
+@click.option("--repeat", type=click.IntRange(min=1), default=3,
+              show_default=True,
+              help="The number of times to run each benchmark. The fastest "
+                   "run is kept.")
+@click.option("--variant", "variants", type=click.Choice(list(VARIANTS)),
+              multiple=True,
+              help="Only generate this variant of the corpus. Can be passed "
+                   "more than once.")
+@click.option("--benchmark", "benchmarks", type=click.Choice(BENCHMARKS),
+              multiple=True,
+              help="Only run this kind of benchmark. Can be passed more than "
+                   "once.")
+@click.option("--corpus", "corpus_dir",
+              type=click.Path(file_okay=False),
+              help="The directory to write the corpus to, to inspect it "
+                   "afterwards. Defaults to a temporary directory.")
+def run(output, scale, seed, repeat, variants, benchmarks, corpus_dir):
+    """Generate a corpus and run the benchmarks on it."""
+    if scale <= 0:
+        raise click.BadParameter("must be positive", param_hint="--scale")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus = write_corpus(corpus_dir or temp_dir,
+                              scale=scale,
+                              seed=seed,
+                              variants=variants or None)
+        results = run_suite(corpus,
+                            repeat=repeat,
+                            benchmarks=benchmarks or None,
+                            log=lambda name: click.echo(name, err=True))
+
+    log = collections.OrderedDict([
+        ("environment", environment()),
+        ("corpus", collections.OrderedDict([
+            ("scale", scale),
+            ("seed", seed),
+            ("files", sum(len(i) for i in corpus.values())),
+        ])),
+        ("results", results),
+    ])
+    with open(output, "w") as f:
+        json.dump(log, f, indent=2)
+        f.write("\n")
+    click.echo("Wrote {} results to {}".format(len(results), output),
+               err=True)
+
+
+@main.command("compare")
+@click.argument("baseline", type=click.File())
+@click.argument("results", type=click.File())
+@click.option("--threshold", type=float, default=0.1,
+              show_default=True,
+              help="How much slower a benchmark may get before it counts as "
+                   "a regression, as a fraction of the baseline.")
+def compare_command(baseline, results, threshold):
+    """Compare RESULTS against a BASELINE from `run`.
+
+    Exits with a non-zero status if any benchmark regressed.
+    """
+    baseline = json.load(baseline)
+    results = json.load(results)
+    if baseline["corpus"] != results["corpus"]:
+        click.echo("Warning: the corpora differ, so the results may not be "
+                   "comparable", err=True)
+
+    comparisons = compare(baseline["results"], results["results"],
+                          threshold=threshold)
+    click.echo(format_comparisons(comparisons), nl=False)
+
+    regressions = [i for i in comparisons if i.regressed]
+    if regressions:
+        click.echo("{} of {} benchmarks regressed by more than {:.0%}".format(
+            len(regressions), len(comparisons), threshold), err=True)
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
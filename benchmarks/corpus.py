@@ -0,0 +1,191 @@
+"""Generates realistic C and C++ source files to benchmark on.
+
+The files are made by joining the snippets in `test/integ` in a random (but
+reproducible) order:
+
+    write_corpus("corpus", scale=0.5)
+    # corpus/small/c/file0000.c, ..., corpus/huge/cpp/file0001.cpp, ...
+
+Each variant stresses a different part of linting. See `VARIANTS`.
+"""
+import collections
+import os
+import os.path
+import random
+
+from lint381 import EXTENSIONS, LANGUAGES
+
+SNIPPET_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "test", "integ")
+"""The directory of the snippets, with a subdirectory for each language."""
+
+Variant = collections.namedtuple("Variant", [
+    "num_files",
+    "file_size",
+    "comments",
+    "includes",
+])
+"""The shape of the files of a variant of the corpus.
+
+:ivar int num_files: The number of files of each language, at scale 1.
+:ivar int file_size: The size of the code in each file after the includes,
+    in bytes, at scale 1.
+:ivar float comments: The fraction of snippets which are followed by a
+    comment.
+:ivar int includes: The number of `#include`s at the top of each file.
+"""
+
+VARIANTS = collections.OrderedDict([
+    # Startup and per-file costs, such as reading and caching.
+    ("small", Variant(num_files=200, file_size=2048, comments=0.1,
+                      includes=3)),
+    # Costs which grow with the size of a file, such as rendering.
+    ("huge", Variant(num_files=2, file_size=262144, comments=0.1,
+                     includes=3)),
+    # Tokenizing long comments, which the checks skip over.
+    ("comments", Variant(num_files=20, file_size=16384, comments=1.0,
+                         includes=3)),
+    # The include analyses, which look at every `#include`.
+    ("includes", Variant(num_files=20, file_size=16384, comments=0.1,
+                         includes=200)),
+])
+"""The variants of the corpus, by name."""
+
+_COMMENTS = [
+    "// {word} the {word} before checking the {word}.\n",
+    "/* {word}: {word} {word} {word}, {word} {word}. */\n",
+    "/*\n * {word} {word} {word}.\n *\n * {word} {word} {word} {word}.\n"
+    " */\n",
+]
+"""Templates of the comments to add between snippets."""
+
+_WORDS = ["update", "list", "buffer", "index", "record", "pointer", "node",
+          "count", "name", "result", "table", "entry"]
+"""The words to fill comments with."""
+
+_SYSTEM_HEADERS = {
+    "c": ["stdio.h", "stdlib.h", "string.h", "assert.h", "ctype.h"],
+    "cpp": ["vector", "string", "map", "algorithm", "iostream", "memory"],
+}
+"""The system headers to include, for each language."""
+
+
+def read_snippets(lang, directory=SNIPPET_DIRECTORY):
+    """Read the snippets of a language.
+
+    :param str lang: The language, one of the keys of `LANGUAGES`.
+    :param str directory: The directory of the snippets.
+    :returns list: The source code of each snippet, in order of file name.
+    """
+    lang_directory = os.path.join(directory, lang)
+    snippets = []
+    for name in sorted(os.listdir(lang_directory)):
+        if os.path.splitext(name)[1] in EXTENSIONS[lang]:
+            with open(os.path.join(lang_directory, name)) as f:
+                snippets.append(f.read())
+    return snippets
+
+
+def generate_file(snippets, lang, variant, size, rng):
+    """Generate the source code of a file.
+
+    :param list snippets: The snippets to join.
+    :param str lang: The language of the file.
+    :param Variant variant: The shape of the file.
+    :param int size: The size of the snippets in the file, in bytes, after
+        the includes. The file ends after the first snippet which reaches
+        this size.
+    :param random.Random rng: The random number generator.
+    :returns str: The source code.
+    """
+    headers = _SYSTEM_HEADERS[lang]
+    parts = []
+    for i in range(variant.includes):
+        if i % 2:
+            parts.append("#include <{}>\n".format(headers[i % len(headers)]))
+        else:
+            parts.append('#include "module{}.h"\n'.format(i))
+    parts.append("\n")
+
+    length = 0
+    while length < size:
+        snippet = rng.choice(snippets)
+        if not snippet.endswith("\n"):
+            snippet += "\n"
+        parts.append(snippet)
+        length += len(snippet)
+
+        if rng.random() < variant.comments:
+            template = rng.choice(_COMMENTS)
+            comment = template.format_map(_RandomWords(rng))
+            parts.append(comment)
+            length += len(comment)
+    return "".join(parts)
+
+
+class _RandomWords(dict):
+    """Fills each field of a template with a random word."""
+
+    def __init__(self, rng):
+        """Choose the words with a random number generator.
+
+        :param random.Random rng: The random number generator.
+        """
+        super().__init__()
+        self._rng = rng
+
+    def __missing__(self, key):
+        """Choose a word for a field.
+
+        :param str key: The name of the field.
+        :returns str:
+        """
+        return self._rng.choice(_WORDS)
+
+
+def generate_corpus(*, scale=1.0, seed=0, variants=None, langs=None,
+                    directory=SNIPPET_DIRECTORY):
+    """Generate the files of a corpus.
+
+    :param float scale: How much to multiply the number and size of the
+        files by.
+    :param int seed: The seed of the random number generator. The same seed
+        always generates the same corpus.
+    :param list variants: The names of the variants to generate, or `None`
+        for all of `VARIANTS`.
+    :param list langs: The languages to generate, or `None` for all of
+        `LANGUAGES`.
+    :param str directory: The directory of the snippets.
+    :yields tuple: The variant, language, relative path and source code of
+        each file.
+    """
+    for variant_name in variants or VARIANTS:
+        variant = VARIANTS[variant_name]
+        for lang in langs or sorted(LANGUAGES):
+            snippets = read_snippets(lang, directory)
+            rng = random.Random("{}:{}:{}".format(seed, variant_name, lang))
+            num_files = max(1, round(variant.num_files * scale))
+            size = max(1, round(variant.file_size * scale))
+            extension = EXTENSIONS[lang][0]
+            for i in range(num_files):
+                path = os.path.join(variant_name, lang,
+                                    "file{:04}{}".format(i, extension))
+                yield (variant_name, lang, path,
+                       generate_file(snippets, lang, variant, size, rng))
+
+
+def write_corpus(root, **kwargs):
+    """Write a corpus to disk.
+
+    :param str root: The directory to write the files under.
+    :param kwargs: The options for `generate_corpus`.
+    :returns dict: The paths of the files written, by variant and language.
+    """
+    paths = collections.OrderedDict()
+    for variant, lang, path, code in generate_corpus(**kwargs):
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(code)
+        paths.setdefault((variant, lang), []).append(path)
+    return paths
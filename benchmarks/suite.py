@@ -0,0 +1,304 @@
+"""The benchmarks, and comparing their results against a baseline.
+
+Each benchmark measures a rate, where higher is faster:
+
+  * `tokenize/LANG/VARIANT`: tokens per second produced by `tokenize`.
+  * `match_tokens/LANG/VARIANT`: matches per second found by `match_tokens`,
+    with the patterns of every check of the language.
+  * `rule/LANG/NAME`: tokens per second linted by a single check, across the
+    whole corpus of the language. Slow checks have low rates.
+  * `cli/VARIANT`: files per second linted by the `lint381` executable,
+    including starting up, in one process and without the cache.
+
+Every benchmark is run several times, and the fastest run is kept, since
+slower runs are slowed down by other processes rather than by lint381.
+"""
+import collections
+import os
+import os.path
+import platform
+import subprocess
+import sys
+import time
+
+from lint381 import __version__, get_linter
+from lint381.linter import SourceCode
+from lint381.profiling import Profile
+from lint381.tokenizer import tokenize
+
+BENCHMARKS = ["tokenize", "match_tokens", "rule", "cli"]
+"""The kinds of benchmarks, in the order that they're run."""
+
+_UNITS = {
+    "tokenize": "tokens/s",
+    "match_tokens": "matches/s",
+    "rule": "tokens/s",
+    "cli": "files/s",
+}
+"""The unit of the rate of each kind of benchmark."""
+
+_CLI = "from lint381.__main__ import main; main()"
+"""Runs the `lint381` executable, without needing it to be installed."""
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+"""The directory of the repository, which `lint381` is imported from."""
+
+
+def best_time(func, repeat):
+    """Time the fastest of several calls to a function.
+
+    :param function func: The function, which takes no arguments.
+    :param int repeat: The number of times to call it.
+    :returns tuple: The fastest time in seconds, and the result of the
+        function.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def _measurement(kind, seconds, count):
+    """Make the result of a benchmark.
+
+    :param str kind: The kind of benchmark, one of `BENCHMARKS`.
+    :param float seconds: The time taken.
+    :param int count: The number of things done in that time.
+    :returns dict:
+    """
+    return {
+        "rate": count / seconds if seconds else 0.0,
+        "unit": _UNITS[kind],
+        "seconds": seconds,
+        "count": count,
+    }
+
+
+def bench_tokenize(codes, repeat):
+    """Measure how fast source code is tokenized.
+
+    :param list codes: The source code of each file.
+    :param int repeat: The number of times to run the benchmark.
+    :returns dict: The result.
+    """
+    def run():
+        return sum(len(tokenize(i)) for i in codes)
+    seconds, count = best_time(run, repeat)
+    return _measurement("tokenize", seconds, count)
+
+
+def bench_match_tokens(files, lang, repeat):
+    """Measure how fast the patterns of the checks are matched.
+
+    :param list files: The file name and tokens of each file.
+    :param str lang: The language of the files.
+    :param int repeat: The number of times to run the benchmark.
+    :returns dict: The result.
+    """
+    decorators = [i.matched_tokens for i in get_linter(lang).linters
+                  if hasattr(i, "matched_tokens")]
+
+    def run():
+        count = 0
+        for filename, tokens in files:
+            # The indexes used to find candidates are built in each run.
+            source = SourceCode(filename=filename, tokens=tokens)
+            for decorator in decorators:
+                count += sum(1 for _ in decorator.iter_matches(source))
+        return count
+    seconds, count = best_time(run, repeat)
+    return _measurement("match_tokens", seconds, count)
+
+
+def bench_rules(files, lang, repeat):
+    """Measure how long each check of a language takes.
+
+    :param list files: The file name and tokens of each file.
+    :param str lang: The language of the files.
+    :param int repeat: The number of times to run the benchmark.
+    :returns dict: The result for each check, by name. Checks which never
+        ran, because nothing in the files could match them, are left out.
+    """
+    linter = get_linter(lang)
+    num_tokens = sum(len(tokens) for _, tokens in files)
+    best = {}
+    for _ in range(repeat):
+        profile = Profile()
+        for filename, tokens in files:
+            source = SourceCode(filename=filename, tokens=tokens)
+            linter.dispatcher.lint(source, profile=profile)
+
+        for name, (_, own_time, _) in profile.stats.items():
+            if name.startswith("rule:"):
+                name = name[len("rule:"):]
+                best[name] = min(best.get(name, own_time), own_time)
+    return collections.OrderedDict(
+        (name, _measurement("rule", best[name], num_tokens))
+        for name in sorted(best))
+
+
+def bench_cli(paths, repeat):
+    """Measure how fast the `lint381` executable lints files.
+
+    :param list paths: The paths of the files.
+    :param int repeat: The number of times to run the benchmark.
+    :returns dict: The result.
+    """
+    args = [sys.executable, "-c", _CLI, "--no-cache", "--jobs", "1"]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [_ROOT] + [i for i in [env.get("PYTHONPATH")] if i])
+
+    def run():
+        subprocess.run(args + paths, env=env, stdout=subprocess.DEVNULL)
+    seconds, _ = best_time(run, repeat)
+    return _measurement("cli", seconds, len(paths))
+
+
+def run_suite(corpus, *, repeat=3, benchmarks=None, log=None):
+    """Run the benchmarks on a corpus.
+
+    :param dict corpus: The paths of the files of each variant and
+        language, from `write_corpus`.
+    :param int repeat: The number of times to run each benchmark.
+    :param list benchmarks: The kinds of benchmarks to run, or `None` for
+        all of `BENCHMARKS`.
+    :param function log: Called with the name of each benchmark before it's
+        run, or `None`.
+    :returns dict: The results of the benchmarks, by name.
+    """
+    benchmarks = benchmarks or BENCHMARKS
+    log = log or (lambda name: None)
+    results = collections.OrderedDict()
+
+    codes = {}
+    tokens = collections.defaultdict(list)
+    for (variant, lang), paths in corpus.items():
+        codes[variant, lang] = []
+        for path in paths:
+            with open(path) as f:
+                code = f.read()
+            codes[variant, lang].append(code)
+            tokens[variant, lang].append((os.path.basename(path),
+                                          tokenize(code)))
+
+    for (variant, lang), files in tokens.items():
+        if "tokenize" in benchmarks:
+            name = "tokenize/{}/{}".format(lang, variant)
+            log(name)
+            results[name] = bench_tokenize(codes[variant, lang], repeat)
+        if "match_tokens" in benchmarks:
+            name = "match_tokens/{}/{}".format(lang, variant)
+            log(name)
+            results[name] = bench_match_tokens(files, lang, repeat)
+
+    if "rule" in benchmarks:
+        for lang in sorted({lang for _, lang in tokens}):
+            log("rule/{}".format(lang))
+            files = [i for (_, file_lang), lang_files in tokens.items()
+                     if file_lang == lang for i in lang_files]
+            for name, result in bench_rules(files, lang, repeat).items():
+                results["rule/{}/{}".format(lang, name)] = result
+
+    if "cli" in benchmarks:
+        variants = collections.OrderedDict()
+        for (variant, _), paths in corpus.items():
+            variants.setdefault(variant, []).extend(paths)
+        for variant, paths in variants.items():
+            name = "cli/{}".format(variant)
+            log(name)
+            results[name] = bench_cli(paths, repeat)
+    return results
+
+
+def environment():
+    """Describe what the benchmarks are being run on.
+
+    :returns dict:
+    """
+    return collections.OrderedDict([
+        ("lint381", __version__),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("cpus", os.cpu_count()),
+    ])
+
+
+Comparison = collections.namedtuple("Comparison", [
+    "name",
+    "baseline",
+    "current",
+    "change",
+    "regressed",
+])
+"""The change in a benchmark since the baseline.
+
+:ivar str name: The name of the benchmark.
+:ivar dict baseline: The baseline result, or `None` if it's new.
+:ivar dict current: The current result, or `None` if it wasn't run.
+:ivar float change: The relative change in the rate, such as -0.1 for 10%
+    slower, or `None` if either result is missing.
+:ivar bool regressed: Whether the rate dropped by more than the threshold.
+"""
+
+
+def compare(baseline, results, *, threshold):
+    """Compare the results of benchmarks against a baseline.
+
+    :param dict baseline: The baseline results, by name.
+    :param dict results: The current results, by name.
+    :param float threshold: How much a rate may drop before it counts as a
+        regression, such as 0.1 for 10%.
+    :returns list: The `Comparison` of each benchmark in either, in order of
+        name.
+    """
+    comparisons = []
+    for name in sorted(set(baseline) | set(results)):
+        old = baseline.get(name)
+        new = results.get(name)
+        change = None
+        if old is not None and new is not None and old["rate"]:
+            change = new["rate"] / old["rate"] - 1
+        comparisons.append(Comparison(
+            name=name,
+            baseline=old,
+            current=new,
+            change=change,
+            regressed=change is not None and change < -threshold,
+        ))
+    return comparisons
+
+
+def format_comparisons(comparisons):
+    """Render comparisons as a table.
+
+    :param list comparisons: The `Comparison`s.
+    :returns str:
+    """
+    width = max([len("benchmark")] + [len(i.name) for i in comparisons])
+    line = "{:<{width}}  {:>14}  {:>14}  {:>8}  {}\n"
+    output = line.format("benchmark", "baseline", "current", "change", "",
+                         width=width).rstrip(" \n") + "\n"
+    for comparison in comparisons:
+        old, new = comparison.baseline, comparison.current
+        if old is None:
+            change = "new"
+        elif new is None:
+            change = "missing"
+        elif comparison.change is None:
+            change = "-"
+        else:
+            change = "{:+.1%}".format(comparison.change)
+        output += line.format(
+            comparison.name,
+            "-" if old is None else "{:.1f}".format(old["rate"]),
+            "-" if new is None else "{:.1f}".format(new["rate"]),
+            change,
+            "REGRESSION" if comparison.regressed else "",
+            width=width,
+        ).rstrip(" \n") + "\n"
+    return output
@@ -20,6 +20,12 @@
 ;;
 ;; (setq flycheck-lint381-language "c")
 
+;; Checks are faster if you keep a lint381 server running, by running
+;;
+;;   lint381 --serve &
+;;
+;; when you log in. Otherwise, the client lints the file itself.
+
 ;;; Notes:
 
 ;; The writer of this file assumes that if you're using this, you're
@@ -43,7 +49,7 @@
 (flycheck-define-checker c/c++-lint381
   "A c++ style checker based on the lint381 tool.
 See URL `https://github.com/arxanas/lint381'."
-  :command ("lint381"
+  :command ("lint381-client"
             (option "--lang=" flycheck-lint381-language concat)
             source)
   :error-patterns
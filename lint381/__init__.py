@@ -1 +1,47 @@
 """Lint source code for EECS 381."""
+import importlib
+
+__version__ = "1.3.9"
+
+LANGUAGES = {
+    "c": "lint381.c",
+    "cpp": "lint381.cpp",
+}
+"""A map of language to the module which defines its linter."""
+
+EXTENSIONS = {
+    "c": [".c", ".h"],
+    "cpp": [".cpp", ".h"],
+}
+"""A map of language to the file extensions of its source files."""
+
+_SELECTED_LINTERS = {}
+"""The linters made by `get_linter` for a selection of checks."""
+
+
+def get_linter(lang, *, select=None, ignore=None):
+    """Get the linter for a language.
+
+    Only the module for that language (and the modules it uses) is imported,
+    so this is cheaper than importing every linter up front.
+
+    :param str lang: The language, one of the keys of `LANGUAGES`.
+    :param list select: The names of the linting functions to run, or `None`
+        to run all of them. See `Linter.select`.
+    :param list ignore: The names of the linting functions not to run, or
+        `None`.
+    :returns Linter: The linter. The same linter is returned for the same
+        selection, so that its dispatcher is only built once.
+    :raises KeyError: The language isn't supported.
+    :raises ValueError: A name isn't the name of a linting function.
+    """
+    linter = importlib.import_module(LANGUAGES[lang]).linter
+    if select is None and ignore is None:
+        return linter
+
+    key = (lang,
+           None if select is None else tuple(sorted(set(select))),
+           None if ignore is None else tuple(sorted(set(ignore))))
+    if key not in _SELECTED_LINTERS:
+        _SELECTED_LINTERS[key] = linter.select(select, ignore)
+    return _SELECTED_LINTERS[key]
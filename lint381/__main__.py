@@ -1,81 +1,770 @@
 """Run the linter on the specified source code files."""
+import collections
+import contextlib
+import itertools
+import os
 import os.path
+import re
+import sys
 
 import click
 
-from .c import linter as c_linter
-from .cpp import linter as cpp_linter
+from . import get_linter, LANGUAGES
+from .cache import CachedResult, default_directory, LintCache, rule_names
+from .client import default_socket_path
+from .config import find_config, load_config, parse_names
+from .discover import (
+    detect_language,
+    is_source_file,
+    iter_file_list,
+    iter_files,
+)
+from .output import (
+    error_position,
+    error_record,
+    failure_record,
+    format_error,
+    format_message,
+    format_record,
+    FORMATS,
+    SARIF_FOOTER,
+    SARIF_SEPARATOR,
+    sarif_header,
+)
+from .profiling import Profile, timer
+from .tokenizer import DEFAULT_TAB_WIDTH, iter_tokens, LineTable, map_file
 
+_Task = collections.namedtuple("_Task", ["path", "code", "rows", "lang"])
+"""A file to lint.
 
-_LINTERS = {
-    "c": c_linter,
-    "cpp": cpp_linter,
-}
-"""A map of language to linter."""
+:ivar str path: The path to the file, or "-" for standard input.
+:ivar str code: The source code of the file, or `None` to read it from
+    `path`.
+:ivar list rows: The pairs of the first and last rows to report errors on,
+    or `None` to report errors anywhere.
+:ivar str lang: The language of the file.
+"""
+
+_TASKS_PER_JOB = 4
+"""The number of files to queue per worker while files are still found."""
+
+
+def _parse_range(ctx, param, value):
+    """Parse the value of the `--range` option.
+
+    :param click.Context ctx: The command's context.
+    :param click.Parameter param: The option.
+    :param str value: The value, such as `10:20`, or `None`.
+    :returns tuple: The start and end offsets, or `None`.
+    :raises click.BadParameter: The value isn't a valid range.
+    """
+    if value is None:
+        return None
+
+    match = re.match(r"^(\d+):(\d+)$", value)
+    if not match or int(match.group(1)) > int(match.group(2)):
+        raise click.BadParameter("Expected START:END, where START <= END")
+    return int(match.group(1)), int(match.group(2))
+
+
+def _load_config(ctx, param, value):
+    """Read the defaults of the other options from a configuration file.
+
+    :param click.Context ctx: The command's context.
+    :param click.Parameter param: The option.
+    :param str value: The path to the configuration file, or `None` to look
+        for one (see `lint381.config`).
+    :raises click.BadParameter: The file couldn't be read.
+    """
+    try:
+        if value is None:
+            value = find_config()
+        config = load_config(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    ctx.default_map = dict(config, **(ctx.default_map or {}))
+
+
+def _parse_names(ctx, param, value):
+    """Parse the value of the `--select` or `--ignore` option.
+
+    :param click.Context ctx: The command's context.
+    :param click.Parameter param: The option.
+    :param str value: The names of checks, separated by commas, or `None`.
+    :returns tuple: The names, or `None`.
+    """
+    return parse_names(value)
+
+
+def _check_files_from(ctx, param, value):
+    """Check that the file passed to `--files-from` exists.
+
+    :param click.Context ctx: The context.
+    :param click.Parameter param: The option.
+    :param str value: The path to the file, or "-" for standard input.
+    :returns str: The path.
+    """
+    if value is None or value == "-":
+        return value
+    return click.Path(exists=True, dir_okay=False).convert(value, param, ctx)
 
 
 @click.command()
-@click.argument("files", nargs=-1, type=click.File())
-@click.option("--lang", type=click.Choice(_LINTERS.keys()), default="cpp")
-def main(files, lang):
-    """Lint the files specified on the command-line."""
-    linter = _LINTERS[lang]
-
-    had_errors = False
-    for file in files:
-        # The tokenizer doesn't handle tabs, so don't pass any in.
-        code = file.read().replace("\t", " " * 4)
-
-        filename = os.path.basename(file.name)
-        errors = linter.lint(filename, code)
-        if errors:
-            had_errors = True
-
-        # Display errors in the order that their tokens appear, rather than in
-        # the order that we found the errors.
-        errors.sort(key=lambda error: error.tokens[0].start)
-
-        for error in errors:
-            location = error.tokens[0].start
-            _print_error(error, filename, location)
-            _print_tokens(error, code)
-
-    if had_errors:
+@click.argument("files",
+                nargs=-1,
+                type=click.Path(exists=True, readable=False, allow_dash=True))
+@click.option("--config", type=click.Path(exists=True, dir_okay=False),
+              is_eager=True, expose_value=False, callback=_load_config,
+              help="Read the defaults of the other options from the "
+                   "[lint381] section of this file. Defaults to the nearest "
+                   "lint381.cfg or setup.cfg with that section.")
+@click.option("--lang", type=click.Choice(LANGUAGES.keys()),
+              help="The language of the files. Defaults to detecting it "
+                   "from each file's extension, and for headers, from its "
+                   "contents.")
+@click.option("--select", metavar="CHECKS", callback=_parse_names,
+              help="Only run these checks, separated by commas.")
+@click.option("--ignore", metavar="CHECKS", callback=_parse_names,
+              help="Don't run these checks, separated by commas.")
+@click.option("--files-from", callback=_check_files_from,
+              help="Also lint the files listed in this file, or in standard "
+                   "input for -, one per line or separated by NUL "
+                   "characters. Files are linted as they are read.")
+@click.option("--stdin", "use_stdin", is_flag=True,
+              help="Lint standard input, as if - was passed.")
+@click.option("--stdin-filename", metavar="PATH",
+              help="The path of the file being linted from standard input, "
+                   "which is used to report errors and detect its "
+                   "language. It doesn't have to exist.")
+@click.option("--include", metavar="GLOB", multiple=True,
+              help="In directories, only lint the files which match this "
+                   "glob, instead of those with a source file extension. Can "
+                   "be passed more than once.")
+@click.option("--exclude", metavar="GLOB", multiple=True,
+              help="In directories, skip the files and directories which "
+                   "match this glob. Can be passed more than once.")
+@click.option("--mmap", "use_mmap", is_flag=True,
+              help="Memory-map each file and lint its tokens as they are "
+                   "produced, rather than reading the whole file into memory.")
+@click.option("--tab-width", type=click.IntRange(min=1),
+              default=DEFAULT_TAB_WIDTH,
+              help="The number of columns between tab stops.")
+@click.option("--format", "output_format", type=click.Choice(FORMATS),
+              default="text",
+              help="Print the errors as text, as JSON Lines, or as a SARIF "
+                   "log, for other tools to read.")
+@click.option("--range", "code_range", metavar="START:END",
+              callback=_parse_range,
+              help="Only report errors in this range of character offsets "
+                   "of each file, and only lint the code around it.")
+@click.option("--diff", "diff_ref", metavar="REF",
+              help="Only lint the files changed since this git commit, and "
+                   "only report errors on the changed lines. Without FILES, "
+                   "lint every changed source file.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1),
+              help="The number of files to lint in parallel. Defaults to the "
+                   "number of CPUs.")
+@click.option("--max-errors", type=click.IntRange(min=1), metavar="N",
+              help="Stop linting once N errors have been reported.")
+@click.option("--fail-fast", is_flag=True,
+              help="Stop linting once an error has been reported. The same "
+                   "as --max-errors=1.")
+@click.option("--no-cache", is_flag=True,
+              help="Don't reuse or store the errors of files linted before.")
+@click.option("--serve", is_flag=True,
+              help="Instead of linting files, serve requests from "
+                   "lint381-client until interrupted.")
+@click.option("--socket", "socket_path", type=click.Path(dir_okay=False),
+              help="The path of the socket to serve requests on.")
+@click.option("--profile", "use_profile", is_flag=True,
+              help="Print how long reading, tokenizing, matching, each "
+                   "check and rendering took, to standard error.")
+@click.option("--profile-output", type=click.Path(dir_okay=False),
+              help="With --profile, also write the timings to this file, "
+                   "which can be loaded with pstats.")
+def main(files, lang, select, ignore, files_from, use_stdin, stdin_filename,
+         include, exclude, use_mmap, tab_width, output_format, code_range,
+         diff_ref, jobs, max_errors, fail_fast, no_cache, serve, socket_path,
+         use_profile, profile_output):
+    """Lint the files specified on the command-line.
+
+    Directories are linted recursively.
+    """
+    if serve:
+        _serve(socket_path or default_socket_path())
+        return
+
+    _check_names([lang] if lang is not None else sorted(LANGUAGES),
+                 select, ignore)
+
+    if fail_fast:
+        max_errors = 1
+
+    if use_stdin and "-" not in files:
+        files += ("-",)
+    if files_from == "-" and "-" in files:
+        raise click.UsageError("--files-from - can't be used with standard "
+                               "input")
+
+    # Errors are written without flushing, and only styled for a terminal,
+    # so that files with many errors are printed quickly.
+    stdout = click.get_text_stream("stdout")
+    color = stdout.isatty()
+
+    cache_dir = None if no_cache else default_directory()
+    options = {
+        "select": select,
+        "ignore": ignore,
+        "stdin_filename": stdin_filename,
+        "use_mmap": use_mmap,
+        "tab_width": tab_width,
+        "output_format": output_format,
+        "color": color,
+        "code_range": code_range,
+        "cache_dir": cache_dir,
+        "use_profile": use_profile,
+        "max_errors": max_errors,
+    }
+
+    if files_from is not None:
+        if files_from == "-":
+            list_file = sys.stdin.buffer
+        else:
+            list_file = open(files_from, "rb")
+            click.get_current_context().call_on_close(list_file.close)
+        files = itertools.chain(files, iter_file_list(list_file))
+
+    discover_options = {"lang": lang, "include": include, "exclude": exclude}
+    if diff_ref is not None:
+        tasks = _changed_files(diff_ref, tuple(files), code_range,
+                               **discover_options)
+    else:
+        # Standard input can only be read from this process.
+        tasks = ((path, sys.stdin.read() if path == "-" else None, None)
+                 for path in iter_files(files, **discover_options))
+    tasks = (_Task(path, code, rows,
+                   _file_language(path, lang, stdin_filename, code))
+             for path, code, rows in tasks)
+    if files_from is None or diff_ref is not None:
+        tasks = list(tasks)
+
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if isinstance(tasks, list):
+        jobs = min(jobs, len(tasks))
+
+    if jobs <= 1:
+        # Files are only linted as the results are needed, so that no more
+        # are linted once enough errors have been reported.
+        results = (_lint_file(*task, **options) for task in tasks)
+    else:
+        results = _lint_files_parallel(tasks, options, jobs)
+
+    if output_format == "sarif":
+        stdout.write(sarif_header())
+
+    num_errors = 0
+    profile = Profile()
+    with contextlib.closing(results):
+        for output, file_profile in results:
+            # When linting in this process, each error is printed as soon as
+            # it's found.
+            if max_errors is not None:
+                output = itertools.islice(output, max_errors - num_errors)
+            for error_output in output:
+                if output_format == "sarif" and num_errors:
+                    error_output = SARIF_SEPARATOR + error_output
+                num_errors += 1
+                stdout.write(error_output)
+            stdout.flush()
+            if file_profile is not None:
+                profile.merge(file_profile)
+            if max_errors is not None and num_errors >= max_errors:
+                break
+
+    if output_format == "sarif":
+        stdout.write(SARIF_FOOTER)
+        stdout.flush()
+
+    if cache_dir is not None:
+        LintCache(cache_dir).prune()
+
+    if use_profile:
+        click.echo(profile.format_table(), err=True, nl=False)
+        if profile_output is not None:
+            profile.dump_stats(profile_output)
+
+    if num_errors:
         raise SystemExit(1)
 
 
-def _print_error(error, filename, location):
-    """Print the error message."""
-    message = ""
-    message += click.style("{filename}:{row}:{column}: "
-                           .format(filename=filename,
-                                   row=location.row + 1,
-                                   column=location.column + 1),
-                           bold=True)
-    message += click.style("error: ",
-                           fg="red",
-                           bold=True)
-    message += error.message
-    click.echo(message)
+def _check_names(langs, select, ignore):
+    """Check the names passed to `--select` and `--ignore`.
+
+    :param list langs: The languages of the files to lint. Each name must be
+        the name of a check of at least one of them.
+    :param tuple select: The names of the checks to run, or `None`.
+    :param tuple ignore: The names of the checks not to run, or `None`.
+    :raises click.UsageError: A name isn't the name of a check.
+    """
+    if select is None and ignore is None:
+        return
+
+    names = set()
+    for lang in langs:
+        names.update(i.__name__ for i in get_linter(lang).linters)
+    unknown = sorted((set(select or []) | set(ignore or [])) - names)
+    if unknown:
+        raise click.UsageError("Unknown check(s): {}".format(
+            ", ".join(unknown)))
+
+
+def _file_language(path, lang, stdin_filename, code):
+    """Choose the language to lint a file in.
+
+    :param str path: The path to the file, or "-" for standard input.
+    :param str lang: The value of `--lang`, or `None` to detect it.
+    :param str stdin_filename: The value of `--stdin-filename`, or `None`.
+    :param str code: The source code of the file, or `None` to read it from
+        `path`.
+    :returns str: The language.
+    """
+    if lang is not None:
+        return lang
+    if path == "-":
+        if stdin_filename is None:
+            return "cpp"
+        path = stdin_filename
+    return detect_language(path, default="cpp", code=code)
+
+
+def _changed_files(ref, files, code_range, *, lang, include, exclude):
+    """Find the files to lint with `--diff`.
+
+    :param str ref: The git ref to compare against.
+    :param tuple files: The files and directories passed on the
+        command-line. If there are any, only the changed files in them are
+        linted.
+    :param tuple code_range: The value of `--range`, which can't be used
+        with `--diff`.
+    :param str lang: The language of the files, or `None` for any language.
+    :param tuple include: The globs of the files to lint.
+    :param tuple exclude: The globs of the files not to lint.
+    :returns list: The path of each file to lint, its source code (always
+        `None`), and the rows to report errors on.
+    :raises click.UsageError: The options can't be used together, or git
+        failed.
+    """
+    if code_range is not None or "-" in files:
+        raise click.UsageError("--diff can't be used with --range or "
+                               "standard input")
+
+    # Only load the git support when it's used.
+    from .changes import changed_rows
+
+    try:
+        changes = changed_rows(ref)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--diff")
+
+    if files:
+        paths = [i for i in iter_files(files, lang=lang, include=include,
+                                       exclude=exclude)
+                 if os.path.realpath(i) in changes]
+    else:
+        paths = sorted(os.path.relpath(i) for i in changes
+                       if os.path.isfile(i))
+        paths = [i for i in paths
+                 if is_source_file(i, lang=lang, include=include,
+                                   exclude=exclude)]
+    return [(path, None, changes[os.path.realpath(path)]) for path in paths]
+
+
+def _serve(socket_path):
+    """Serve lint requests until interrupted.
 
+    :param str socket_path: The path of the socket to listen on.
+    """
+    # Only load the server when it's used.
+    from .server import LintServer
 
-def _print_tokens(error, code):
-    """Print out and underline the afflicted tokens in the error."""
-    start = error.tokens[0].start
-    end = error.tokens[-1].end
+    with LintServer(socket_path) as server:
+        click.echo("Serving on {}".format(socket_path), err=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
-    lines = code.splitlines()
-    line = lines[start.row]
 
-    if start.row == end.row:
-        underline_length = (end.column - start.column) + 1
+def _lint_files_parallel(tasks, options, jobs):
+    """Lint files in worker processes.
+
+    The largest files are started first, so that one large file at the end
+    doesn't leave the other workers idle. If the files are still being found,
+    they are started in order instead, a few at a time.
+
+    :param tasks: The `_Task` of each file, as a list, or as an iterator if
+        they are still being found.
+    :param dict options: The keyword arguments to `_lint_file`.
+    :param int jobs: The number of worker processes.
+    :returns: An iterator over the results of `_lint_file_eagerly` for each
+        file, in the same order as `tasks`. Closing it terminates the
+        workers, even if they're still linting files.
+    """
+    # Only load multiprocessing when it's used.
+    import multiprocessing
+
+    if not isinstance(tasks, list):
+        with multiprocessing.Pool(jobs) as pool:
+            pending = collections.deque()
+            for task in tasks:
+                pending.append(pool.apply_async(_lint_file_eagerly, task,
+                                                options))
+                if len(pending) >= jobs * _TASKS_PER_JOB:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        return
+
+    def size(task):
+        if task.code is not None:
+            return len(task.code)
+        return os.path.getsize(task.path)
+
+    order = sorted(range(len(tasks)),
+                   key=lambda i: size(tasks[i]),
+                   reverse=True)
+    with multiprocessing.Pool(jobs) as pool:
+        results = [None] * len(tasks)
+        for i in order:
+            results[i] = pool.apply_async(_lint_file_eagerly, tasks[i],
+                                          options)
+        for result in results:
+            yield result.get()
+
+
+def _lint_file(path, code, rows, lang, *, use_profile, **kwargs):
+    """Lint a file and render its errors.
+
+    :param str path: The path to the file, or "-" for standard input.
+    :param str code: The source code of the file, or `None` to read it from
+        `path`.
+    :param list rows: The pairs of the first and last rows to report errors
+        on, or `None` to report errors anywhere.
+    :param str lang: The language of the file.
+    :param bool use_profile: Whether to time the stages of linting.
+    :param kwargs: The other options for `_lint_path`.
+    :returns tuple: An iterator over the output to print for each error,
+        which lints the file as it goes, and the `Profile` of linting the
+        file, or `None` if `use_profile` is false. The profile is complete
+        once the iterator is exhausted.
+    """
+    profile = Profile() if use_profile else None
+    output = _lint_path(path, code, rows, lang=lang, profile=profile,
+                        **kwargs)
+    return output, profile
+
+
+def _lint_file_eagerly(path, code, rows, lang, **kwargs):
+    """Lint a whole file and render its errors, such as in a worker process.
+
+    :param str path: The path to the file, or "-" for standard input.
+    :param str code: The source code of the file, or `None` to read it from
+        `path`.
+    :param list rows: The rows to report errors on, or `None`.
+    :param str lang: The language of the file.
+    :param kwargs: The other options for `_lint_file`.
+    :returns tuple: The output to print for each error, as a list, and the
+        `Profile` of linting the file, or `None`.
+    """
+    output, profile = _lint_file(path, code, rows, lang, **kwargs)
+    return list(output), profile
+
+
+def _lint_path(path, code, rows, *, lang, select, ignore, stdin_filename,
+               use_mmap, tab_width, output_format, color, code_range,
+               max_errors, cache_dir, profile):
+    """Lint a file and render its errors.
+
+    :param str path: The path to the file, or "-" for standard input.
+    :param str code: The source code of the file, or `None` to read it from
+        `path`.
+    :param list rows: The pairs of the first and last rows to report errors
+        on, or `None` to report errors anywhere.
+    :param str lang: The language of the file.
+    :param tuple select: The names of the checks to run, or `None` for all
+        of them. Names of checks which the language doesn't have are left
+        out.
+    :param tuple ignore: The names of the checks not to run, or `None`.
+    :param str stdin_filename: The path to report standard input as, or
+        `None`.
+    :param bool use_mmap: Whether to memory-map the file.
+    :param int tab_width: The number of columns between tab stops.
+    :param str output_format: The format to render errors in, one of
+        `FORMATS`.
+    :param bool color: Whether to style text output for a terminal.
+    :param tuple code_range: The start and end offsets of the range to
+        report errors in, or `None`.
+    :param int max_errors: The number of errors to stop linting at, or
+        `None`.
+    :param str cache_dir: The directory of the `LintCache` to use, or `None`
+        to not use a cache.
+    :param Profile profile: The profile to time the stages of linting in, or
+        `None`.
+    :yields str: The output to print for each error.
+    """
+    # The checks were chosen for every language being linted.
+    names = {i.__name__ for i in get_linter(lang).linters}
+    if select is not None:
+        select = tuple(i for i in select if i in names)
+    if ignore is not None:
+        ignore = tuple(i for i in ignore if i in names)
+    linter = get_linter(lang, select=select, ignore=ignore)
+    if path != "-":
+        filename = os.path.basename(path)
+    elif stdin_filename is not None:
+        filename = os.path.basename(stdin_filename)
+        path = stdin_filename
     else:
-        # It's possible for an error to span more than one line. The simplest
-        # example is a multi-line comment. In that case, only underline tokens
-        # on the first line.
-        underline_length = len(line) - start.column
-    underline_string = "^" * underline_length
-    underline_string = (" " * start.column) + underline_string
-
-    click.echo(line)
-    click.secho(underline_string, fg="green", bold=True)
+        filename = "<stdin>"
+        path = filename
+    options = {
+        "filename": filename,
+        "path": path,
+        "output_format": output_format,
+        "color": color,
+        "rows": rows,
+        "lang": lang,
+        "linter": linter,
+        "tab_width": tab_width,
+        "max_errors": max_errors,
+        "cache_dir": cache_dir,
+        "profile": profile,
+    }
+
+    if code is None and use_mmap and code_range is None:
+        with contextlib.ExitStack() as stack:
+            try:
+                buffer = stack.enter_context(map_file(path))
+            except OSError as e:
+                yield _read_failure(e, filename=filename, path=path,
+                                    output_format=output_format,
+                                    color=color)
+                return
+
+            # Tokenizing and matching are interleaved, so they are timed
+            # together.
+            def lint():
+                with timer(profile, "lint"):
+                    tokens = iter_tokens(buffer, tab_width=tab_width)
+                    errors = linter.lint_stream(filename, tokens)
+                    # The errors are found in the order of the checks, so
+                    # they're all sorted. `--max-errors` is applied to the
+                    # errors which are reported, after filtering by row.
+                    return sorted(errors, key=error_position)
+            yield from _lint_source(lint, buffer, buffer, mode="mmap",
+                                    **options)
+            return
+
+    if code is None:
+        try:
+            with timer(profile, "read"):
+                # Bytes which aren't UTF-8 are replaced, as when the file is
+                # memory-mapped, rather than failing the whole run.
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    code = f.read()
+        except OSError as e:
+            yield _read_failure(e, filename=filename, path=path,
+                                output_format=output_format, color=color)
+            return
+
+    if code_range is None:
+        def lint():
+            return linter.iter_lint(filename, code, tab_width=tab_width,
+                                    profile=profile)
+    else:
+        # Errors in part of the file aren't cached.
+        options["cache_dir"] = None
+        start, end = code_range
+
+        def lint():
+            with timer(profile, "lint"):
+                errors = linter.lint_range(filename, code, start, end,
+                                           tab_width=tab_width)
+                return sorted(errors, key=error_position)
+    # Encoding copies the whole file, so only do it for the cache key.
+    content = code.encode() if options["cache_dir"] is not None else None
+    yield from _lint_source(lint, content, code, mode="text", **options)
+
+
+def _lint_source(lint, content, source, *, filename, path, output_format,
+                 color, rows, lang, linter, tab_width, max_errors, cache_dir,
+                 profile, mode):
+    """Lint source code, or look up its errors in the cache.
+
+    :param function lint: Lints the source code and returns an iterable of
+        the errors, in the order that their tokens appear.
+    :param bytes content: The contents of the file, to look up in the cache,
+        or `None` if the cache isn't used.
+    :param source: The source code, as a string or a buffer.
+    :param str filename: The name of the file.
+    :param str path: The path to the file, for formats other than text.
+    :param str output_format: The format to render errors in.
+    :param bool color: Whether to style text output for a terminal.
+    :param list rows: The rows to report errors on, or `None`. All of the
+        errors are cached regardless.
+    :param str lang: The language of the file.
+    :param Linter linter: The linter, whose checks affect the errors.
+    :param int tab_width: The number of columns between tab stops.
+    :param int max_errors: The number of errors to stop linting at, or
+        `None`.
+    :param str cache_dir: The directory of the `LintCache` to use, or `None`.
+    :param Profile profile: The profile to time the stages of linting in, or
+        `None`.
+    :param str mode: How the file is read, which can affect the errors.
+    :yields str: The output to print for each error, as soon as it's found.
+    """
+    result = None
+    if cache_dir is not None:
+        with timer(profile, "cache"):
+            cache = LintCache(cache_dir)
+            key = cache.key(content,
+                            filename=filename,
+                            lang=lang,
+                            rules=rule_names(linter),
+                            tab_width=tab_width,
+                            mode=mode)
+            result = cache.get(key)
+
+    if result is None:
+        try:
+            errors = lint()
+        except ValueError as e:
+            # The file couldn't be tokenized. Report it, but keep linting
+            # the other files.
+            result = CachedResult(errors=[], failure=str(e))
+            if cache_dir is not None:
+                with timer(profile, "cache"):
+                    cache.put(key, result)
+
+    if result is not None:
+        if result.failure is not None:
+            yield _format_failure(result.failure, filename=filename,
+                                  path=path, output_format=output_format,
+                                  color=color)
+            return
+
+        # Display errors in the order that their tokens appear, rather than
+        # in the order that we found the errors.
+        errors = sorted((i for i in result.errors if _error_in_rows(i, rows)),
+                        key=error_position)
+        with timer(profile, "render"):
+            render = _renderer(source, filename=filename, path=path,
+                               output_format=output_format, color=color,
+                               tab_width=tab_width)
+            output = [render(i) for i in errors]
+        yield from output[:max_errors]
+        return
+
+    with timer(profile, "render"):
+        render = _renderer(source, filename=filename, path=path,
+                           output_format=output_format, color=color,
+                           tab_width=tab_width)
+
+    found = []
+    num_reported = 0
+    for error in errors:
+        found.append(error)
+        if not _error_in_rows(error, rows):
+            continue
+
+        with timer(profile, "render", calls=0):
+            error_output = render(error)
+        yield error_output
+
+        # If linting stops early, there may be more errors in the file, so
+        # they aren't cached.
+        num_reported += 1
+        if num_reported == max_errors:
+            return
+
+    if cache_dir is not None:
+        with timer(profile, "cache"):
+            cache.put(key, CachedResult(errors=found, failure=None))
+
+
+def _renderer(source, *, filename, path, output_format, color, tab_width):
+    """Make a function which renders the errors in a file.
+
+    The lines of the file are only found once, so that rendering takes time
+    linear in the size of the file, however many errors it has.
+
+    :param source: The source code, as a string or a buffer.
+    :param str filename: The name of the file.
+    :param str path: The path to the file.
+    :param str output_format: The format to render errors in.
+    :param bool color: Whether to style text output for a terminal.
+    :param int tab_width: The number of columns between tab stops.
+    :returns function: Renders an `Error` as a string.
+    """
+    lines = None
+
+    def render(error):
+        nonlocal lines
+        if lines is None:
+            # Tokens which were just found share the line table that the
+            # tokenizer already built.
+            lines = error.tokens[0].lines
+            if (lines is None or lines.source is not source or
+                    lines.tab_width != tab_width):
+                lines = LineTable(source, tab_width=tab_width)
+        if output_format != "text":
+            # Only text shows the source code of the error.
+            return format_record(error_record(error, path, lines),
+                                 output_format)
+        return format_error(error, filename, lines, color=color)
+    return render
+
+
+def _format_failure(message, *, filename, path, output_format, color):
+    """Render an error about a whole file.
+
+    :param str message: The error message.
+    :param str filename: The name of the file.
+    :param str path: The path to the file.
+    :param str output_format: The format to render errors in.
+    :param bool color: Whether to style text output for a terminal.
+    :returns str:
+    """
+    if output_format == "text":
+        return format_message(filename, None, message, color=color)
+    return format_record(failure_record(path, message), output_format)
+
+
+def _read_failure(error, **kwargs):
+    """Render the error for a file which couldn't be read.
+
+    This happens if a file in `--files-from` doesn't exist, for example.
+
+    :param OSError error: The error raised when opening the file.
+    :param kwargs: The options for `_format_failure`.
+    :returns str:
+    """
+    return _format_failure("Couldn't read file: {}".format(error.strerror),
+                           **kwargs)
+
+
+def _error_in_rows(error, rows):
+    """Check whether an error should be reported.
+
+    :param Error error: The error.
+    :param list rows: The pairs of the first and last rows to report errors
+        on, or `None` to report errors anywhere.
+    :returns bool: Whether any of the error's tokens are on those rows.
+    """
+    if rows is None:
+        return True
+    first_row = error.tokens[0].start.row
+    last_row = error.tokens[-1].end.row
+    return any(first_row <= last and last_row >= first
+               for first, last in rows)
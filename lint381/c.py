@@ -3,6 +3,7 @@ import os.path
 
 from .linter import Error, Linter
 from .matcher import (
+    match_bracket,
     match_regex,
     match_tokens,
     match_type,
@@ -65,7 +66,8 @@ def uppercase_define(source, *, match):
 
 @linter.register
 @with_matched_tokens(start=match_regex("^(struct|class)$"),
-                     end=match_regex("^({|;)$"))
+                     end=match_regex("^({|;)$"),
+                     local=False)
 def typename_capitalized(source, *, match):
     """Flag type names that aren't capitalized."""
     type_token = match[0]
@@ -76,8 +78,8 @@ def typename_capitalized(source, *, match):
     # Don't flag enum classes as regular classes. Handle enum classes in a
     # separate check.
     if type == "class":
-        index = source.tokens.index(type_token)
-        if index > 0 and source.tokens[index - 1].value == "enum":
+        prev_token = type_token.prev()
+        if prev_token is not None and prev_token.value == "enum":
             return
 
     if type_name[0].islower():
@@ -134,17 +136,17 @@ def typedefs_end_with_t(source, *, match):
 
 @linter.register
 @with_matched_tokens(start=match_regex("^(==|!=)$"),
-                     end=match_regex("^\)$"))
+                     end=match_regex(r"^\)$"),
+                     length=3)
 def comparison_to_null(source, *, match):
-    """Flag comparisons to null values."""
+    """Flag comparisons to null values.
+
+    We only match comparisons right before a close paren, that is, inside an
+    if-statement or similar.
+    """
     operator = match[0]
     operand = match[1]
 
-    # Ensure that we only match comparisons inside an if-statement or similar.
-    next_token = match[2]
-    if next_token.value != ")":
-        return
-
     if operator.value in ["==", "!="] and operand.value in [r"'\0'", "NULL"]:
         yield Error(message="Comparison to {} should be avoided"
                             .format(operand.value),
@@ -152,18 +154,15 @@ def comparison_to_null(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^enum$"),
-                     end=match_regex("^\}$"))
+@with_matched_tokens(start=match_regex("^enum$"), end=match_bracket("{"))
 def enum_members_all_caps(source, *, match):
     """Flag enum values that aren't in all-caps."""
-    enum_body = list(match_tokens(match,
-                                  start=match_regex("^\{$"),
-                                  end=match_regex("^\}$")))
-    enum_body = enum_body[0]
+    open_brace = [i.value for i in match].index("{")
+    enum_body = match[open_brace:]
 
     for enum_member in match_tokens(enum_body,
                                     start=match_type("identifier"),
-                                    end=match_regex("^(,|\})$")):
+                                    end=match_regex(r"^(,|\})$")):
         enum_member = enum_member[0]
         if not enum_member.value.isupper():
             yield Error(message="Enum member '{}' should be all-caps"
@@ -172,14 +171,13 @@ def enum_members_all_caps(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^\($"),
-                     end=match_regex("^malloc$"))
+@with_matched_tokens(start=match_regex(r"^\($"),
+                     end=match_bracket("("),
+                     lookahead=1)
 def cast_malloc(source, *, match):
     """Flag casting the result of 'malloc'."""
-    # Ensure that the open paren matches with a close paren right before the
-    # malloc (i.e. is a cast).
-    close_paren = match[-2]
-    if close_paren.value != ")":
+    # The parens are a cast if they're right before the malloc.
+    if match[-1].value != "malloc":
         return
 
     yield Error(message="Don't cast the result of 'malloc'",
@@ -0,0 +1,236 @@
+"""Caches linting errors on disk, keyed by the contents of the file.
+
+Unchanged files, and files which are identical to a file linted before, can
+then be answered without tokenizing them:
+
+    cache = LintCache(default_directory())
+    key = cache.key(content, lang="cpp", filename="foo.cpp")
+    result = cache.get(key)
+    if result is None:
+        result = CachedResult(errors=linter.lint(...), failure=None)
+        cache.put(key, result)
+
+Entries are stored as one JSON file each. When the cache grows past its
+maximum size, the least-recently-used entries are evicted by `prune`. Their
+total size is then recorded, so that the entries are only looked at again
+once more have been written.
+"""
+import collections
+import hashlib
+import json
+import os
+import os.path
+
+from . import __version__
+from .linter import Error
+from .tokenizer import Position, Token
+
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+"""The default maximum size of the cache, in bytes."""
+
+_ENTRY_SUFFIX = ".json"
+"""The file extension of a cache entry."""
+
+_SIZE_MARKER = "size"
+"""The file which records the total size of the entries after pruning."""
+
+
+def default_directory():
+    """Get the directory to store the cache in.
+
+    This is `$LINT381_CACHE_DIR` if it's set, and otherwise `lint381` in the
+    user's cache directory.
+
+    :returns str: The path to the directory.
+    """
+    directory = os.environ.get("LINT381_CACHE_DIR")
+    if directory:
+        return directory
+
+    cache_home = (os.environ.get("XDG_CACHE_HOME") or
+                  os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(cache_home, "lint381")
+
+
+def rule_names(linter):
+    """Get the names of the linting functions of a linter.
+
+    :param Linter linter: The linter.
+    :returns list: The qualified name of each linting function, in order.
+    """
+    return ["{}.{}".format(i.__module__, i.__qualname__)
+            for i in linter.linters]
+
+
+CachedResult = collections.namedtuple("CachedResult", ["errors", "failure"])
+"""The result of linting a file.
+
+:ivar list errors: The `Error`s in the file.
+:ivar str failure: The message of the `ValueError` raised if the file
+    couldn't be tokenized, or `None`.
+"""
+
+
+class LintCache:
+    """A cache of the linting errors of files.
+
+    The cache is safe to use from several processes at once: entries are
+    written to a temporary file and then moved into place.
+
+    :ivar str directory: The directory the entries are stored in.
+    :ivar int max_size: The total size of the entries to keep, in bytes.
+    """
+
+    def __init__(self, directory, *, max_size=DEFAULT_MAX_SIZE):
+        """Use the cache in a directory.
+
+        The directory is created when the first entry is stored.
+
+        :param str directory: The directory to store entries in.
+        :param int max_size: The total size of the entries to keep, in bytes.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+    def key(self, content, **fields):
+        """Compute the key for the errors of a file.
+
+        :param bytes content: The contents of the file.
+        :param fields: Anything else which affects the errors, such as the
+            language, the linting functions (see `rule_names`) and the
+            filename. These must be serializable as JSON. The version of
+            lint381 is always included.
+        :returns str: The key.
+        """
+        fields = dict(fields, version=__version__)
+        digest = hashlib.sha256()
+        digest.update(json.dumps(fields, sort_keys=True).encode())
+        digest.update(b"\0")
+        digest.update(content)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Look up the result for a key.
+
+        :param str key: The key, from `key`.
+        :returns CachedResult: The result, or `None` if it isn't cached or
+            the entry couldn't be read.
+        """
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            result = CachedResult(
+                errors=[_load_error(i) for i in entry["errors"]],
+                failure=entry["failure"],
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        try:
+            # Mark the entry as recently used so that it isn't evicted.
+            os.utime(path)
+        except OSError:  # pragma: no cover
+            pass
+        return result
+
+    def put(self, key, result):
+        """Store the result for a key.
+
+        If the entry can't be written, it is silently dropped.
+
+        :param str key: The key, from `key`.
+        :param CachedResult result: The result of linting the file.
+        """
+        entry = {
+            "errors": [_dump_error(i) for i in result.errors],
+            "failure": result.failure,
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = "{}.{}.tmp".format(self._path(key), os.getpid())
+            with open(temp_path, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            pass
+
+    def prune(self):
+        """Evict the least-recently-used entries until the cache fits.
+
+        Nothing is looked at but the size marker if the cache fitted when it
+        was last pruned, and no entries have been written since.
+
+        :returns int: The number of entries evicted.
+        """
+        if self._fitted():
+            return 0
+
+        try:
+            entries = [(i.stat().st_mtime, i.stat().st_size, i.path)
+                       for i in os.scandir(self.directory)
+                       if i.name.endswith(_ENTRY_SUFFIX)]
+        except OSError:
+            return 0
+
+        total_size = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:  # pragma: no cover
+                continue
+            total_size -= size
+            evicted += 1
+
+        try:
+            # Writing the marker in place leaves it newer than the directory,
+            # which is only modified again when an entry is written.
+            with open(self._marker_path(), "w") as f:
+                f.write(str(total_size))
+        except OSError:  # pragma: no cover
+            pass
+        return evicted
+
+    def _fitted(self):
+        """Check whether the cache is unchanged since it was pruned to fit.
+
+        :returns bool: Whether the size marker is within the maximum size,
+            and is newer than the directory.
+        """
+        try:
+            with open(self._marker_path()) as f:
+                total_size = int(f.read())
+            marker_time = os.stat(self._marker_path()).st_mtime_ns
+            directory_time = os.stat(self.directory).st_mtime_ns
+        except (OSError, ValueError):
+            return False
+        return total_size <= self.max_size and directory_time <= marker_time
+
+    def _marker_path(self):
+        """Get the path of the size marker."""
+        return os.path.join(self.directory, _SIZE_MARKER)
+
+    def _path(self, key):
+        """Get the path of the entry for a key."""
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+
+def _dump_error(error):
+    """Convert an error to a JSON-serializable value."""
+    return [error.message,
+            [[i.type, i.value, list(i.start), list(i.end)]
+             for i in error.tokens],
+            error.rule]
+
+
+def _load_error(value):
+    """Convert a value from `_dump_error` back to an error."""
+    message, tokens, rule = value
+    return Error(message=message,
+                 tokens=[Token(type, token_value, Position(*start),
+                               Position(*end))
+                         for type, token_value, start, end in tokens],
+                 rule=rule)
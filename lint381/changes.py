@@ -0,0 +1,111 @@
+"""Finds the lines changed since a git commit, for `lint381 --diff`.
+
+Only local git commands are run:
+
+    changes = changed_rows("origin/master")
+    changes["/home/foo/project/foo.cpp"]  # [(9, 12), (40, 40)]
+
+Files which aren't tracked by git (and aren't ignored) count as changed
+everywhere.
+"""
+import os.path
+import re
+import subprocess
+
+_HUNK_PATTERN = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+"""Matches the header of a hunk in a diff, capturing the new line range."""
+
+
+def changed_rows(ref, directory=None):
+    """Find the lines of each file which changed since a git ref.
+
+    Changes in the working tree which haven't been committed are included.
+
+    :param str ref: The git ref to compare against, such as `HEAD~` or
+        `origin/master`.
+    :param str directory: A directory in the git repository. Defaults to the
+        current directory.
+    :returns dict: For each changed file, by its real path, a list of pairs
+        of the first and last changed rows, starting from zero. For untracked
+        files, this is `None` instead, meaning that every row changed. Files
+        which were deleted, or only had lines removed, are left out.
+    :raises ValueError: git failed, such as because the directory isn't in a
+        git repository or the ref doesn't exist.
+    """
+    toplevel = _git(["rev-parse", "--show-toplevel"], directory).strip()
+
+    # The ref is resolved first, so that one starting with a dash can't be
+    # taken as an option of `git diff`.
+    try:
+        commit = _git(["rev-parse", "--verify", "--quiet", "--end-of-options",
+                       ref + "^{commit}"], toplevel).strip()
+    except ValueError:
+        raise ValueError("Unknown commit: {}".format(ref))
+    diff = _git(["-c", "core.quotePath=false",
+                 "diff", "--unified=0", "--no-color", "--no-ext-diff",
+                 "--src-prefix=a/", "--dst-prefix=b/", commit, "--"],
+                toplevel)
+    untracked = _git(["ls-files", "--others", "--exclude-standard", "-z"],
+                     toplevel)
+
+    changes = _parse_diff(diff, toplevel)
+    for name in untracked.split("\0"):
+        if name:
+            changes[os.path.realpath(os.path.join(toplevel, name))] = None
+    return changes
+
+
+def _parse_diff(diff, toplevel):
+    """Find the changed rows of each file in the output of `git diff`.
+
+    :param str diff: The output of `git diff --unified=0`.
+    :param str toplevel: The top-level directory of the repository, which
+        the paths in the diff are relative to.
+    :returns dict: The changed rows of each file. See `changed_rows`.
+    """
+    changes = {}
+    path = None
+    in_header = False
+    for line in diff.splitlines():
+        if line.startswith("diff "):
+            in_header = True
+            path = None
+        elif in_header and line.startswith("+++ "):
+            name = line[len("+++ "):]
+            if name.startswith("b/"):
+                path = os.path.realpath(os.path.join(toplevel, name[2:]))
+        elif line.startswith("@@"):
+            in_header = False
+            match = _HUNK_PATTERN.match(line)
+            if path is None or not match:
+                continue
+
+            start = int(match.group(1))
+            count = int(match.group(2) or "1")
+            if count:
+                rows = changes.setdefault(path, [])
+                rows.append((start - 1, start + count - 2))
+    return changes
+
+
+def _git(args, directory):
+    """Run a git command.
+
+    :param list args: The arguments to git.
+    :param str directory: The directory to run it in, or `None` for the
+        current directory.
+    :returns str: The output of the command.
+    :raises ValueError: The command failed.
+    """
+    try:
+        result = subprocess.run(["git"] + args,
+                                cwd=directory,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+    except OSError as e:
+        raise ValueError("Couldn't run git: {}".format(e))
+
+    if result.returncode != 0:
+        message = result.stderr.decode(errors="replace").strip()
+        raise ValueError(message or "git {} failed".format(args[0]))
+    return result.stdout.decode(errors="surrogateescape")
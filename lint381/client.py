@@ -0,0 +1,238 @@
+"""A thin client for the lint server, for editor integrations.
+
+Editors lint the file being edited every time it's saved, so starting a new
+Python process and loading the linters each time costs more than linting the
+file. Instead, start a server once:
+
+    $ lint381 --serve &
+
+And point the editor at `lint381-client`, which takes the same arguments as
+`lint381` for the options it supports, and prints the same output. If the
+server isn't running, or the arguments aren't supported, the client lints the
+files in-process instead.
+
+This module only imports from the standard library, so that the client starts
+quickly.
+"""
+import io
+import json
+import os
+import os.path
+import re
+import socket
+import sys
+
+from .config import find_config, load_config, parse_names
+from .discover import detect_language
+
+
+def default_socket_path():
+    """Get the path of the socket that the server listens on.
+
+    This is `$LINT381_SOCKET` if it's set, and otherwise a socket in a
+    directory which only the user can access: the user's runtime directory,
+    or a directory of their own in the temporary directory, which the server
+    creates.
+
+    :returns str: The path to the socket.
+    """
+    path = os.environ.get("LINT381_SOCKET")
+    if path:
+        return path
+
+    directory = os.environ.get("XDG_RUNTIME_DIR")
+    if not directory:
+        # Only load tempfile when it's used, since it's slow to import.
+        import tempfile
+        directory = os.path.join(tempfile.gettempdir(),
+                                 "lint381-{}".format(os.getuid()))
+    return os.path.join(directory, "lint381.sock")
+
+
+def main(args=None):
+    """Lint files with the server, falling back to linting in-process.
+
+    :param list args: The command-line arguments. Defaults to `sys.argv`.
+    """
+    if args is None:
+        args = sys.argv[1:]
+
+    options = _parse_args(args)
+    if options is not None:
+        stdin = sys.stdin.read() if "-" in options["paths"] else None
+        try:
+            results = _lint_files(stdin=stdin, **options)
+        except (OSError, ValueError, KeyError):
+            pass
+        else:
+            had_errors = False
+            for result in results:
+                had_errors = had_errors or result["had_errors"]
+                sys.stdout.write(result["output"])
+            sys.exit(1 if had_errors else 0)
+
+        if stdin is not None:
+            # Standard input was already read, so give it to `lint381` again.
+            sys.stdin = io.StringIO(stdin)
+
+    from .__main__ import main as cli_main
+    cli_main(args)
+
+
+def _parse_args(args):
+    """Parse the command-line arguments that the client supports.
+
+    Options which aren't passed are read from the configuration file, as
+    `lint381` does.
+
+    :param list args: The command-line arguments.
+    :returns dict: The keyword arguments to `_lint_files`, or `None` if the
+        arguments should be handled by `lint381` instead.
+    """
+    paths = []
+    values = {}
+    config_path = None
+    stdin_filename = None
+    socket_path = default_socket_path()
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == "-" or not arg.startswith("-"):
+            paths.append(arg)
+            continue
+        if arg == "--stdin":
+            paths.append("-")
+            continue
+
+        name, equals, value = arg.partition("=")
+        if not equals:
+            if not args:
+                return None
+            value = args.pop(0)
+
+        if name in ("--lang", "--tab-width", "--range", "--select",
+                    "--ignore"):
+            values[name[2:].replace("-", "_")] = value
+        elif name == "--config":
+            config_path = value
+        elif name == "--stdin-filename":
+            stdin_filename = value
+        elif name == "--socket":
+            socket_path = value
+        else:
+            return None
+
+    if not paths:
+        return None
+
+    try:
+        config = load_config(config_path or find_config())
+    except ValueError:
+        return None
+    values = dict(config, **values)
+
+    options = {
+        "paths": paths,
+        "lang": values.get("lang"),
+        "tab_width": None,
+        "code_range": None,
+        "select": parse_names(values.get("select")),
+        "ignore": parse_names(values.get("ignore")),
+        "stdin_filename": stdin_filename,
+        "socket_path": socket_path,
+    }
+    if "tab_width" in values:
+        if not values["tab_width"].isdigit():
+            return None
+        options["tab_width"] = int(values["tab_width"])
+    if "range" in values:
+        match = re.match(r"^(\d+):(\d+)$", values["range"])
+        if not match:
+            return None
+        options["code_range"] = [int(match.group(1)), int(match.group(2))]
+    return options
+
+
+def _lint_files(paths, lang, tab_width, code_range, select, ignore,
+                stdin_filename, socket_path, stdin):
+    """Lint files with the server.
+
+    :param list paths: The paths of the files, or "-" for standard input.
+    :param str lang: The language of the files, or `None` to detect the
+        language of each file.
+    :param int tab_width: The number of columns between tab stops, or `None`
+        for the default.
+    :param list code_range: The start and end offsets to report errors in,
+        or `None`.
+    :param tuple select: The names of the checks to run, or `None` for all
+        of them.
+    :param tuple ignore: The names of the checks not to run, or `None`.
+    :param str stdin_filename: The path of the file being linted from
+        standard input, or `None`.
+    :param str socket_path: The path of the server's socket.
+    :param str stdin: The contents of standard input, or `None` if it isn't
+        linted.
+    :returns list: The server's response for each file, in order.
+    :raises OSError: The server couldn't be reached.
+    :raises ValueError: The server couldn't lint a file.
+    """
+    requests = []
+    for path in paths:
+        if path == "-" and stdin_filename is not None:
+            # The server keeps the state of the file between edits.
+            path = stdin_filename
+            filename = os.path.basename(path)
+            code = stdin
+            file_lang = lang or detect_language(path, default="cpp",
+                                                code=code)
+        elif path == "-":
+            filename = "<stdin>"
+            code = stdin
+            file_lang = lang or "cpp"
+        else:
+            filename = os.path.basename(path)
+            with open(path) as f:
+                code = f.read()
+            file_lang = lang or detect_language(path, default="cpp")
+
+        requests.append({
+            "path": os.path.abspath(path),
+            "filename": filename,
+            "code": code,
+            "lang": file_lang,
+            "tab_width": tab_width,
+            "range": code_range,
+            "select": select,
+            "ignore": ignore,
+            "color": sys.stdout.isatty(),
+        })
+
+    # Don't print anything until every file is linted, so that we can still
+    # fall back to linting in-process.
+    return [request(socket_path, i) for i in requests]
+
+
+def request(socket_path, message):
+    """Send a request to the server and wait for the response.
+
+    :param str socket_path: The path of the server's socket.
+    :param dict message: The request.
+    :returns dict: The response.
+    :raises OSError: The server couldn't be reached, or the socket belongs
+        to another user.
+    :raises ValueError: The server couldn't handle the request.
+    """
+    # Anyone can create a socket in a shared directory, and would then be
+    # sent the code being linted.
+    if os.stat(socket_path).st_uid != os.getuid():
+        raise OSError("{} is owned by another user".format(socket_path))
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline().decode())
+
+    if "error" in response:
+        raise ValueError(response["error"])
+    return response
@@ -0,0 +1,100 @@
+"""Reads the options for a project from a configuration file.
+
+Options are read from the `[lint381]` section of `lint381.cfg` or
+`setup.cfg`, in the current directory or the nearest directory above it
+which has one:
+
+    [lint381]
+    lang = c
+    ignore = enum_members_all_caps, comparison_to_null
+
+The names are those of the command-line options. Options passed on the
+command-line take precedence.
+
+This module only imports from the standard library, so that the client can
+use it.
+"""
+import configparser
+import os
+import os.path
+import re
+
+CONFIG_FILES = ["lint381.cfg", "setup.cfg"]
+"""The names of the files to read options from, in order of preference."""
+
+SECTION = "lint381"
+"""The section of the configuration file with the options."""
+
+
+def find_config(directory=None):
+    """Find the configuration file which applies to a directory.
+
+    Files which can't be read or parsed are skipped, since they may belong
+    to other tools, or to a parent directory which isn't part of the project.
+
+    :param str directory: The directory. Defaults to the current directory.
+    :returns str: The path to the nearest file with a `[lint381]` section,
+        or `None` if there isn't one.
+    """
+    directory = os.path.abspath(directory or os.getcwd())
+    while True:
+        for name in CONFIG_FILES:
+            path = os.path.join(directory, name)
+            if not os.path.isfile(path):
+                continue
+            try:
+                parser = _read(path)
+            except ValueError:
+                continue
+            if SECTION in parser:
+                return path
+
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+def load_config(path):
+    """Read the options from a configuration file.
+
+    :param str path: The path to the file, or `None` for no options.
+    :returns dict: The value of each option, as a string, keyed by the name
+        of the option with dashes replaced by underscores.
+    :raises ValueError: The file couldn't be read or parsed.
+    """
+    if path is None:
+        return {}
+
+    parser = _read(path)
+    if SECTION not in parser:
+        return {}
+    return {name.replace("-", "_"): value
+            for name, value in parser.items(SECTION)}
+
+
+def parse_names(value):
+    """Parse a list of names of checks, such as for `--select`.
+
+    :param str value: Names separated by commas or whitespace, or `None`.
+    :returns tuple: The names, or `None` if `value` is `None`.
+    """
+    if value is None:
+        return None
+    return tuple(i for i in re.split(r"[\s,]+", value) if i)
+
+
+def _read(path):
+    """Parse a configuration file.
+
+    :param str path: The path to the file.
+    :returns configparser.ConfigParser:
+    :raises ValueError: The file couldn't be read or parsed.
+    """
+    parser = configparser.ConfigParser(interpolation=None)
+    try:
+        with open(path) as f:
+            parser.read_file(f)
+    except (OSError, configparser.Error) as e:
+        raise ValueError("Couldn't read {}: {}".format(path, e))
+    return parser
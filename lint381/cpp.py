@@ -3,7 +3,13 @@ import re
 
 from lint381 import c
 from .linter import Error, Linter
-from .matcher import match_regex, match_tokens, match_type, with_matched_tokens
+from .matcher import (
+    match_bracket,
+    match_regex,
+    match_tokens,
+    match_type,
+    with_matched_tokens,
+)
 
 linter = Linter()
 
@@ -107,13 +113,13 @@ def alias_containers_not_iterators(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^#define$"))
+@with_matched_tokens(start=match_regex("^#define$"), local=False)
 def use_const_not_define(source, *, match):
     """Flag using `#define` to declare constants in C++."""
     define_token = match[0]
-    tokens_on_line = [i for i in source.tokens
-                      if i.start.row == define_token.start.row
-                      if i.end.row == define_token.end.row]
+    row = define_token.start.row
+    tokens_on_line = [i for i in source.tokens_on_row(row)
+                      if i.end.row == row]
 
     # This isn't a const declaration.
     if len(tokens_on_line) <= 2:
@@ -170,31 +176,21 @@ def loop_condition_boolean(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^\.$"),
-                     end=match_regex("^compare$"),
-                     length=2,
-                     lookahead=1)
+@with_matched_tokens(sequence=[".", "compare", "("])
 def string_compare(source, *, match):
     """Flag using string::compare.
 
     This just assumes that any instance of `.compare` can't be correct.
     """
     dot, compare, open_paren = match
-    if open_paren.value == "(":
-        yield Error(message="Don't use 'string::compare'",
-                    tokens=[dot, compare])
+    yield Error(message="Don't use 'string::compare'",
+                tokens=[dot, compare])
 
 
 @linter.register
-@with_matched_tokens(start=match_regex(r"^\.$"),
-                     end=match_regex("^0$"),
-                     length=6)
+@with_matched_tokens(sequence=[".", "size", "(", ")", "==", "0"])
 def size_equal_to_zero(source, *, match):
     """Flag comparing size to zero instead of calling `empty`."""
-    values = [".", "size", "(", ")", "==", "0"]
-    if any(i.value != j for i, j in zip(match, values)):
-        return
-
     yield Error(message="Use 'empty()' instead of comparing 'size()' with '0'",
                 tokens=match)
 
@@ -212,7 +208,7 @@ def post_increment_iterator(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^catch$"), end=match_regex(r"^\)"))
+@with_matched_tokens(start=match_regex("^catch$"), end=match_bracket("("))
 def catch_exception_by_value(source, *, match):
     """Flag exceptions being caught by value instead of by reference."""
     exception = match[2:-1]
@@ -251,28 +247,23 @@ def alias_names(source, *, match):
 @linter.register
 def unused_using(source):
     """Flag 'using std::foo' statements that aren't used."""
+    start = match_regex("^using$")
     usings = []
     for match in match_tokens(source.tokens,
-                              start=match_regex("^using$"),
+                              start=start,
                               end=match_regex(";"),
-                              length=5):
+                              length=5,
+                              candidates=source.candidates(start)):
         std = match[1]
         double_colon = match[2]
         symbol = match[3]
         if std.value == "std" and double_colon.value == "::":
             usings.append(symbol)
 
-    unused_symbols = []
-    for symbol in usings:
-        for token in source.tokens:
-            # Obviously, the place where we define it doesn't count as a use.
-            if symbol is token:
-                continue
-
-            if symbol.value == token.value:
-                break
-        else:
-            unused_symbols.append(symbol)
+    # Obviously, the place where we define it doesn't count as a use, so a
+    # used symbol appears at least twice.
+    unused_symbols = [i for i in usings
+                      if len(source.indices_of([i.value])) < 2]
 
     for i in unused_symbols:
         yield Error(message="Unused symbol '{}'".format(i.value),
@@ -313,8 +304,7 @@ def enum_class_name(source, *, match):
 
 
 @linter.register
-@with_matched_tokens(start=match_regex("^enum$"),
-                     end=match_regex(r"^\}$"))
+@with_matched_tokens(start=match_regex("^enum$"), end=match_bracket("{"))
 def enum_class_members_not_uppercase(source, *, match):
     """Flag putting enum class members in all-caps."""
     try:
@@ -0,0 +1,399 @@
+"""Finds the source files to lint, and the language of each.
+
+Directories are walked recursively, skipping files ignored by `.gitignore`:
+
+    for path in iter_files(["src", "main.cpp"], exclude=["*_test.cpp"]):
+        lang = detect_language(path, default="cpp")
+
+This module only imports from the standard library, so that the client can
+use it.
+"""
+import fnmatch
+import os
+import os.path
+import re
+
+from . import EXTENSIONS
+
+_SNIFF_SIZE = 8192
+"""The number of bytes at the start of a header to look for C++ in."""
+
+_CHUNK_SIZE = 65536
+"""The most bytes of a list of files to read at once."""
+
+_COMMENT_PATTERN = re.compile(rb"//[^\n]*|/\*.*?(?:\*/|$)", re.DOTALL)
+"""Matches comments, which shouldn't be mistaken for code."""
+
+_CPP_PATTERN = re.compile(
+    rb"\b(?:class|namespace|template|typename|using|virtual|nullptr|"
+    rb"operator)\b|::|#\s*include\s*<\w+>"
+)
+"""Matches code which is only valid in C++."""
+
+
+def detect_language(path, *, default=None, code=None):
+    """Choose the language of a source file.
+
+    The language is chosen by the file's extension. For extensions used by
+    more than one language, such as `.h`, the start of the file is checked
+    for code that's only valid in C++, and then for a source file with the
+    same name, such as `foo.c` for `foo.h`.
+
+    :param str path: The path to the file.
+    :param str default: The language if it can't be detected.
+    :param str code: The source code of the file, such as from an editor
+        which hasn't saved it, or `None` to read it from `path`.
+    :returns str: The language, one of the keys of `EXTENSIONS`, or
+        `default`.
+    """
+    base, extension = os.path.splitext(path)
+    langs = [lang for lang, extensions in sorted(EXTENSIONS.items())
+             if extension in extensions]
+    if len(langs) == 1:
+        return langs[0]
+    if not langs:
+        return default
+
+    if "cpp" in langs and _looks_like_cpp(path, code):
+        return "cpp"
+    for lang in langs:
+        for other_extension in EXTENSIONS[lang]:
+            if (other_extension != extension and
+                    os.path.isfile(base + other_extension)):
+                return lang
+    return default
+
+
+def _looks_like_cpp(path, code):
+    """Check whether the start of a file has code only valid in C++.
+
+    :param str path: The path to the file.
+    :param str code: The source code of the file, or `None` to read it.
+    :returns bool:
+    """
+    if code is not None:
+        head = code[:_SNIFF_SIZE].encode(errors="replace")
+    else:
+        try:
+            with open(path, "rb") as f:
+                head = f.read(_SNIFF_SIZE)
+        except OSError:
+            return False
+    return bool(_CPP_PATTERN.search(_COMMENT_PATTERN.sub(b" ", head)))
+
+
+def is_source_file(path, *, lang=None, include=(), exclude=()):
+    """Check whether a file should be linted.
+
+    :param str path: The path to the file, relative to the directory being
+        linted, with `/` between directories.
+    :param str lang: Only accept files with an extension of this language,
+        or `None` to accept any language.
+    :param list include: Globs of the files to accept, instead of checking
+        their extension.
+    :param list exclude: Globs of the files to reject, or of directories to
+        reject the files in.
+    :returns bool:
+    """
+    parts = path.split("/")
+    if any(_matches_any("/".join(parts[:i]), exclude)
+           for i in range(1, len(parts))):
+        return False
+    return _is_source_file(path, lang, include, exclude)
+
+
+def _is_source_file(path, lang, include, exclude):
+    """Check whether a file should be linted, ignoring its directories.
+
+    :param str path: The path to the file.
+    :param str lang: The language of the files to accept, or `None`.
+    :param list include: Globs of the files to accept.
+    :param list exclude: Globs of the files to reject.
+    :returns bool:
+    """
+    if _matches_any(path, exclude):
+        return False
+    if include:
+        return _matches_any(path, include)
+
+    extension = os.path.splitext(path)[1]
+    if lang is not None:
+        return extension in EXTENSIONS[lang]
+    return any(extension in i for i in EXTENSIONS.values())
+
+
+def iter_files(paths, *, lang=None, include=(), exclude=()):
+    """Find the files to lint.
+
+    Files are yielded as they are. Directories are walked recursively, in
+    order of name, with `os.scandir`, and yield the files which pass
+    `is_source_file`. Excluded directories aren't entered, and directories
+    named `.git`, and files and directories ignored by a `.gitignore` file,
+    are skipped.
+
+    :param list paths: The paths of files and directories, or "-" for
+        standard input.
+    :param str lang: Only find files with an extension of this language, or
+        `None` to find files of any language.
+    :param list include: Globs of the files to find, instead of checking
+        their extension. They are matched against the path relative to the
+        directory being walked, and against the file name.
+    :param list exclude: Globs of the files and directories to skip.
+    :yields str: The path of each file.
+    """
+    for path in paths:
+        if path != "-" and os.path.isdir(path):
+            yield from _walk(path, lang, include, exclude)
+        else:
+            yield path
+
+
+def iter_file_list(f):
+    """Read a list of paths, such as from `find`.
+
+    The paths are separated by newlines, or by NUL characters if there are
+    any, as from `find -print0`. They are read as they arrive, so that the
+    files can be linted before the whole list has been written.
+
+    :param f: The list, as a binary file.
+    :yields str: Each path.
+    """
+    separator = None
+    buffer = b""
+    while True:
+        chunk = f.read1(_CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer += chunk
+
+        if separator is None:
+            if b"\0" in buffer:
+                separator = b"\0"
+            elif b"\n" in buffer:
+                separator = b"\n"
+            else:
+                continue
+
+        *paths, buffer = buffer.split(separator)
+        for path in paths:
+            yield from _decode_path(path, separator)
+    yield from _decode_path(buffer, separator)
+
+
+def _decode_path(path, separator):
+    """Decode a path read by `iter_file_list`.
+
+    :param bytes path: The path.
+    :param bytes separator: The separator between paths, or `None` if it
+        isn't known.
+    :yields str: The path, unless it's blank.
+    """
+    if separator != b"\0":
+        path = path.rstrip(b"\r")
+    if path:
+        yield os.fsdecode(path)
+
+
+def _walk(root, lang, include, exclude):
+    """Find the source files in a directory.
+
+    :param str root: The directory.
+    :param str lang: The language of the files to find, or `None`.
+    :param list include: Globs of the files to find.
+    :param list exclude: Globs of the files and directories to skip.
+    :yields str: The path of each file.
+    """
+    # The `.gitignore` rules are matched against absolute paths.
+    absolute_root = os.path.abspath(root)
+    rules = _parent_ignore_rules(absolute_root)
+    rules += _read_ignore_rules(absolute_root)
+    stack = [(_scan(root), absolute_root, "", rules)]
+    while stack:
+        entries, absolute_directory, relative_directory, rules = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+            continue
+
+        relative_path = relative_directory + entry.name
+        absolute_path = os.path.join(absolute_directory, entry.name)
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if entry.name == ".git" or _is_ignored(absolute_path, is_dir, rules):
+            continue
+
+        if is_dir:
+            if not _matches_any(relative_path, exclude):
+                stack.append((_scan(entry.path), absolute_path,
+                              relative_path + "/",
+                              rules + _read_ignore_rules(absolute_path)))
+        elif _is_source_file(relative_path, lang, include, exclude):
+            # The directories it's in were already checked.
+            yield entry.path
+
+
+def _scan(directory):
+    """List a directory.
+
+    :param str directory: The path to the directory.
+    :returns iterator: The `os.DirEntry` of each entry, in order of name. If
+        the directory can't be read, there are none.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return iter(sorted(entries, key=lambda i: i.name))
+    except OSError:
+        return iter([])
+
+
+def _matches_any(path, globs):
+    """Check whether a path matches any of some globs.
+
+    :param str path: The path, with `/` between directories.
+    :param list globs: The globs.
+    :returns bool: Whether a glob matches the path or the last part of it.
+    """
+    name = path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatchcase(path, i) or fnmatch.fnmatchcase(name, i)
+               for i in globs)
+
+
+class _IgnoreRule:
+    """A pattern from a `.gitignore` file.
+
+    :ivar str directory: The absolute path of the directory of the
+        `.gitignore` file.
+    :ivar re.Pattern pattern: Matches the ignored paths, relative to
+        `directory`, or only the name of the ignored files if the pattern
+        has no slashes.
+    :ivar bool anchored: Whether to match the relative path rather than the
+        name.
+    :ivar bool negated: Whether the pattern re-includes paths, with `!`.
+    :ivar bool dir_only: Whether the pattern only matches directories.
+    """
+
+    def __init__(self, directory, line):
+        """Parse a line of a `.gitignore` file.
+
+        :param str directory: The absolute path of the directory of the
+            `.gitignore` file.
+        :param str line: The line, which isn't blank or a comment.
+        """
+        self.directory = directory
+        self._prefix = os.path.join(directory, "")
+        self.negated = line.startswith("!")
+        if self.negated:
+            line = line[1:]
+        if line.startswith("\\"):
+            line = line[1:]
+
+        self.dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        self.anchored = "/" in line
+        self.pattern = re.compile(_translate_glob(line.lstrip("/")))
+
+    def matches(self, path, is_dir):
+        """Check whether the rule matches a path.
+
+        :param str path: The absolute path.
+        :param bool is_dir: Whether the path is a directory.
+        :returns bool:
+        """
+        if self.dir_only and not is_dir:
+            return False
+        if not path.startswith(self._prefix):
+            return False
+
+        relative_path = path[len(self._prefix):].replace(os.sep, "/")
+        if not self.anchored:
+            relative_path = relative_path.rsplit("/", 1)[-1]
+        return bool(self.pattern.match(relative_path))
+
+
+def _translate_glob(glob):
+    """Convert a `.gitignore` glob to a regular expression.
+
+    :param str glob: The glob, where `*` and `?` don't match `/`, and `**`
+        matches any number of directories.
+    :returns str: The regular expression, which matches whole paths.
+    """
+    pattern = ""
+    i = 0
+    while i < len(glob):
+        if glob.startswith("**/", i):
+            pattern += "(?:.*/)?"
+            i += 3
+        elif glob.startswith("**", i):
+            pattern += ".*"
+            i += 2
+        elif glob[i] == "*":
+            pattern += "[^/]*"
+            i += 1
+        elif glob[i] == "?":
+            pattern += "[^/]"
+            i += 1
+        elif glob[i] == "[" and "]" in glob[i + 2:]:
+            end = glob.index("]", i + 2)
+            contents = glob[i + 1:end].replace("\\", "\\\\")
+            if contents.startswith("!"):
+                contents = "^" + contents[1:]
+            pattern += "[" + contents + "]"
+            i = end + 1
+        else:
+            pattern += re.escape(glob[i])
+            i += 1
+    return pattern + r"\Z"
+
+
+def _read_ignore_rules(directory):
+    """Read the rules of the `.gitignore` file in a directory.
+
+    :param str directory: The absolute path of the directory.
+    :returns list: The `_IgnoreRule`s, in order, or an empty list if there
+        is no `.gitignore` file.
+    """
+    try:
+        with open(os.path.join(directory, ".gitignore")) as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return []
+
+    return [_IgnoreRule(directory, i.rstrip(" ")) for i in lines
+            if i.strip() and not i.startswith("#")]
+
+
+def _parent_ignore_rules(directory):
+    """Read the `.gitignore` files which apply to a directory from above it.
+
+    These are the files in its parent directories, up to the top of the git
+    repository that it's in.
+
+    :param str directory: The absolute path of the directory.
+    :returns list: The `_IgnoreRule`s, in order. If the directory isn't in a
+        git repository, this is empty.
+    """
+    parents = []
+    while not os.path.exists(os.path.join(directory, ".git")):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return []
+        directory = parent
+        parents.append(directory)
+
+    return [rule for parent in reversed(parents)
+            for rule in _read_ignore_rules(parent)]
+
+
+def _is_ignored(path, is_dir, rules):
+    """Check whether a path is ignored by `.gitignore` rules.
+
+    :param str path: The absolute path.
+    :param bool is_dir: Whether the path is a directory.
+    :param list rules: The `_IgnoreRule`s which apply, in order. The last
+        one that matches decides.
+    :returns bool:
+    """
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, is_dir):
+            ignored = not rule.negated
+    return ignored
@@ -12,16 +12,62 @@ Each language should declare a linter and then register linting functions:
 Then a client can call `linter.lint` on their source code to get a list of
 linting errors.
 """
+import bisect
 import collections
+import heapq
 
-from .tokenizer import tokenize
+from .matcher.dispatch import Dispatcher, with_rule
+from .profiling import timer
+from .tokenizer import (
+    BracketTable,
+    DEFAULT_TAB_WIDTH,
+    retokenize,
+    tokenize,
+    TokenTable,
+)
 
 
-class SourceCode(collections.namedtuple("SourceCode", ["filename", "tokens"])):
+_ANALYSES = {}
+"""The registered analyses of source code, by name. See `analysis`."""
+
+
+def analysis(name):
+    """Register a function as a named analysis of source code.
+
+    An analysis is computed the first time a linting function asks for it
+    with `SourceCode.analyze`, and then shared by every linting function
+    for that file:
+
+        @analysis("includes")
+        def find_all_includes(source):
+            return list(find_includes(source.tokens))
+
+    :param str name: The name of the analysis.
+    :returns function: A decorator which registers the function. The
+        function should take a `SourceCode` and return the result.
+    """
+    def decorator(func):
+        _ANALYSES[name] = func
+        return func
+    return decorator
+
+
+class SourceCode(collections.namedtuple("SourceCode", [
+    "filename",
+    "tokens",
+    "analysis_stats",
+], defaults=[None])):
     """The tokenized source code of a file.
 
     :ivar str filename: The name of the source file.
-    :ivar list tokens: The list of tokens in the file.
+    :ivar TokenTable tokens: The tokens in the file. This behaves like a
+        list of `Token`s.
+    :ivar AnalysisStats analysis_stats: The counters to record how often
+        analyses are reused in, such as those of a `Profile`, or `None`.
+
+    Rules which would otherwise scan every token can look tokens up by value
+    or by row instead. The indexes, and any other analysis registered with
+    `analysis`, are built lazily, once per file.
     """
 
     @property
@@ -29,11 +75,120 @@ class SourceCode(collections.namedtuple("SourceCode", ["filename", "tokens"])):
         """Whether or not this file is a header file."""
         return self.filename.endswith(".h")
 
+    @property
+    def value_index(self):
+        """A map from each token value to the indices of its tokens.
+
+        This is built the first time it's used (see `TokenTable.value_index`).
+
+        :returns dict:
+        """
+        return self.analyze("value_index")
+
+    @property
+    def row_index(self):
+        """The index of the first token on each row.
+
+        This is built the first time it's used (see `TokenTable.row_index`).
+
+        :returns list:
+        """
+        return self.analyze("row_index")
+
+    @property
+    def brackets(self):
+        """The matching brackets in the file.
+
+        This is built the first time it's used.
+
+        :returns BracketTable:
+        """
+        return self.analyze("brackets")
+
+    def analyze(self, name):
+        """Get the result of an analysis, computing it on first use.
+
+        The result is shared between every caller, so it shouldn't be
+        modified.
+
+        :param str name: The name the analysis was registered with (see
+            `analysis`).
+        :returns: The result of the analysis.
+        :raises KeyError: There is no analysis with that name.
+        """
+        results = self.__dict__.setdefault("_analyses", {})
+        if name in results:
+            if self.analysis_stats is not None:
+                self.analysis_stats.hits[name] += 1
+            return results[name]
+
+        result = _ANALYSES[name](self)
+        if self.analysis_stats is not None:
+            self.analysis_stats.misses[name] += 1
+        results[name] = result
+        return result
+
+    def indices_of(self, values):
+        """Find the tokens with any of the provided values.
+
+        :param iterable values: The token values to look for.
+        :returns list: The indices of the tokens, in order.
+        """
+        indices = [self.value_index.get(i, []) for i in values]
+        if len(indices) == 1:
+            return indices[0]
+        return list(heapq.merge(*indices))
+
+    def candidates(self, matcher):
+        """Find the tokens which could match a token matcher.
+
+        This only looks at each distinct token value once, rather than at
+        every token.
+
+        :param callable matcher: A token matcher, such as from `match_regex`.
+        :returns list: The indices of the tokens that the matcher could
+            match, in order. If the matcher doesn't only look at token values,
+            or the tokens aren't in a `TokenTable`, this is `None` instead.
+        """
+        value_matcher = getattr(matcher, "value_matcher", None)
+        if value_matcher is None or not isinstance(self.tokens, TokenTable):
+            return None
+        return self.indices_of([i for i in self.value_index
+                                if value_matcher(i)])
+
+    def tokens_on_row(self, row):
+        """Get the tokens which start on a row.
+
+        :param int row: The row, starting from zero.
+        :returns TokenSlice: The tokens.
+        """
+        row_index = self.row_index
+        return self.tokens[row_index[row]:row_index[row + 1]]
+
+
+@analysis("value_index")
+def _value_index(source):
+    """Index the tokens by value. See `SourceCode.value_index`."""
+    return source.tokens.value_index()
+
+
+@analysis("row_index")
+def _row_index(source):
+    """Index the tokens by row. See `SourceCode.row_index`."""
+    return source.tokens.row_index()
+
+
+@analysis("brackets")
+def _brackets(source):
+    """Match up the brackets. See `SourceCode.brackets`."""
+    return BracketTable.from_tokens(source.tokens)
+
 
 Error = collections.namedtuple("Error", [
     "message",
     "tokens",
-])
+    "rule",
+], defaults=[None])
 """A linter error.
 
 :ivar str message: The linting error to display to the user.
@@ -41,9 +196,37 @@ Error = collections.namedtuple("Error", [
     order that they appear in the source code. (This should be a contiguous
     subsequence of the list of tokens.) This is used to determine the
     line/column number, and to underline tokens.
+:ivar str rule: The name of the linting function which found the error.
+    Linting functions don't need to set this, as the `Linter` does.
 """
 
 
+class LintState(collections.namedtuple("LintState", [
+    "filename",
+    "tokens",
+    "results",
+])):
+    """The linting errors in a file, which can be updated after an edit.
+
+    See `Linter.lint_state` and `Linter.relint`.
+
+    :ivar str filename: The name of the source file.
+    :ivar TokenTable tokens: The tokens in the file.
+    :ivar list results: For each linting function, a list of pairs of the
+        index of the first token of a match and the errors found in that
+        match. A linting function which isn't run on matches has a single
+        pair with all of its errors.
+    """
+
+    @property
+    def errors(self):
+        """The errors in the file, in the same order as `Linter.lint`."""
+        return [error
+                for results in self.results
+                for _, errors in results
+                for error in errors]
+
+
 class Linter:
     """Lints source code and produces errors.
 
@@ -66,6 +249,11 @@ class Linter:
         """Initialize the linter with no linting functions."""
         self.linters = []
 
+        # The dispatcher for the linting functions, and the functions it was
+        # built for.
+        self._dispatcher = None
+        self._dispatched_linters = None
+
     def register(self, func):
         """Register the provided function as a linter.
 
@@ -83,18 +271,332 @@ class Linter:
         self.linters.append(func)
         return func
 
-    def lint(self, filename, code):
+    def select(self, select=None, ignore=None):
+        """Make a linter which only runs some of the linting functions.
+
+        The other functions are left out of the new linter entirely, so
+        their matchers, and any analyses only they ask for, never run.
+
+        :param list select: The names of the linting functions to run, or
+            `None` to run all of them.
+        :param list ignore: The names of the linting functions not to run,
+            or `None`.
+        :returns Linter: The new linter.
+        :raises ValueError: A name isn't the name of a linting function of
+            this linter.
+        """
+        names = [i.__name__ for i in self.linters]
+        unknown = sorted((set(select or []) | set(ignore or [])) -
+                         set(names))
+        if unknown:
+            raise ValueError("Unknown check(s): {}".format(", ".join(unknown)))
+
+        linter = Linter()
+        for name, func in zip(names, self.linters):
+            if select is not None and name not in select:
+                continue
+            if ignore is not None and name in ignore:
+                continue
+            linter.register(func)
+        return linter
+
+    def lint(self, filename, code, *, tab_width=DEFAULT_TAB_WIDTH,
+             profile=None, max_errors=None):
         """Find linting errors on the specified source code.
 
-        :param str code: The source code as a string.
+        :param str code: The source code as a string. It may contain tabs.
         :param str filename: The name of the source file.
+        :param int tab_width: The number of columns between tab stops, used to
+            compute the columns of token positions.
+        :param Profile profile: Optional. If provided, tokenizing, matching
+            and each linting function are timed, and the reuse of analyses
+            is counted.
+        :param int max_errors: Optional. If provided, linting stops as soon
+            as this many errors are found.
         :returns list: A list of `Error`s in the source code.
         """
-        errors = []
+        with timer(profile, "tokenize"):
+            tokens = tokenize(code, tab_width=tab_width)
+        source_code = _source_code(filename, tokens, profile)
+        return self.dispatcher.lint(source_code, profile=profile,
+                                    max_errors=max_errors)
+
+    def iter_lint(self, filename, code, *, tab_width=DEFAULT_TAB_WIDTH,
+                  profile=None):
+        """Find linting errors, yielding them in order as they're found.
+
+        Unlike `lint`, the errors aren't collected into a list first, so the
+        first errors are available before the rest of the file is linted, and
+        linting stops if the caller stops iterating. The errors are merged
+        from each linting function as they're yielded (see
+        `Dispatcher.iter_lint`).
+
+        :param str filename: The name of the source file.
+        :param str code: The source code as a string. It may contain tabs.
+        :param int tab_width: The number of columns between tab stops.
+        :param Profile profile: Optional. If provided, tokenizing, matching
+            and each linting function are timed, and the reuse of analyses
+            is counted.
+        :yields Error: The errors in the source code, in the order that their
+            tokens appear.
+        :raises ValueError: The source code couldn't be tokenized. This is
+            raised when the function is called, rather than while iterating.
+        """
+        with timer(profile, "tokenize"):
+            tokens = tokenize(code, tab_width=tab_width)
+        source_code = _source_code(filename, tokens, profile)
+        return self.dispatcher.iter_lint(source_code, profile=profile)
+
+    @property
+    def dispatcher(self):
+        """The dispatcher which runs the linting functions in a single pass.
+
+        It is rebuilt if the linting functions change.
+
+        :returns Dispatcher:
+        """
+        linters = tuple(self.linters)
+        if linters != self._dispatched_linters:
+            self._dispatcher = Dispatcher(linters)
+            self._dispatched_linters = linters
+        return self._dispatcher
+
+    def lint_stream(self, filename, tokens):
+        """Find linting errors in a stream of tokens as they are produced.
+
+        If every linting function only needs a bounded window of tokens (see
+        `with_matched_tokens.window`), the tokens are never all held in memory
+        at once. Otherwise, they are collected into a list first.
+
+        :param str filename: The name of the source file.
+        :param iterable tokens: The tokens in the source file, such as from
+            `iter_tokens`.
+        :yields Error: The errors in the source code. They are not
+            necessarily grouped by linting function.
+        """
+        decorators = [getattr(func, "matched_tokens", None)
+                      for func in self.linters]
+        if any(i is None or i.window is None for i in decorators):
+            source_code = SourceCode(filename=filename,
+                                     tokens=TokenTable.from_tokens(tokens))
+            for func in self.linters:
+                for error in func(source_code):
+                    yield with_rule(error, func.__name__)
+            return
 
+        # The linting functions only look at their matches.
+        source_code = SourceCode(filename=filename, tokens=None)
+        matchers = [(i.func, i.stream_matcher(), func.__name__)
+                    for i, func in zip(decorators, self.linters)]
+        for token in tokens:
+            for func, matcher, name in matchers:
+                match = matcher.feed(token)
+                if match is not None:
+                    for error in func(source_code, match=match):
+                        yield with_rule(error, name)
+
+    def lint_state(self, filename, code, *, tab_width=DEFAULT_TAB_WIDTH):
+        """Find linting errors, keeping enough state to update them later.
+
+        Takes the same arguments as `lint`.
+
+        :returns LintState: The errors in the source code, which can be
+            passed to `relint` after the code is edited.
+        """
         source_code = SourceCode(filename=filename,
-                                 tokens=tokenize(code))
+                                 tokens=tokenize(code, tab_width=tab_width))
+        return LintState(filename=filename,
+                         tokens=source_code.tokens,
+                         results=[_lint_matches(func, source_code)
+                                  for func in self.linters])
+
+    def relint(self, state, start, end, text):
+        """Update the linting errors in a file after an edit.
+
+        Only the tokens around the edit are re-tokenized (see `retokenize`).
+        Linting functions which only need a bounded window of tokens (see
+        `with_matched_tokens.window`) are re-run on the windows which overlap
+        the changed tokens, and their earlier errors are reused everywhere
+        else. Other linting functions are re-run on the whole file.
+
+        :param LintState state: The errors before the edit.
+        :param int start: The offset of the start of the edited range.
+        :param int end: The offset just past the end of the edited range.
+        :param str text: The replacement text for the range.
+        :returns LintState: The errors after the edit.
+        :raises ValueError: The edited source code couldn't be tokenized.
+        """
+        edit = retokenize(state.tokens, start, end, text)
+        tokens = edit.tokens
+        source_code = SourceCode(filename=state.filename, tokens=tokens)
+        shift = edit.new_stop - edit.old_stop
+
+        results = []
+        for func, old_results in zip(self.linters, state.results):
+            decorator = _windowed(func)
+            if decorator is None:
+                results.append(_lint_matches(func, source_code))
+                continue
+
+            # Earlier matches can't see the changed tokens.
+            matcher = decorator.stream_matcher()
+            resume = _resume_index(matcher,
+                                   tokens,
+                                   edit.first - decorator.window + 1)
+            indices = [i for i, _ in old_results]
+            head = bisect.bisect_left(indices, resume)
+            new_results = [(i, _move_errors(errors, tokens, 0))
+                           for i, errors in old_results[:head]]
+
+            # Match until we're far enough past the changed tokens that the
+            # rest of the matches are the same as before.
+            tail = len(old_results)
+            for i in range(resume, len(tokens)):
+                match = matcher.feed(tokens[i])
+                match_start = i - decorator.window + 1
+                if (match_start >= edit.new_stop + matcher.step - 1 and
+                        matcher.can_resume_at(tokens, match_start)):
+                    tail = bisect.bisect_left(indices, match_start - shift)
+                    break
+
+                if match is not None:
+                    errors = [with_rule(i, func.__name__)
+                              for i in decorator.func(source_code,
+                                                      match=match)]
+                    new_results.append((match_start, errors))
+
+            new_results.extend((i + shift, _move_errors(errors, tokens, shift))
+                               for i, errors in old_results[tail:])
+            results.append(new_results)
+
+        return LintState(filename=state.filename,
+                         tokens=tokens,
+                         results=results)
+
+    def lint_range(self, filename, code, start, end, *,
+                   tab_width=DEFAULT_TAB_WIDTH):
+        """Find linting errors in part of the source code.
+
+        Linting functions which only need a bounded window of tokens are only
+        run on the windows which overlap the range. Other linting functions
+        are run on the whole file.
+
+        :param str filename: The name of the source file.
+        :param str code: The source code as a string.
+        :param int start: The offset of the start of the range.
+        :param int end: The offset just past the end of the range.
+        :param int tab_width: The number of columns between tab stops.
+        :returns list: The `Error`s whose tokens overlap the range.
+        """
+        tokens = tokenize(code, tab_width=tab_width)
+        source_code = SourceCode(filename=filename, tokens=tokens)
+        span = tokens.span(start, end)
+
+        errors = []
         for func in self.linters:
-            errors.extend(func(source_code))
+            decorator = _windowed(func)
+            if decorator is None:
+                errors.extend(with_rule(i, func.__name__)
+                              for i in func(source_code))
+                continue
+
+            matcher = decorator.stream_matcher()
+            resume = _resume_index(matcher,
+                                   tokens,
+                                   span.start - decorator.window + 1)
+            stop = min(span.stop + decorator.window - 1, len(tokens))
+            for i in range(resume, stop):
+                match = matcher.feed(tokens[i])
+                if match is not None:
+                    errors.extend(with_rule(i, func.__name__)
+                                  for i in decorator.func(source_code,
+                                                          match=match))
+
+        return [i for i in errors if _error_in_range(i, start, end)]
+
+
+def _source_code(filename, tokens, profile):
+    """Make the `SourceCode` of a file being linted.
+
+    :param str filename: The name of the source file.
+    :param TokenTable tokens: The tokens in the file.
+    :param Profile profile: The profile to count the reuse of analyses in,
+        or `None`.
+    :returns SourceCode:
+    """
+    analysis_stats = None if profile is None else profile.analyses
+    return SourceCode(filename=filename,
+                      tokens=tokens,
+                      analysis_stats=analysis_stats)
+
+
+def _windowed(func):
+    """Get the decorator of a linting function which needs a bounded window.
+
+    :param function func: The linting function.
+    :returns with_matched_tokens: The decorator, or `None` if the function
+        needs the whole file.
+    """
+    decorator = getattr(func, "matched_tokens", None)
+    if decorator is None or decorator.window is None:
+        return None
+    return decorator
 
-        return errors
+
+def _lint_matches(func, source_code):
+    """Run a linting function, grouping its errors by match.
+
+    :param function func: The linting function.
+    :param SourceCode source_code: The source code to lint.
+    :returns list: The pairs of match index and errors (see `LintState`).
+    """
+    decorator = _windowed(func)
+    if decorator is None:
+        return [(0, [with_rule(i, func.__name__) for i in func(source_code)])]
+    return [(match[0].index,
+             [with_rule(i, func.__name__)
+              for i in decorator.func(source_code, match=match)])
+            for match in decorator.iter_matches(source_code)]
+
+
+def _resume_index(matcher, tokens, index):
+    """Find where to start matching to find every match after an index.
+
+    :param StreamMatcher matcher: The matcher to use.
+    :param TokenTable tokens: The tokens to match.
+    :param int index: The index of the first match to find.
+    :returns int: The index to feed tokens to `matcher` from.
+    """
+    index = max(0, index)
+    while not matcher.can_resume_at(tokens, index):
+        index -= 1
+    return index
+
+
+def _move_errors(errors, tokens, shift):
+    """Point errors at the same tokens in an updated token table.
+
+    :param list errors: The errors to move.
+    :param TokenTable tokens: The updated token table.
+    :param int shift: The change in the index of each token.
+    :returns list: The moved errors.
+    """
+    return [error._replace(tokens=[tokens[i.index + shift]
+                                   for i in error.tokens])
+            if isinstance(error, Error) else error
+            for error in errors]
+
+
+def _error_in_range(error, start, end):
+    """Check whether an error's tokens overlap a range of the source code.
+
+    :param Error error: The error.
+    :param int start: The offset of the start of the range.
+    :param int end: The offset just past the end of the range.
+    :returns bool: Whether the error overlaps the range. Errors without
+        tokens can't be placed, so they always overlap.
+    """
+    if not isinstance(error, Error) or not error.tokens:
+        return True
+    return (error.tokens[0].start_offset <= end and
+            error.tokens[-1].end_offset >= start)
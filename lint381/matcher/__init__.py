@@ -1,9 +1,13 @@
 """Basic tools to locally parse parts of the token stream."""
+import collections
 import functools
 import re
 
+from ..tokenizer import BracketTable, TokenSlice
 
-def match_tokens(tokens, *, start, end=None, lookahead=0, length=None):
+
+def match_tokens(tokens, *, start=None, end=None, lookahead=0, length=None,
+                 sequence=None, candidates=None, brackets=None):
     r"""Try to find a pattern marked by `start` and `end` in the token list.
 
     `start` and `end` are functions provided by the caller to specify if a
@@ -43,12 +47,18 @@ def match_tokens(tokens, *, start, end=None, lookahead=0, length=None):
 
     You can additionally specify a `lookahead` value to return extra tokens
     after the last matched token, or a `length` to specify that you only want
-    matches with a specific number of tokens.
+    matches with a specific number of tokens. To match an exact sequence of
+    token values, pass just the `sequence` instead.
+
+    If `end` is from `match_bracket`, the match instead ends at the bracket
+    which closes the first opening bracket at or after the start token. This
+    is looked up in a `BracketTable` rather than found by scanning, and
+    matches may be nested inside each other.
 
     :param list tokens: A sequence of tokens to find matches in.
     :param callable start: The function to match a starting token value
         against. The token is matched if `start` returns `True` when applied to
-        it.
+        it. Not needed if `sequence` is provided.
     :param callable end: Optional. The function to match an ending token value
         against. The token is matched if `end` returns `True` when applied to
         it. If not provided, only the single token matched by `start` will be
@@ -57,51 +67,328 @@ def match_tokens(tokens, *, start, end=None, lookahead=0, length=None):
         return. If there is a match, but there aren't enough additional
         lookahead tokens to return, no match is yielded.
     :param int length: The number of tokens to match, exactly.
-    :yields list: A subsequence of matched tokens.
+    :param list sequence: Optional. The values of the tokens to match,
+        exactly. If provided, `start`, `end` and `length` aren't needed.
+    :param list candidates: Optional. The indices of the only tokens which
+        could match `start`, in order, such as from `SourceCode.candidates`.
+        The other tokens are skipped over when looking for a start token.
+    :param BracketTable brackets: Optional. The brackets in `tokens`, such as
+        from `SourceCode.brackets`, for when `end` is from `match_bracket`. If
+        not provided, they are matched up when needed.
+    :yields TokenSlice: A view of each subsequence of matched tokens.
+    """
+    matcher = PositionMatcher(tokens,
+                              start=start,
+                              end=end,
+                              lookahead=lookahead,
+                              length=length,
+                              sequence=sequence,
+                              brackets=brackets)
+    if candidates is None:
+        candidates = range(len(tokens))
+
+    for i in candidates:
+        match = matcher.match_at(i)
+        if match is not None:
+            yield match
+
+
+def _sequence_matchers(sequence):
+    """Get the arguments to `match_tokens` which find a sequence of values.
+
+    Only the first and last tokens are checked by these, so the tokens in
+    between still need to be checked against the sequence.
+
+    :param list sequence: The values of the tokens.
+    :returns tuple: The `start`, `end` and `length` arguments.
+    """
+    return match_value(sequence[0]), match_value(sequence[-1]), len(sequence)
+
+
+class PositionMatcher:
+    """Find the matches of `match_tokens` one position at a time.
+
+    This lets the caller decide which positions to look for matches at, such
+    as only the tokens which could match `start`. The positions must be
+    increasing, since matches don't overlap (except for `match_bracket`
+    matches, which may be nested).
+
+        matcher = PositionMatcher(tokens, start=match_regex("^sizeof$"))
+        for i in candidates:
+            match = matcher.match_at(i)
+            if match is not None:
+                ...
     """
-    if end is None:
-        end = start
-
-    i = 0
-    while i < len(tokens):
-        start_token = tokens[i]
-        if start(start_token):
-            # Quick path in case we know the exact length we want.
-            if length is not None:
-                # Subtract one because we want an inclusive interval.
-                j = i + length - 1
-
-                try:
-                    end_token = tokens[j]
-                except IndexError:
-                    # We indexed out of bounds, so we can't possibly find a
-                    # match of the specified length anymore.
-                    break
-
-                end_index = j + lookahead
-                if end(end_token) and end_index < len(tokens):
-                    yield tokens[i:end_index + 1]
-            else:
-                # Scan ahead for the matching end token.
-                for j, end_token in enumerate(tokens[i:], i):
-                    # If we find a better starting point, use that instead.
-                    # This minimizes the distance between the start and the end
-                    # token.
-                    if start(end_token):
-                        start_token = end_token
-                        i = j
-
-                    if end(end_token):
-                        # If we can't provide enough lookahead, don't yield the
-                        # match at all.
-                        j += lookahead
-                        if j < len(tokens):
-                            yield tokens[i:j + 1]
-
-                        # Skip forward to this token.
-                        i = j
-                        break
-        i += 1
+
+    def __init__(self, tokens, *, start=None, end=None, lookahead=0,
+                 length=None, sequence=None, brackets=None):
+        """Initialize the matcher with the arguments to `match_tokens`.
+
+        :param list tokens: The tokens to find matches in.
+        """
+        if sequence is not None:
+            start, end, length = _sequence_matchers(sequence)
+            sequence = list(sequence)
+        if end is None:
+            end = start
+
+        self._tokens = tokens
+        self._value_at = _value_getter(tokens)
+        self._start = self._index_matcher(start)
+        self._end = self._index_matcher(end)
+        self._lookahead = lookahead
+        self._length = length
+        self._sequence = sequence
+
+        self._opener = getattr(end, "opener", None)
+        if self._opener is not None and brackets is None:
+            brackets = BracketTable.from_tokens(tokens)
+        self._brackets = brackets
+
+        # The index of the first token which could start the next match.
+        self._next_start = 0
+
+    def match_at(self, index):
+        """Find the match at a position, if there is one.
+
+        :param int index: The index of the token to start the match at.
+        :returns TokenSlice: The matched tokens, or `None` if there is no match
+            there. The match may actually start later than `index`, if
+            there's a better start before the end of the match.
+        """
+        if index < self._next_start or not self._start(index):
+            return None
+        elif self._opener is not None:
+            return self._match_bracket(index)
+        elif self._length is not None:
+            return self._match_length(index)
+        else:
+            return self._match_end(index)
+
+    def _index_matcher(self, matcher):
+        """Turn a token matcher into a matcher of token indices.
+
+        Matchers which only look at the token value are given the value
+        directly, so that no `Token` needs to be created.
+
+        :param callable matcher: The token matcher.
+        :returns function: A function which takes the index of a token.
+        """
+        value_matcher = getattr(matcher, "value_matcher", None)
+        if value_matcher is not None:
+            value_at = self._value_at
+            return lambda index: value_matcher(value_at(index))
+
+        tokens = self._tokens
+        return lambda index: matcher(tokens[index])
+
+    def _match_length(self, index):
+        """Find a match of a known length.
+
+        :param int index: The index of the start token.
+        :returns TokenSlice: The match, or `None`.
+        """
+        tokens = self._tokens
+
+        # Subtract one because we want an inclusive interval.
+        end_index = index + self._length - 1
+        last_index = end_index + self._lookahead
+        if last_index >= len(tokens) or not self._end(end_index):
+            return None
+
+        if self._sequence is not None:
+            values = map(self._value_at, range(index, end_index + 1))
+            if any(i != j for i, j in zip(values, self._sequence)):
+                return None
+
+        return TokenSlice.view(tokens, index, last_index + 1)
+
+    def _match_end(self, index):
+        """Scan ahead for the matching end token.
+
+        :param int index: The index of the start token.
+        :returns TokenSlice: The match, or `None`.
+        """
+        tokens = self._tokens
+        match = None
+        for j in range(index, len(tokens)):
+            # If we find a better starting point, use that instead. This
+            # minimizes the distance between the start and the end token.
+            if self._start(j):
+                index = j
+
+            if self._end(j):
+                # If we can't provide enough lookahead, don't return the
+                # match at all.
+                j += self._lookahead
+                if j < len(tokens):
+                    match = TokenSlice.view(tokens, index, j + 1)
+
+                # Skip forward to this token.
+                index = j
+                break
+
+        self._next_start = index + 1
+        return match
+
+    def _match_bracket(self, index):
+        """Find a match which ends at the bracket closing an opening bracket.
+
+        :param int index: The index of the start token.
+        :returns TokenSlice: The match, or `None`.
+        """
+        brackets = self._brackets
+
+        open_index = brackets.next_opener(self._opener, index)
+        if open_index is None:
+            return None
+
+        # If there's a later start token before the opening bracket, use that
+        # instead to keep the match tight.
+        if any(map(self._start, range(index + 1, open_index))):
+            return None
+
+        close_index = brackets.match(open_index)
+        if close_index is None:
+            return None
+
+        last_index = close_index + self._lookahead
+        if last_index >= len(self._tokens):
+            return None
+        return TokenSlice.view(self._tokens, index, last_index + 1)
+
+
+def _value_getter(tokens):
+    """Get a function which looks up the value of a token by its index.
+
+    For a `TokenTable` or a view of one, this doesn't create any `Token`s.
+
+    :param Sequence tokens: The tokens.
+    :returns function: A function from a token index to its value.
+    """
+    value_at = getattr(tokens, "value_at", None)
+    if value_at is not None:
+        return value_at
+    return lambda index: tokens[index].value
+
+
+def window_size(*, start=None, end=None, lookahead=0, length=None,
+                sequence=None):
+    """Get the number of tokens spanned by a match, if it is bounded.
+
+    Takes the same arguments as `match_tokens`.
+
+    :returns int: The number of tokens in every match, including lookahead,
+        or `None` if matches can be arbitrarily long.
+    """
+    if sequence is not None:
+        return len(sequence) + lookahead
+    elif length is not None:
+        return length + lookahead
+    elif end is None:
+        return 1 + lookahead
+    else:
+        return None
+
+
+class StreamMatcher:
+    """Find matches in a stream of tokens, one token at a time.
+
+    This finds the same matches as `match_tokens`, but only keeps a window of
+    the most recent tokens in memory, so it can be used on tokens as they are
+    produced by the tokenizer. Only matches of a bounded size can be found
+    this way (see `window_size`).
+
+        matcher = StreamMatcher(start=match_regex("^sizeof$"), length=4)
+        for token in tokens:
+            match = matcher.feed(token)
+            if match is not None:
+                ...
+    """
+
+    def __init__(self, *, start=None, end=None, lookahead=0, length=None,
+                 sequence=None):
+        """Initialize the matcher with the arguments to `match_tokens`.
+
+        :raises ValueError: The matches would not be of a bounded size.
+        """
+        self._size = window_size(start=start,
+                                 end=end,
+                                 lookahead=lookahead,
+                                 length=length,
+                                 sequence=sequence)
+        if self._size is None:
+            raise ValueError("Only matches with a length or without an end "
+                             "can be found in a stream")
+
+        if sequence is not None:
+            start, end, length = _sequence_matchers(sequence)
+            sequence = list(sequence)
+        self._start = start
+        self._end = end
+        self._length = length
+        self._sequence = sequence
+        self._window = collections.deque(maxlen=self._size)
+
+        # After a match, `match_tokens` skips ahead this many tokens before
+        # looking for the next one.
+        if length is not None:
+            self.step = 1
+        else:
+            self.step = self._size
+
+        # The number of tokens fed so far, and the index of the next token
+        # that could start a match.
+        self._num_tokens = 0
+        self._next_start = 0
+
+    def feed(self, token):
+        """Add the next token in the stream.
+
+        :param Token token: The next token.
+        :returns list: The match which was completed by this token, or `None`
+            if there was no such match.
+        """
+        self._window.append(token)
+        self._num_tokens += 1
+
+        # The window holds exactly the tokens of a potential match starting
+        # at this index.
+        i = self._num_tokens - self._size
+        if i < self._next_start:
+            return None
+
+        if not self._start(self._window[0]):
+            return None
+
+        if self._length is not None:
+            if not self._end(self._window[self._length - 1]):
+                return None
+            if self._sequence is not None:
+                values = [self._window[j].value for j in range(self._length)]
+                if values != self._sequence:
+                    return None
+            self._next_start = i + 1
+        else:
+            # `match_tokens` skips over the lookahead tokens after a match.
+            self._next_start = i + self._size
+
+        return list(self._window)
+
+    def can_resume_at(self, tokens, index):
+        """Check whether matching can start from the middle of a sequence.
+
+        Matches can't overlap, so whether a match starts at a token depends
+        on the matches before it. But if none of the few tokens before
+        `index` could start a match, then the matches from `index` onward
+        are the same as if matching had started from the beginning.
+
+        :param list tokens: The sequence of tokens.
+        :param int index: The index to start matching from.
+        :returns bool: Whether a new matcher can be fed `tokens[index:]`.
+        """
+        previous = tokens[max(0, index - self.step + 1):index]
+        return not any(self._start(i) for i in previous)
 
 
 def match_regex(regex):
@@ -110,8 +397,45 @@ def match_regex(regex):
     :param str regex: The regex to match the token value against.
     :returns function: The matcher.
     """
+    def value_matcher(value):
+        return re.match(regex, value) is not None
+
+    def matcher(token):
+        return value_matcher(token.value)
+    matcher.value_matcher = value_matcher
+    return matcher
+
+
+def match_value(value):
+    """Return a matcher that matches tokens with exactly the provided value.
+
+    :param str value: The token value.
+    :returns function: The matcher.
+    """
+    def value_matcher(token_value):
+        return token_value == value
+
+    def matcher(token):
+        return token.value == value
+    matcher.value_matcher = value_matcher
+    return matcher
+
+
+def match_bracket(opener):
+    """Return an `end` matcher for the bracket which closes another.
+
+    Used as the `end` of `match_tokens`, this ends each match at the bracket
+    which closes the first `opener` at or after the start of the match.
+
+    :param str opener: The opening bracket, one of `(`, `[` or `{`.
+    :returns function: The matcher. On its own, it matches any closing
+        bracket of the right kind.
+    """
+    closer = BracketTable.CLOSERS[opener]
+
     def matcher(token):
-        return re.match(regex, token.value) is not None
+        return token.value == closer
+    matcher.opener = opener
     return matcher
 
 
@@ -123,6 +447,7 @@ def match_type(type):
     """
     def matcher(token):
         return token.type == type
+    matcher.type = type
     return matcher
 
 
@@ -151,13 +476,20 @@ class with_matched_tokens:
         @with_matched_tokens(start=foo, end=bar, ...)
         def flag_something(source, *, match):
             ...
+
+    If the linting function looks at any tokens other than the ones in its
+    match (through `source.tokens`), pass `local=False`, so that it isn't run
+    on a stream of tokens (see `Linter.lint_stream`).
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, *, local=True, **kwargs):
         """Initialize the decorator with the arguments to `match_tokens`.
 
+        :param bool local: Whether the function only looks at the tokens in
+            its match.
         :param dict kwargs: The keyword arguments to pass to `match_tokens`.
         """
+        self._local = local
         self._kwargs = kwargs
 
     def __call__(self, func):
@@ -171,7 +503,90 @@ class with_matched_tokens:
         @functools.wraps(func)
         def wrapped(*args, **kwargs):
             source = args[0]
-            for match in match_tokens(source.tokens, **self._kwargs):
+            for match in self.iter_matches(source):
                 kwargs["match"] = match
                 yield from func(*args, **kwargs)
+        wrapped.matched_tokens = self
+        self.func = func
         return wrapped
+
+    @property
+    def window(self):
+        """The number of tokens the linter function needs to see at once.
+
+        :returns int: The size of every match, or `None` if the linter
+            function needs the whole file. The function needs the whole file
+            if its matches are unbounded, or if it was declared with
+            `local=False` because it looks at tokens outside of its match.
+        """
+        if not self._local:
+            return None
+        return window_size(**self._kwargs)
+
+    @property
+    def start(self):
+        """The matcher for the first token of each match.
+
+        :returns callable:
+        """
+        sequence = self.sequence
+        if sequence is not None:
+            return match_value(sequence[0])
+        return self._kwargs["start"]
+
+    @property
+    def lookahead(self):
+        """The number of extra tokens after the end of each match.
+
+        :returns int:
+        """
+        return self._kwargs.get("lookahead", 0)
+
+    @property
+    def sequence(self):
+        """The exact values of the tokens to match, if provided.
+
+        :returns list: The values, or `None`.
+        """
+        return self._kwargs.get("sequence")
+
+    def iter_matches(self, source):
+        """Find this function's matches in a source file.
+
+        Only the tokens which could start a match are looked at (see
+        `SourceCode.candidates`).
+
+        :param SourceCode source: The source file.
+        :yields list: Each match.
+        """
+        return match_tokens(source.tokens,
+                            candidates=source.candidates(self.start),
+                            brackets=self._brackets(source),
+                            **self._kwargs)
+
+    def position_matcher(self, source):
+        """Create a matcher to find this function's matches at positions.
+
+        :param SourceCode source: The source file.
+        :returns PositionMatcher:
+        """
+        return PositionMatcher(source.tokens,
+                               brackets=self._brackets(source),
+                               **self._kwargs)
+
+    def _brackets(self, source):
+        """Get the brackets of a source file, if the matches need them.
+
+        :param SourceCode source: The source file.
+        :returns BracketTable: The brackets, or `None`.
+        """
+        if getattr(self._kwargs.get("end"), "opener", None) is None:
+            return None
+        return source.brackets
+
+    def stream_matcher(self):
+        """Create a matcher to find this function's matches in a stream.
+
+        :returns StreamMatcher:
+        """
+        return StreamMatcher(**self._kwargs)
@@ -0,0 +1,335 @@
+"""Run many linting functions over the tokens of a file in a single pass."""
+import collections
+import functools
+import heapq
+import itertools
+
+from ..profiling import timer
+from ..tokenizer import TokenTable
+
+_VALUE_CACHE_SIZE = 65536
+"""The number of distinct token values to remember the rules for."""
+
+
+class _TrieNode:
+    """A node in a trie of sequences of token values.
+
+    :ivar dict children: A map from the next token value to the next node.
+    :ivar list rules: The rules whose sequences end at this node, as pairs of
+        the index of the rule and its lookahead.
+    """
+
+    __slots__ = ["children", "rules"]
+
+    def __init__(self):
+        """Create a node with no children or rules."""
+        self.children = {}
+        self.rules = []
+
+
+class Dispatcher:
+    """Runs linting functions, finding all of their matches in one pass.
+
+    Rather than have each function wrapped by `with_matched_tokens` scan the
+    tokens for its own matches, the dispatcher walks the tokens once and
+    offers each position only to the functions whose `start` could match it:
+
+      * A `start` which only looks at the token value (such as from
+        `match_regex`) is looked up by value. Each distinct value is checked
+        against each such `start` only once.
+      * A `start` which only looks at the token type (from `match_type`) is
+        looked up by type.
+      * Functions which match a `sequence` of values share a trie, which is
+        walked from each token.
+      * Any other `start` is offered every position.
+
+    Other linting functions are called with the whole file, as usual.
+    """
+
+    def __init__(self, funcs):
+        """Build the dispatch tables for the linting functions.
+
+        :param list funcs: The linting functions, in order.
+        """
+        self._funcs = list(funcs)
+        self._names = [i.__name__ for i in self._funcs]
+
+        # The function to call for each rule: the wrapped function for rules
+        # which are called with each match, and otherwise the rule itself.
+        self._rule_funcs = [getattr(getattr(i, "matched_tokens", None),
+                                    "func", i)
+                            for i in self._funcs]
+        self._value_rules = []
+        self._type_rules = collections.defaultdict(list)
+        self._other_rules = []
+        self._trie = _TrieNode()
+
+        for i, func in enumerate(self._funcs):
+            decorator = getattr(func, "matched_tokens", None)
+            if decorator is None:
+                continue
+
+            if decorator.sequence is not None:
+                node = self._trie
+                for value in decorator.sequence:
+                    node = node.children.setdefault(value, _TrieNode())
+                node.rules.append((i, decorator.lookahead))
+            elif hasattr(self._start(i), "value_matcher"):
+                self._value_rules.append(i)
+            elif hasattr(self._start(i), "type"):
+                self._type_rules[self._start(i).type].append(i)
+            else:
+                self._other_rules.append(i)
+
+        self._rules_for_value = functools.lru_cache(
+            maxsize=_VALUE_CACHE_SIZE)(self._find_rules_for_value)
+
+    def _find_rules_for_value(self, value):
+        """Find the rules whose `start` could match a token value.
+
+        :param str value: The token value.
+        :returns tuple: The indices of the rules.
+        """
+        return tuple(i for i in self._value_rules
+                     if self._start(i).value_matcher(value))
+
+    def _start(self, rule):
+        """Get the `start` matcher of a rule.
+
+        :param int rule: The index of the rule.
+        :returns callable:
+        """
+        return self._funcs[rule].matched_tokens.start
+
+    def lint(self, source, *, profile=None, max_errors=None):
+        """Run the linting functions on a file.
+
+        :param SourceCode source: The file.
+        :param Profile profile: Optional. If provided, the matching is timed
+            as the "match" stage, and each linting function is timed as a
+            stage of its own, nested in it.
+        :param int max_errors: Optional. If provided, linting stops as soon
+            as this many errors are found, and only those are returned.
+        :returns list: The errors, in the same order as if each linting
+            function were called in turn, with their `rule` set.
+        """
+        funcs = self._rule_funcs
+        if profile is not None:
+            funcs = [profile.wrap("rule:{}".format(func.__name__), rule_func)
+                     for func, rule_func in zip(self._funcs, funcs)]
+
+        errors = [[] for _ in self._funcs]
+        if max_errors is not None:
+            funcs = _limit_errors(funcs, errors, max_errors)
+
+        with timer(profile, "match"):
+            try:
+                self._lint(source, funcs, errors)
+            except _ErrorLimitReached:
+                pass
+        names = self._names
+        return [with_rule(error, names[rule])
+                for rule, rule_errors in enumerate(errors)
+                for error in rule_errors]
+
+    def iter_lint(self, source, *, profile=None):
+        """Run the linting functions on a file, yielding errors as found.
+
+        The errors of the functions called with each match are buffered only
+        until the scan has passed the row of their first token, and are
+        merged with the errors of the other functions as they're yielded.
+        This yields the errors in the order that their tokens appear, as long
+        as each function yields its errors in that order and doesn't report
+        tokens on rows before the start of its match.
+
+        :param SourceCode source: The file.
+        :param Profile profile: Optional. If provided, the matching is timed
+            as the "match" stage, and each linting function is timed as a
+            stage of its own, nested in it.
+        :yields Error: The errors, with their `rule` set, ordered by their
+            first token. Errors which start at the same token are in the
+            order of the linting functions.
+        """
+        funcs = self._rule_funcs
+        if profile is not None:
+            funcs = [profile.wrap("rule:{}".format(func.__name__), rule_func)
+                     for func, rule_func in zip(self._funcs, funcs)]
+
+        streams = [self._iter_matched(source, funcs)]
+        for rule, func in enumerate(self._funcs):
+            if not hasattr(func, "matched_tokens"):
+                streams.append(_tag_errors(rule, funcs[rule], source))
+
+        merged = heapq.merge(*streams, key=_error_order)
+        names = self._names
+        errors = (with_rule(error, names[rule]) for rule, error in merged)
+        if profile is not None:
+            errors = profile.time_iter("match", errors)
+        return errors
+
+    def _lint(self, source, funcs, errors):
+        """Run the linting functions on a file.
+
+        :param SourceCode source: The file.
+        :param list funcs: The function to call for each rule. For rules
+            wrapped by `with_matched_tokens`, this is called with each match.
+        :param list errors: The errors for each rule, to add to.
+        """
+        for _, rule, match in self._scan(source):
+            errors[rule].extend(funcs[rule](source, match=match))
+
+        for rule, func in enumerate(self._funcs):
+            if not hasattr(func, "matched_tokens"):
+                errors[rule].extend(funcs[rule](source))
+
+    def _iter_matched(self, source, funcs):
+        """Run the rules called with each match, in order of position.
+
+        :param SourceCode source: The file.
+        :param list funcs: The function to call for each rule.
+        :yields tuple: The index of the rule and each error, ordered by the
+            error's first token and then by rule.
+        """
+        tokens = source.tokens
+        pending = []
+        order = itertools.count()
+        for index, rule, match in self._scan(source):
+            if pending:
+                # No match from here on can report an error on an earlier
+                # row, so the errors on those rows are ready.
+                row = tokens[index].start.row
+                while pending and pending[0][0].row < row:
+                    _, rule_index, _, error = heapq.heappop(pending)
+                    yield rule_index, error
+
+            for error in funcs[rule](source, match=match):
+                heapq.heappush(pending, (error.tokens[0].start, rule,
+                                         next(order), error))
+
+        while pending:
+            _, rule_index, _, error = heapq.heappop(pending)
+            yield rule_index, error
+
+    def _scan(self, source):
+        """Find the matches of the rules called with each match.
+
+        :param SourceCode source: The file.
+        :yields tuple: The index of the token where the match starts, the
+            index of the rule and the match, in order of the token.
+        """
+        tokens = source.tokens
+        if isinstance(tokens, TokenTable):
+            values = list(tokens.values())
+            types = tokens.types()
+        else:
+            values = [i.value for i in tokens]
+            types = [i.type for i in tokens]
+
+        matchers = {}
+        for i, (value, type) in enumerate(zip(values, types)):
+            rules = itertools.chain(self._rules_for_value(value),
+                                    self._type_rules.get(type, ()),
+                                    self._other_rules)
+            for rule in rules:
+                matcher = matchers.get(rule)
+                if matcher is None:
+                    decorator = self._funcs[rule].matched_tokens
+                    matcher = decorator.position_matcher(source)
+                    matchers[rule] = matcher
+
+                match = matcher.match_at(i)
+                if match is not None:
+                    yield i, rule, match
+
+            for rule, match in self._match_sequences(source, values, i):
+                yield i, rule, match
+
+    def _match_sequences(self, source, values, index):
+        """Find the rules whose sequence of values starts at a position.
+
+        :param SourceCode source: The file.
+        :param list values: The value of each token.
+        :param int index: The index of the first token of the sequence.
+        :yields tuple: The index of each rule which matches, and its match.
+        """
+        node = self._trie.children.get(values[index])
+        i = index
+        while node is not None:
+            for rule, lookahead in node.rules:
+                last_index = i + lookahead
+                if last_index < len(values):
+                    yield rule, source.tokens[index:last_index + 1]
+
+            i += 1
+            if i == len(values):
+                break
+            node = node.children.get(values[i])
+
+
+def with_rule(error, name):
+    """Record which linting function found an error.
+
+    :param error: The error. Linting functions may yield values other than
+        `Error`s, which are returned as they are.
+    :param str name: The name of the linting function.
+    :returns: The error, with its `rule` set to `name`.
+    """
+    if hasattr(error, "rule"):
+        return error._replace(rule=name)
+    return error
+
+
+def _tag_errors(rule, func, source):
+    """Run a rule called with the whole file, tagging its errors.
+
+    :param int rule: The index of the rule.
+    :param function func: The function to call for the rule.
+    :param SourceCode source: The file.
+    :yields tuple: The index of the rule and each error.
+    """
+    for error in func(source):
+        yield rule, error
+
+
+def _error_order(item):
+    """Get the key to merge the errors of rules by.
+
+    :param tuple item: The index of a rule, and one of its errors.
+    :returns tuple:
+    """
+    rule, error = item
+    return error.tokens[0].start, rule
+
+
+class _ErrorLimitReached(Exception):
+    """Raised to stop linting once enough errors are found."""
+
+
+def _limit_errors(funcs, errors, max_errors):
+    """Wrap linting functions to stop linting once enough errors are found.
+
+    Each wrapped function adds the errors it yields straight to `errors`, so
+    that none are lost when linting stops, and returns nothing. Once
+    `max_errors` errors have been added, it stops pulling errors from the
+    linting function and raises `_ErrorLimitReached`.
+
+    :param list funcs: The function to call for each rule.
+    :param list errors: The errors for each rule, to add to.
+    :param int max_errors: The number of errors to stop at.
+    :returns list: The wrapped functions.
+    """
+    remaining = max_errors
+
+    def limit(func, rule_errors):
+        def limited(*args, **kwargs):
+            nonlocal remaining
+            for error in func(*args, **kwargs):
+                rule_errors.append(error)
+                remaining -= 1
+                if remaining <= 0:
+                    raise _ErrorLimitReached()
+            return ()
+        return limited
+
+    return [limit(func, rule_errors)
+            for func, rule_errors in zip(funcs, errors)]
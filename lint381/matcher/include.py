@@ -3,6 +3,7 @@ import collections
 import functools
 
 from . import match_regex, match_tokens
+from ..linter import analysis
 
 
 class Include(collections.namedtuple("Include", ["tokens"])):
@@ -52,33 +53,55 @@ def with_includes(func):
             ...
 
     The value of `includes` is a list of `Include`s in the order that they
-    appear in the file.
+    appear in the file. The includes are only found once per file, and the
+    list is shared between linting functions, so it shouldn't be modified.
     """
     @functools.wraps(func)
     def wrapped(*args, **kwargs):
         source = args[0]
-        includes = list(find_includes(source.tokens))
-        kwargs["includes"] = includes
+        kwargs["includes"] = source.analyze("includes")
         return func(*args, **kwargs)
     return wrapped
 
 
-def find_includes(tokens):
+@analysis("includes")
+def _includes(source):
+    """Find the includes in a source file. See `with_includes`.
+
+    :param SourceCode source: The source code.
+    :returns list: The `Include`s in the order that they appear in the file.
+    """
+    return list(find_includes(source.tokens,
+                              source.indices_of(["#include"])))
+
+
+def find_includes(tokens, candidates=None):
     """Find all of the #includes directives in a source file.
 
     :param list tokens: The list of tokens in the source code.
+    :param list candidates: Optional. The indices of the `#include` tokens,
+        such as from `SourceCode.indices_of`. If not provided, every token is
+        checked.
     :yields Include: The includes in the order that they appear in the file.
     """
-    for i, token in enumerate(tokens[:-1]):
-        if token.value != "#include":
-            continue
+    if candidates is None:
+        candidates = [i for i, token in enumerate(tokens)
+                      if token.value == "#include"]
+
+    for i in candidates:
+        # There's nothing to include at the end of the file.
+        if i + 1 >= len(tokens):
+            break
+
+        token = tokens[i]
 
         if tokens[i + 1].type == "string":
             yield Include(tokens[i:i + 2])
         else:
-            angle_include = match_tokens(tokens[i + 1:],
+            angle_include = match_tokens(tokens,
                                          start=match_regex("^<$"),
-                                         end=match_regex("^>$"))
+                                         end=match_regex("^>$"),
+                                         candidates=range(i + 1, len(tokens)))
             try:
                 angle_include = next(angle_include)
             except StopIteration:
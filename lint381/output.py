@@ -0,0 +1,245 @@
+"""Renders linting errors for display.
+
+Errors are rendered as text for people to read by default. For other tools,
+they can be rendered as JSON Lines, with one object per error:
+
+    {"path": "src/foo.cpp", "row": 3, "column": 1, "end_row": 3,
+     "end_column": 8, "rule": "prohibited_types",
+     "message": "Prohibited type 'unsigned'"}
+
+Unlike in text, columns count characters, so a tab is one column whatever
+`--tab-width` is.
+
+Or as a SARIF log, which is streamed as the errors are found: print
+`sarif_header()`, then each rendered error separated by `SARIF_SEPARATOR`,
+then `SARIF_FOOTER`.
+"""
+import json
+import os
+import urllib.parse
+
+import click
+
+from . import __version__
+
+FORMATS = ["text", "jsonl", "sarif"]
+"""The formats that errors can be rendered in."""
+
+SARIF_SEPARATOR = ",\n"
+"""Separates the errors in a SARIF log."""
+
+SARIF_FOOTER = "\n]}]}\n"
+"""Ends a SARIF log."""
+
+_SARIF_SCHEMA = ("https://docs.oasis-open.org/sarif/sarif/v2.1.0/os/schemas/"
+                 "sarif-schema-2.1.0.json")
+"""The JSON schema of SARIF logs."""
+
+
+def format_errors(errors, filename, lines, *, color=True):
+    """Render the errors for a file.
+
+    :param list errors: The `Error`s found in the file.
+    :param str filename: The name of the file.
+    :param LineTable lines: The line table of the file's source code.
+    :param bool color: Whether to style the output for a terminal.
+    :returns str: The output to print.
+    """
+    return "".join(format_each_error(errors, filename, lines, color=color))
+
+
+def format_each_error(errors, filename, lines, *, color=True):
+    """Render each of the errors for a file separately.
+
+    :param list errors: The `Error`s found in the file.
+    :param str filename: The name of the file.
+    :param LineTable lines: The line table of the file's source code.
+    :param bool color: Whether to style the output for a terminal.
+    :returns list: The output to print for each error, in the order that
+        their tokens appear.
+    """
+    # Display errors in the order that their tokens appear, rather than in
+    # the order that we found the errors.
+    return [format_error(error, filename, lines, color=color)
+            for error in sorted(errors, key=error_position)]
+
+
+def format_error(error, filename, lines, *, color=True):
+    """Render an error.
+
+    :param Error error: The error.
+    :param str filename: The name of the file.
+    :param LineTable lines: The line table of the file's source code.
+    :param bool color: Whether to style the output for a terminal.
+    :returns str:
+    """
+    return (format_message(filename, error_position(error), error.message,
+                           color=color) +
+            format_tokens(error, lines, color=color))
+
+
+def error_position(error):
+    """Get the position that an error is reported at.
+
+    This can be used as a key to sort errors in the order that their tokens
+    appear.
+
+    :param Error error: The error.
+    :returns Position:
+    """
+    return error.tokens[0].start
+
+
+def format_message(filename, location, message, *, color=True):
+    """Render an error message.
+
+    :param str filename: The name of the file.
+    :param Position location: The location of the error, or `None` if it's
+        about the whole file.
+    :param str message: The error message.
+    :param bool color: Whether to style the output for a terminal.
+    :returns str:
+    """
+    if location is None:
+        prefix = "{filename}: ".format(filename=filename)
+    else:
+        prefix = "{filename}:{row}:{column}: ".format(
+            filename=filename,
+            row=location.row + 1,
+            column=location.column + 1,
+        )
+
+    if not color:
+        return prefix + "error: " + message + "\n"
+    return (click.style(prefix, bold=True) +
+            click.style("error: ", fg="red", bold=True) +
+            message + "\n")
+
+
+def format_tokens(error, lines, *, color=True):
+    """Render and underline the afflicted tokens in the error.
+
+    :param Error error: The error.
+    :param LineTable lines: The line table of the file's source code.
+    :param bool color: Whether to style the output for a terminal.
+    :returns str:
+    """
+    start = error.tokens[0].start
+    end = error.tokens[-1].end
+
+    line = lines.line(start.row)
+
+    if start.row == end.row:
+        underline_length = (end.column - start.column) + 1
+    else:
+        # It's possible for an error to span more than one line. The simplest
+        # example is a multi-line comment. In that case, only underline tokens
+        # on the first line.
+        underline_length = len(line) - start.column
+    underline_string = "^" * underline_length
+    underline_string = (" " * start.column) + underline_string
+
+    if color:
+        underline_string = click.style(underline_string, fg="green",
+                                       bold=True)
+    return line + "\n" + underline_string + "\n"
+
+
+def error_record(error, path, lines):
+    """Describe an error for tools to read.
+
+    :param Error error: The error.
+    :param str path: The path to the file.
+    :param LineTable lines: The line table of the file's source code.
+    :returns dict: The path, the rule and the message of the error, and the
+        row and column of its first and last characters. Rows and columns
+        start from one, and columns count characters.
+    """
+    start = error_position(error)
+    end = error.tokens[-1].end
+    return {
+        "path": path,
+        "row": start.row + 1,
+        "column": lines.character_column(start) + 1,
+        "end_row": end.row + 1,
+        "end_column": lines.character_column(end) + 1,
+        "rule": error.rule,
+        "message": error.message,
+    }
+
+
+def failure_record(path, message):
+    """Describe an error about a whole file, such as if it can't be read.
+
+    :param str path: The path to the file.
+    :param str message: The error message.
+    :returns dict: The same fields as `error_record`, where those other than
+        the path and message are `None`.
+    """
+    return {
+        "path": path,
+        "row": None,
+        "column": None,
+        "end_row": None,
+        "end_column": None,
+        "rule": None,
+        "message": message,
+    }
+
+
+def format_record(record, output_format):
+    """Render an error for tools to read.
+
+    :param dict record: The error, from `error_record` or `failure_record`.
+    :param str output_format: "jsonl" or "sarif".
+    :returns str: A line of JSON Lines, or a SARIF result. SARIF results
+        must be separated by `SARIF_SEPARATOR`.
+    """
+    if output_format == "jsonl":
+        return json.dumps(record) + "\n"
+
+    location = {
+        "artifactLocation": {
+            "uri": urllib.parse.quote(record["path"].replace(os.sep, "/")),
+        },
+    }
+    if record["row"] is not None:
+        # SARIF regions end after their last character.
+        location["region"] = {
+            "startLine": record["row"],
+            "startColumn": record["column"],
+            "endLine": record["end_row"],
+            "endColumn": record["end_column"] + 1,
+        }
+
+    result = {}
+    if record["rule"] is not None:
+        result["ruleId"] = record["rule"]
+    result["level"] = "error"
+    result["message"] = {"text": record["message"]}
+    result["locations"] = [{"physicalLocation": location}]
+    return json.dumps(result)
+
+
+def sarif_header():
+    """Start a SARIF log.
+
+    :returns str: The start of the log, up to its first result.
+    """
+    log = {
+        "version": "2.1.0",
+        "$schema": _SARIF_SCHEMA,
+        "runs": [{
+            "tool": {
+                "driver": {
+                    "name": "lint381",
+                    "version": __version__,
+                    "informationUri": "https://github.com/arxanas/lint381",
+                },
+            },
+            "columnKind": "unicodeCodePoints",
+            "results": [],
+        }],
+    }
+    # Leave the list of results open.
+    return json.dumps(log)[:-len(SARIF_FOOTER.strip())] + "\n"
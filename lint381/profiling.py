@@ -0,0 +1,240 @@
+"""Measures how long each stage of linting and each linting function takes.
+
+Stages are timed with `Profile.time`, which can be nested:
+
+    profile = Profile()
+    with profile.time("lint"):
+        with profile.time("tokenize"):
+            tokens = tokenize(code)
+        ...
+
+The time spent in a nested stage is counted in the total time of the
+enclosing stage, but not in its own time. A profile also counts how often the
+analyses of each file (see `lint381.linter.analysis`) are reused.
+"""
+import collections
+import contextlib
+import marshal
+import time
+
+
+class AnalysisStats:
+    """Counts how often analyses of source code are reused.
+
+    :ivar collections.Counter hits: For each analysis, the number of times
+        an earlier result was reused.
+    :ivar collections.Counter misses: For each analysis, the number of times
+        it was computed.
+    """
+
+    def __init__(self):
+        """Initialize the counters to zero."""
+        self.hits = collections.Counter()
+        self.misses = collections.Counter()
+
+    def hit_rate(self, name=None):
+        """The fraction of requests for an analysis which reused a result.
+
+        :param str name: Optional. The name of the analysis. If not
+            provided, the rate over every analysis is returned.
+        :returns float: The hit rate, or `None` if there were no requests.
+        """
+        if name is None:
+            hits = sum(self.hits.values())
+            misses = sum(self.misses.values())
+        else:
+            hits = self.hits[name]
+            misses = self.misses[name]
+
+        if not hits + misses:
+            return None
+        return hits / (hits + misses)
+
+    def merge(self, other):
+        """Add the counters of another `AnalysisStats` to these.
+
+        :param AnalysisStats other: The other counters.
+        """
+        self.hits.update(other.hits)
+        self.misses.update(other.misses)
+
+
+class Profile:
+    """The call counts and wall times of the stages of linting.
+
+    :ivar dict stats: For each stage, a list of the number of calls, the
+        time spent in the stage itself, and the total time including nested
+        stages, in seconds.
+    :ivar dict locations: For stages which are functions, the filename and
+        line number of the function.
+    :ivar AnalysisStats analyses: How often the analyses of the files were
+        reused.
+    """
+
+    def __init__(self):
+        """Create a profile with no stages."""
+        self.stats = {}
+        self.locations = {}
+        self.analyses = AnalysisStats()
+
+        # The time spent in stages nested in each running stage.
+        self._nested = []
+
+    @contextlib.contextmanager
+    def time(self, name, *, calls=1):
+        """Time a stage.
+
+        This should be used as a context manager:
+
+            with profile.time("tokenize"):
+                ...
+
+        :param str name: The name of the stage.
+        :param int calls: The number of calls to count.
+        """
+        self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+            self.add(name, elapsed - nested, elapsed, calls)
+
+    def time_iter(self, name, iterable):
+        """Time a stage which produces its results lazily.
+
+        Only the time spent producing each item is counted, and not the time
+        spent by the consumer between items. The whole iteration counts as
+        one call.
+
+        :param str name: The name of the stage.
+        :param iterable iterable: The results of the stage.
+        :yields: The items of `iterable`.
+        """
+        iterator = iter(iterable)
+        calls = 1
+        while True:
+            with self.time(name, calls=calls):
+                calls = 0
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, name, own_time, total_time, calls=1):
+        """Record calls to a stage.
+
+        :param str name: The name of the stage.
+        :param float own_time: The time spent in the stage itself.
+        :param float total_time: The time spent in the stage, including
+            nested stages.
+        :param int calls: The number of calls.
+        """
+        stat = self.stats.setdefault(name, [0, 0.0, 0.0])
+        stat[0] += calls
+        stat[1] += own_time
+        stat[2] += total_time
+
+    def wrap(self, name, func):
+        """Time each call to a linting function.
+
+        :param str name: The name of the stage.
+        :param function func: The linting function.
+        :returns function: A function which calls `func` and returns the list
+            of errors it yields.
+        """
+        # Find the location of the linting function itself, rather than of
+        # a decorator such as `with_includes`.
+        original = func
+        while hasattr(original, "__wrapped__"):
+            original = original.__wrapped__
+        code = getattr(original, "__code__", None)
+        if code is not None:
+            self.locations[name] = (code.co_filename, code.co_firstlineno)
+
+        def wrapped(*args, **kwargs):
+            with self.time(name):
+                return list(func(*args, **kwargs))
+        return wrapped
+
+    def merge(self, other):
+        """Add the stages of another profile to this one.
+
+        :param Profile other: The other profile, such as from a worker
+            process.
+        """
+        for name, (calls, own_time, total_time) in other.stats.items():
+            self.add(name, own_time, total_time, calls)
+        self.locations.update(other.locations)
+        self.analyses.merge(other.analyses)
+
+    def format_table(self):
+        """Render the stages as a table, sorted by their own time.
+
+        If any analyses were requested, they're listed in a second table,
+        with how often they were reused.
+
+        :returns str:
+        """
+        rows = sorted(self.stats.items(),
+                      key=lambda item: (-item[1][1], item[0]))
+        width = max([len("stage")] + [len(name) for name, _ in rows])
+
+        line = "{:<{width}}  {:>8}  {:>10}  {:>10}\n"
+        output = line.format("stage", "calls", "own (s)", "total (s)",
+                             width=width)
+        for name, (calls, own_time, total_time) in rows:
+            output += line.format(name,
+                                  calls,
+                                  "{:.6f}".format(own_time),
+                                  "{:.6f}".format(total_time),
+                                  width=width)
+
+        analyses = self.analyses
+        names = sorted(set(analyses.hits) | set(analyses.misses))
+        if names:
+            width = max([len("analysis")] + [len(i) for i in names])
+            line = "{:<{width}}  {:>8}  {:>8}  {:>8}\n"
+            output += "\n" + line.format("analysis", "hits", "misses",
+                                         "hit rate", width=width)
+            for name in names:
+                output += line.format(name,
+                                      analyses.hits[name],
+                                      analyses.misses[name],
+                                      "{:.1%}".format(analyses.hit_rate(name)),
+                                      width=width)
+        return output
+
+    def dump_stats(self, path):
+        """Write the stages to a file which can be loaded with `pstats`.
+
+        Linting functions are listed at their location in the source code.
+        Other stages are listed like built-in functions.
+
+        :param str path: The path of the file.
+        """
+        stats = {}
+        for name, (calls, own_time, total_time) in self.stats.items():
+            filename, line = self.locations.get(name, ("~", 0))
+            key = (filename, line, name)
+            stats[key] = (calls, calls, own_time, total_time, {})
+
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+
+def timer(profile, name, *, calls=1):
+    """Time a stage if profiling is enabled.
+
+    :param Profile profile: The profile, or `None` if profiling is disabled.
+    :param str name: The name of the stage.
+    :param int calls: The number of calls to count.
+    :returns: A context manager which times the stage.
+    """
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.time(name, calls=calls)
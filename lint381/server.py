@@ -0,0 +1,196 @@
+"""A server which keeps the linters loaded between requests.
+
+See `lint381.client` for the client. Each connection sends one request, a
+line of JSON like this:
+
+    {"path": "/home/foo/foo.cpp", "filename": "foo.cpp", "code": "...",
+     "lang": "cpp", "tab_width": 4, "range": null, "color": false,
+     "select": null, "ignore": ["unused_using"]}
+
+And gets back one line of JSON with the rendered errors:
+
+    {"had_errors": true, "output": "foo.cpp:1:1: error: ..."}
+
+Or, if the request couldn't be handled, `{"error": "..."}`.
+
+The server remembers the tokens and errors of recently linted files. When a
+file is linted again after an edit, only the code around the edit is
+re-tokenized and re-linted (see `Linter.relint`).
+"""
+import collections
+import json
+import os
+import socketserver
+
+from . import get_linter
+from .output import format_errors, format_message
+from .tokenizer import DEFAULT_TAB_WIDTH, LineTable
+
+MAX_STATES = 64
+"""The number of recently linted files to remember."""
+
+
+class LintService:
+    """Handles requests to lint files.
+
+    :ivar int max_states: The number of recently linted files to remember.
+    """
+
+    def __init__(self, *, max_states=MAX_STATES):
+        """Initialize the service with no remembered files.
+
+        :param int max_states: The number of recently linted files to
+            remember.
+        """
+        self.max_states = max_states
+
+        # The `LintState` of each recently linted file, and its source code,
+        # from the least to the most recently used.
+        self._states = collections.OrderedDict()
+
+    def handle(self, request):
+        """Lint a file.
+
+        :param dict request: The request (see the module documentation).
+        :returns dict: The response.
+        """
+        try:
+            linter = get_linter(request["lang"],
+                                select=request.get("select"),
+                                ignore=request.get("ignore"))
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": "Invalid request: {!r}".format(e)}
+
+        try:
+            filename = request["filename"]
+            code = request["code"]
+            tab_width = request.get("tab_width") or DEFAULT_TAB_WIDTH
+            code_range = request.get("range")
+            if code_range is not None:
+                start, end = code_range
+                errors = linter.lint_range(filename, code, start, end,
+                                           tab_width=tab_width)
+            else:
+                key = (request.get("path"), linter, tab_width)
+                errors = self._lint(key, linter, filename, code, tab_width)
+        except ValueError as e:
+            output = format_message(filename, None, str(e),
+                                    color=bool(request.get("color")))
+            return {"had_errors": True, "output": output}
+        except (KeyError, TypeError) as e:
+            return {"error": "Invalid request: {!r}".format(e)}
+
+        lines = LineTable(code, tab_width=tab_width)
+        output = format_errors(errors, filename, lines,
+                               color=bool(request.get("color")))
+        return {"had_errors": bool(errors), "output": output}
+
+    def _lint(self, key, linter, filename, code, tab_width):
+        """Lint a whole file, reusing the results for its last version.
+
+        :param tuple key: Identifies the file.
+        :param Linter linter: The linter for the file's language and the
+            selected checks.
+        :param str filename: The name of the file.
+        :param str code: The source code.
+        :param int tab_width: The number of columns between tab stops.
+        :returns list: The `Error`s in the file.
+        :raises ValueError: The file couldn't be tokenized.
+        """
+        state = None
+        previous = self._states.pop(key, None)
+        if previous is not None:
+            old_state, old_code = previous
+            if old_state.filename == filename:
+                start, end, text = _diff(old_code, code)
+                try:
+                    state = linter.relint(old_state, start, end, text)
+                except ValueError:
+                    pass
+
+        if state is None:
+            state = linter.lint_state(filename, code, tab_width=tab_width)
+
+        self._states[key] = (state, code)
+        while len(self._states) > self.max_states:
+            self._states.popitem(last=False)
+        return state.errors
+
+
+def _diff(old, new):
+    """Find the edit which turns one string into another.
+
+    :param str old: The string before the edit.
+    :param str new: The string after the edit.
+    :returns tuple: The start and end offsets of the replaced range of `old`,
+        and the text to replace it with.
+    """
+    limit = min(len(old), len(new))
+    start = 0
+    while start < limit and old[start] == new[start]:
+        start += 1
+
+    limit -= start
+    suffix = 0
+    while suffix < limit and old[-suffix - 1] == new[-suffix - 1]:
+        suffix += 1
+
+    return start, len(old) - suffix, new[start:len(new) - suffix]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads a request from a connection and writes the response."""
+
+    def handle(self):
+        """Handle one request."""
+        try:
+            request = json.loads(self.rfile.readline().decode())
+        except ValueError as e:
+            response = {"error": "Invalid request: {}".format(e)}
+        else:
+            response = self.server.service.handle(request)
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class LintServer(socketserver.UnixStreamServer):
+    """Serves lint requests on a Unix socket.
+
+    Use `serve_forever` to handle requests.
+
+    :ivar LintService service: Handles the requests.
+    """
+
+    def __init__(self, path):
+        """Listen on a socket.
+
+        :param str path: The path of the socket. If a file already exists
+            there, such as a socket left by a server which exited, it's
+            replaced. If its directory doesn't exist, it's created so that
+            only the user can access it.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700,
+                    exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.service = LintService()
+        super().__init__(path, _RequestHandler)
+
+    def server_bind(self):
+        """Create the socket so that only the user can send files to lint.
+
+        The permissions are set by the umask as the socket is created, so
+        that nobody else can connect before they could be changed.
+        """
+        umask = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        """Stop listening and remove the socket."""
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:  # pragma: no cover
+            pass
@@ -38,10 +38,21 @@ between. See `matcher.py` for utility functions to this end.
 This file provides a relatively poor implementation of a tokenizer for C/C++
 code.
 """
+import array
+import bisect
 import collections
+import collections.abc
+import contextlib
+import functools
+import mmap
+import os
 import re
 
 
+DEFAULT_TAB_WIDTH = 4
+"""The default number of columns between tab stops."""
+
+
 class Position(collections.namedtuple("Position", [
     "row",
     "column",
@@ -51,8 +62,8 @@ class Position(collections.namedtuple("Position", [
     We use this information to be able to provide line numbers corresponding to
     a flagged token, for example.
 
-    This scheme fails when we have tabs in our code, because the tab character
-    corresponds to an unknowable, variable number of columns.
+    The column is a display column: tabs advance it to the next tab stop, as
+    determined by the tab width of the `LineTable` that made the position.
 
     :ivar int row: The row (line number) of the position. 0-indexed.
     :ivar int column: The column of the position. 0-indexed.
@@ -69,352 +80,1306 @@ class Position(collections.namedtuple("Position", [
             column=self.column + 1,
         )
 
-Token = collections.namedtuple("Token", [
-    "type",
-    "value",
-    "start",
-    "end",
-])
-"""A token in the list of tokens in the source file.
-
-:ivar str type: The type of the token, such as "identifier". This value is not
-    especially meaningful; many values are shunted into a category such as
-    "identifier" or "grouping" when it's not terribly accurate.
-:ivar str value: The string value of the token. For example, for an identifier,
-    this is the name of the identifier as a string.
-:ivar Position start: The start position of the token.
-:ivar Position end: The end position of the token. This could be on a different
-    line from the start position, such as for a multiline comment.
-"""
 
+class LineTable:
+    """Converts offsets into the source code into `Position`s.
 
-def tokenize(string):
-    """Tokenize a string.
+    Tokens only store the offsets of their characters, since most positions
+    are never shown to anyone. The table of line start offsets is built once,
+    the first time a position is requested, and shared by all of the tokens in
+    the file.
+
+    The source code may be a string or a bytes-like buffer such as a
+    memory-mapped file, in which case offsets are byte offsets.
 
-    :returns list: A list of `Token`s in the string.
+    Tabs are left in the source code. They are only expanded to the tab width
+    when a column is computed or a line is displayed.
     """
-    return list(_Tokenizer(string).tokenize())
 
+    def __init__(self, string, *, tab_width=DEFAULT_TAB_WIDTH):
+        """Prepare to find positions in the provided code.
 
-class _Tokenizer:
-    """Tokenize C/C++ code.
+        :param string: The source code, as a string or buffer.
+        :param int tab_width: The number of columns between tab stops.
+        """
+        self._string = string
+        self._line_starts = None
+        self.tab_width = tab_width
 
-    Note that tokenizing C++ is really hard. This doesn't even try to be good
-    at it.
-    """
+    @property
+    def source(self):
+        """The source code, as a string or buffer.
 
-    _TOKEN_PATTERNS = [
-        ("number", r"""
-        [0-9]+
-
-        # Optional decimal point.
-        (\.?[0-9]*)
-        """),
-
-        ("keyword", r"""
-        (
-            auto |
-            break |
-            case |
-            char |
-            const |
-            continue |
-            default |
-            do |
-            double |
-            else |
-            enum |
-            extern |
-            float |
-            for |
-            goto |
-            if |
-            int |
-            long |
-            register |
-            return |
-            short |
-            signed |
-            sizeof |
-            static |
-            struct |
-            switch |
-            typedef |
-            union |
-            unsigned |
-            void |
-            volatile |
-            while
-        )"""),
-
-        ("identifier", r"""
-        # Possibly a preprocessor directive.
-        [#]?
-
-        [_a-zA-Z]([_a-zA-Z0-9]+)?
-        """),
-
-        ("comment", r"""
-        //.+
-        """),
-
-        ("unary_operator", r"""
-        (
-            \+\+ | -- | ! | ~
-        )
-        """),
+        :returns:
+        """
+        return self._string
 
-        # Two-character operators.
-        ("binary_operator", r"""
-        (
-            # Relational.
-            ==  | != | <= | >=
+    @property
+    def line_starts(self):
+        """The offset at which each line starts.
 
-            # Arithmetic.
-            \+= | -= | \*= | /= | %= |
+        :returns array: The offsets, in increasing order.
+        """
+        if self._line_starts is None:
+            newline = "\n" if isinstance(self._string, str) else b"\n"
+            line_starts = array.array("q", [0])
+            line_starts.extend(match.end()
+                               for match in re.finditer(newline, self._string))
+            self._line_starts = line_starts
+        return self._line_starts
+
+    def row(self, offset):
+        """Get the row containing the provided offset.
+
+        :param int offset: The offset into the source code.
+        :returns int: The row, 0-indexed.
+        """
+        return bisect.bisect_right(self.line_starts, offset) - 1
 
-            # Logical.
-            &&  | \|\| |
+    def position(self, offset):
+        """Get the position of the character at the provided offset.
 
-            # Bitwise.
-            <<= | >>= | &= | \|= | \^= |
-            <<  | >>  |
-        )
-        """),
-
-        # One-character operators.
-        ("binary_operator", r"""
-        [
-            + \- * / %
-            ^ & |
-            < >
-            =
-        ]
-        """),
-
-        ("grouping", r"""
-        (
-            \( | \) |
-            \[ | \] |
-            \{ | \} |
-            ::      |
-            ,  | ;  |
-            \.      |
-            \? | :
-        )
-        """),
+        :param int offset: The offset into the source code.
+        :returns Position: The position of the character.
+        """
+        row = self.row(offset)
+        line_start = self.line_starts[row]
+        if isinstance(self._string, str):
+            if self._string.find("\t", line_start, offset) == -1:
+                return Position(row=row, column=offset - line_start)
+            prefix = self._string[line_start:offset]
+        else:
+            if _WIDE_BYTE_PATTERN.search(self._string, line_start,
+                                         offset) is None:
+                return Position(row=row, column=offset - line_start)
+
+            # Columns count characters rather than bytes, so find the start
+            # of the character at the offset, and decode the line up to it.
+            while (offset > line_start and
+                   self._string[offset] & 0xc0 == 0x80):
+                offset -= 1
+            prefix = self._string[line_start:offset].decode("utf-8",
+                                                            "replace")
+        return Position(row=row,
+                        column=len(prefix.expandtabs(self.tab_width)))
+
+    def character_column(self, position):
+        """Get the column of a position in characters, without expanding tabs.
+
+        :param Position position: The position, from `position`.
+        :returns int: The number of characters before the position on its
+            line.
+        """
+        line = self._text(position.row)
+        if "\t" not in line:
+            return position.column
+
+        column = 0
+        for index, char in enumerate(line):
+            if column >= position.column:
+                return index
+            if char == "\t":
+                column += self.tab_width - column % self.tab_width
+            else:
+                column += 1
+        return len(line)
+
+    def line(self, row):
+        """Get the text of the provided row, without its line ending.
+
+        Tabs are expanded, so that the text lines up with the columns of
+        positions on that row.
+
+        :param int row: The row, 0-indexed.
+        :returns str: The text of the line.
+        """
+        return self._text(row).expandtabs(self.tab_width)
+
+    def _text(self, row):
+        """Get the text of the provided row as it is in the source code.
+
+        :param int row: The row, 0-indexed.
+        :returns str: The text of the line, without its line ending.
+        """
+        line_starts = self.line_starts
+        start = line_starts[row]
+        if row + 1 < len(line_starts):
+            end = line_starts[row + 1] - 1
+        else:
+            end = len(self._string)
+
+        line = self._string[start:end]
+        if not isinstance(line, str):
+            line = line.decode("utf-8", "replace")
+        return line.rstrip("\r")
+
+
+class Token:
+    """A token in the list of tokens in the source file.
+
+    Tokens produced by the tokenizer record only the offsets of their
+    characters. Their positions are computed from the file's `LineTable` when
+    they are first requested.
+
+    :ivar str type: The type of the token, such as "identifier". This value is
+        not especially meaningful; many values are shunted into a category
+        such as "identifier" or "grouping" when it's not terribly accurate.
+    :ivar str value: The string value of the token. For example, for an
+        identifier, this is the name of the identifier as a string.
+    :ivar int start_offset: The offset of the first character of the token in
+        the source code, or `None` if the token wasn't produced by the
+        tokenizer.
+    :ivar int end_offset: The offset just past the last character of the
+        token, or `None` if the token wasn't produced by the tokenizer.
+    :ivar int index: The index of the token in its `TokenTable`, or `None` if
+        the token isn't part of a table.
+    """
+
+    __slots__ = [
+        "type",
+        "value",
+        "start_offset",
+        "end_offset",
+        "index",
+        "_lines",
+        "_table",
+        "_start",
+        "_end",
     ]
-    _TOKEN_PATTERNS = [(group, re.compile(pattern, re.VERBOSE))
-                       for group, pattern in _TOKEN_PATTERNS]
 
-    def __init__(self, string):
-        """Prepare to tokenize the provided code.
+    def __init__(self, type, value, start=None, end=None, *,
+                 start_offset=None, end_offset=None, lines=None,
+                 table=None, index=None):
+        """Create a token.
+
+        Either provide the positions of the token directly, or provide its
+        offsets and the `LineTable` to compute the positions from.
+
+        :param str type: The type of the token.
+        :param str value: The string value of the token.
+        :param Position start: The start position of the token.
+        :param Position end: The end position of the token.
+        :param int start_offset: The offset of the start of the token.
+        :param int end_offset: The offset just past the end of the token.
+        :param LineTable lines: The line table of the source code.
+        :param TokenTable table: The token table the token is a view into.
+        :param int index: The index of the token in the token table.
+        """
+        self.type = type
+        self.value = value
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.index = index
+        self._lines = lines
+        self._table = table
+        self._start = start
+        self._end = end
 
-        :param str string: The source code, as a string.
+    @property
+    def lines(self):
+        """The line table of the source code that the token is in.
+
+        :returns LineTable: The table, or `None` if the token's positions
+            were provided directly.
         """
-        assert "\t" not in string, (
-            "Remove tabs from code before attempting to tokenize. "
-            "We don't provide meaningful token positions for code "
-            "that has tabs in it."
-        )
+        return self._lines
 
-        # Add a dummy whitespace character to end the last token.
-        self._string = string + "\n"
+    @property
+    def start(self):
+        """The start position of the token.
 
-        # The 'cursor' is the index into the source code string where we
-        # currently are. We advance this as we consume tokens.
-        self._cursor = 0
+        :returns Position:
+        """
+        if self._start is None and self._lines is not None:
+            self._start = self._lines.position(self.start_offset)
+        return self._start
 
-        # The row and column corresponding to the cursor. When we hit a newline
-        # character, the row increments and the column is set to zero.
-        self._row = 0
-        self._column = 0
+    @property
+    def end(self):
+        """The end position of the token.
 
-    def _char(self):
-        """Get the character under the cursor.
+        This is the position of the last character of the token. It could be
+        on a different line from the start position, such as for a multiline
+        comment.
 
-        :returns str: The current character.
+        :returns Position:
         """
-        assert self._cursor >= 0
-        return self._string[self._cursor]
+        if self._end is None and self._lines is not None:
+            self._end = self._lines.position(self.end_offset - 1)
+        return self._end
+
+    def _neighbor(self, offset):
+        """Get a token near this one in its token table.
 
-    def _advance_cursor(self):
-        """Advance the cursor by one character."""
-        if self._char() == "\n":
-            self._row += 1
-            self._column = 0
+        :param int offset: The number of tokens forward to move. This may be
+            negative.
+        :returns Token: The token, or `None` if there is no such token.
+        :raises ValueError: This token isn't part of a token table.
+        """
+        if self._table is None:
+            raise ValueError("Token {!r} is not part of a token table"
+                             .format(self.value))
+
+        index = self.index + offset
+        if 0 <= index < len(self._table):
+            return self._table[index]
+        return None
+
+    def prev(self):
+        """Get the token before this one.
+
+        :returns Token: The previous token, or `None` if this is the first
+            token in the file.
+        :raises ValueError: This token isn't part of a token table.
+        """
+        return self._neighbor(-1)
+
+    def next(self):
+        """Get the token after this one.
+
+        :returns Token: The next token, or `None` if this is the last token in
+            the file.
+        :raises ValueError: This token isn't part of a token table.
+        """
+        return self._neighbor(1)
+
+    def slice(self, length):
+        """Get a view of the tokens starting with this one.
+
+        :param int length: The number of tokens to include. Fewer are included
+            if the file ends first.
+        :returns TokenSlice: The tokens.
+        :raises ValueError: This token isn't part of a token table.
+        """
+        if self._table is None:
+            raise ValueError("Token {!r} is not part of a token table"
+                             .format(self.value))
+        return self._table[self.index:self.index + length]
+
+    def _key(self):
+        """Get the fields that determine whether two tokens are equal.
+
+        :returns tuple:
+        """
+        return (self.type, self.value, self.start, self.end)
+
+    def __eq__(self, other):
+        """Compare tokens by their type, value, and positions."""
+        if not isinstance(other, Token):
+            return NotImplemented
+        if self._lines is not None and self._lines is other._lines:
+            return (self.start_offset == other.start_offset and
+                    self.type == other.type and
+                    self.value == other.value)
+        return self._key() == other._key()
+
+    def __hash__(self):
+        """Hash the token by its type, value, and positions."""
+        return hash(self._key())
+
+    def __repr__(self):
+        """Display the token like a named tuple."""
+        return "Token(type={!r}, value={!r}, start={!r}, end={!r})".format(
+            self.type, self.value, self.start, self.end)
+
+
+class TokenTable(collections.abc.Sequence):
+    """The tokens of a source file, stored compactly.
+
+    Rather than keeping a `Token` object for every token, the table stores the
+    type, value, and offsets of each token in parallel arrays. Types are
+    stored as small integer codes, and each distinct value is only stored
+    once.
+
+    The table behaves like a read-only list of tokens. Indexing it creates a
+    lightweight `Token` view which knows its own index, so that rules can find
+    neighboring tokens with `Token.prev` and `Token.next` rather than
+    searching the list. Slicing it creates a `TokenSlice` without copying.
+
+    :ivar LineTable lines: The line table of the source code.
+    """
+
+    _TYPES = [
+        "number",
+        "keyword",
+        "identifier",
+        "comment",
+        "unary_operator",
+        "binary_operator",
+        "grouping",
+        "string",
+    ]
+    _TYPE_CODES = {type: code for code, type in enumerate(_TYPES)}
+
+    def __init__(self, lines):
+        """Create an empty token table.
+
+        :param LineTable lines: The line table of the source code.
+        """
+        self.lines = lines
+        self._types = array.array("B")
+        self._value_ids = array.array("I")
+        self._start_offsets = array.array("q")
+        self._end_offsets = array.array("q")
+
+        # Each distinct value, and a map from each value to its ID.
+        self._values = []
+        self._value_codes = {}
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        """Create a token table from tokens produced by the tokenizer.
+
+        :param iterable tokens: The tokens, such as from `iter_tokens`.
+        :returns TokenTable: The table.
+        """
+        table = None
+        for token in tokens:
+            if table is None:
+                table = cls(token._lines)
+            table.append(token.type,
+                         token.value,
+                         token.start_offset,
+                         token.end_offset)
+
+        if table is None:
+            table = cls(LineTable(""))
+        return table
+
+    def append(self, type, value, start_offset, end_offset):
+        """Add a token to the end of the table.
+
+        :param str type: The type of the token.
+        :param str value: The string value of the token.
+        :param int start_offset: The offset of the start of the token.
+        :param int end_offset: The offset just past the end of the token.
+        """
+        value_id = self._value_codes.get(value)
+        if value_id is None:
+            value_id = len(self._values)
+            self._values.append(value)
+            self._value_codes[value] = value_id
+
+        self._types.append(self._TYPE_CODES[type])
+        self._value_ids.append(value_id)
+        self._start_offsets.append(start_offset)
+        self._end_offsets.append(end_offset)
+
+    def _share_values(self, other):
+        """Share the table of distinct values with another, empty, table.
+
+        Value IDs are never reassigned, so tables for successive versions of
+        a file can share their values and copy value IDs between each other.
+
+        :param TokenTable other: The table to share values with.
+        """
+        assert not self._values
+        self._values = other._values
+        self._value_codes = other._value_codes
+
+    def _extend(self, other, start, stop, shift):
+        """Copy a range of tokens from another table to the end of this one.
+
+        The tables must share their values (see `_share_values`).
+
+        :param TokenTable other: The table to copy tokens from.
+        :param int start: The index of the first token to copy.
+        :param int stop: The index just past the last token to copy.
+        :param int shift: The amount to add to the offsets of the tokens.
+        """
+        assert other._values is self._values
+        self._types.extend(other._types[start:stop])
+        self._value_ids.extend(other._value_ids[start:stop])
+        if shift:
+            self._start_offsets.extend(
+                i + shift for i in other._start_offsets[start:stop])
+            self._end_offsets.extend(
+                i + shift for i in other._end_offsets[start:stop])
         else:
-            self._column += 1
+            self._start_offsets.extend(other._start_offsets[start:stop])
+            self._end_offsets.extend(other._end_offsets[start:stop])
+
+    def __len__(self):
+        """Get the number of tokens in the table."""
+        return len(self._types)
+
+    def __getitem__(self, index):
+        """Get a view of a token or a slice of tokens.
+
+        :param index: An integer index or a slice.
+        :returns: A `Token`, or a `TokenSlice` for a slice.
+        """
+        if isinstance(index, slice):
+            return TokenSlice.from_slice(self, index)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+
+        return Token(type=self._TYPES[self._types[index]],
+                     value=self._values[self._value_ids[index]],
+                     start_offset=self._start_offsets[index],
+                     end_offset=self._end_offsets[index],
+                     lines=self.lines,
+                     table=self,
+                     index=index)
+
+    def value_at(self, index):
+        """Get the value of a token, without creating a `Token`.
+
+        :param int index: The index of the token.
+        :returns str: The value of the token.
+        """
+        return self._values[self._value_ids[index]]
+
+    def index(self, token, *args):
+        """Get the index of a token.
 
-        self._cursor += 1
+        This takes constant time for tokens which are views into this table.
 
-    def _position(self):
-        """Get the position of the cursor.
+        :param Token token: The token to find.
+        :returns int: The index of the token.
+        :raises ValueError: The token isn't in the table.
+        """
+        if getattr(token, "_table", None) is self and not args:
+            return token.index
+        return super().index(token, *args)
+
+    def span(self, start, end):
+        """Find the tokens which overlap a range of the source code.
 
-        :return Position: The position of the cursor.
+        Tokens which only touch the range also count, so an empty range finds
+        the tokens on either side of it.
+
+        :param int start: The offset of the start of the range.
+        :param int end: The offset just past the end of the range.
+        :returns range: The indices of the tokens.
         """
-        assert 0 <= self._row < len(self._string)
-        assert 0 <= self._column < len(self._string)
-        return Position(row=self._row, column=self._column)
+        first = bisect.bisect_left(self._end_offsets, start)
+        stop = bisect.bisect_right(self._start_offsets, end)
+        return range(first, max(first, stop))
+
+    def values(self):
+        """Iterate over the values of the tokens, without creating `Token`s.
+
+        :returns iterator: The value of each token, in order.
+        """
+        return map(self._values.__getitem__, self._value_ids)
+
+    def types(self):
+        """Iterate over the types of the tokens, without creating `Token`s.
+
+        :returns iterator: The type of each token, in order.
+        """
+        return map(self._TYPES.__getitem__, self._types)
+
+    def value_index(self):
+        """Map each value to the indices of the tokens with that value.
+
+        This takes a single pass over the value IDs, without creating any
+        `Token`s.
+
+        :returns dict: A map from each value to a list of indices, in order.
+        """
+        indices = collections.defaultdict(list)
+        for i, value_id in enumerate(self._value_ids):
+            indices[value_id].append(i)
+        return {self._values[value_id]: value_indices
+                for value_id, value_indices in indices.items()}
+
+    def row_index(self):
+        """Find the first token on each row.
+
+        :returns list: The index of the first token which starts on or after
+            each row, followed by the number of tokens. So the tokens which
+            start on row `i` are in the range `index[i]:index[i + 1]`.
+        """
+        index = [bisect.bisect_left(self._start_offsets, i)
+                 for i in self.lines.line_starts]
+        index.append(len(self))
+        return index
+
+    def __eq__(self, other):
+        """Compare the tokens to those in another sequence."""
+        if (not isinstance(other, collections.abc.Sequence) or
+                isinstance(other, str)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Display the tokens like a list."""
+        return "TokenTable({!r})".format(list(self))
+
+
+class BracketTable:
+    """Matches up the brackets `()`, `[]` and `{}` in a sequence of tokens.
+
+    Each kind of bracket is matched separately, so an unbalanced bracket of
+    one kind doesn't throw off the others. Brackets which are never closed,
+    or which don't close anything, have no match.
+    """
+
+    CLOSERS = {
+        "(": ")",
+        "[": "]",
+        "{": "}",
+    }
+    """A map from each opening bracket to its closing bracket."""
+
+    def __init__(self, values):
+        """Match up the brackets in a single pass over the tokens.
+
+        :param iterable values: The value of each token, in order.
+        """
+        openers = {i: i for i in self.CLOSERS}
+        openers.update((j, i) for i, j in self.CLOSERS.items())
+        stacks = {i: [] for i in self.CLOSERS}
+
+        # Maps the index of each matched bracket to the index of the other.
+        self._pairs = {}
+
+        # The indices of each kind of opening bracket, in order.
+        self._openers = {i: [] for i in self.CLOSERS}
+
+        for i, value in enumerate(values):
+            opener = openers.get(value)
+            if opener is None:
+                continue
+
+            stack = stacks[opener]
+            if value == opener:
+                stack.append(i)
+                self._openers[opener].append(i)
+            elif stack:
+                j = stack.pop()
+                self._pairs[i] = j
+                self._pairs[j] = i
+
+    @classmethod
+    def from_tokens(cls, tokens):
+        """Match up the brackets in a sequence of tokens.
+
+        :param list tokens: The tokens, such as a `TokenTable`.
+        :returns BracketTable:
+        """
+        if isinstance(tokens, TokenTable):
+            return cls(tokens.values())
+        return cls(i.value for i in tokens)
+
+    def match(self, index):
+        """Get the bracket matching a bracket.
+
+        :param int index: The index of a bracket token.
+        :returns int: The index of the matching bracket, or `None` if it has
+            no match.
+        """
+        return self._pairs.get(index)
+
+    def next_opener(self, opener, index):
+        """Find the next opening bracket of a kind.
+
+        :param str opener: The opening bracket, such as `(`.
+        :param int index: The index to start looking from.
+        :returns int: The index of the first `opener` at or after `index`, or
+            `None` if there isn't one.
+        """
+        openers = self._openers[opener]
+        i = bisect.bisect_left(openers, index)
+        if i == len(openers):
+            return None
+        return openers[i]
+
+
+class TokenSlice(collections.abc.Sequence):
+    """A read-only view of a contiguous range of tokens in a sequence.
+
+    Slicing a `TokenTable` (or a `TokenSlice`) produces one of these rather
+    than copying the tokens.
+    """
+
+    def __init__(self, tokens, start, stop):
+        """Create a view of `tokens[start:stop]`.
+
+        :param Sequence tokens: The underlying tokens.
+        :param int start: The index of the first token in the view.
+        :param int stop: The index just past the last token in the view.
+        """
+        self._tokens = tokens
+        self._start = start
+        self._stop = max(start, stop)
+
+    @classmethod
+    def view(cls, tokens, start, stop):
+        """Create a view of `tokens[start:stop]` for any sequence of tokens.
+
+        A view of another view refers to the underlying tokens directly.
+
+        :param Sequence tokens: The tokens.
+        :param int start: The index of the first token in the view.
+        :param int stop: The index just past the last token in the view.
+        :returns TokenSlice:
+        """
+        stop = min(stop, len(tokens))
+        if isinstance(tokens, TokenSlice):
+            return cls(tokens._tokens,
+                       tokens._start + start,
+                       tokens._start + stop)
+        return cls(tokens, start, stop)
+
+    @classmethod
+    def from_slice(cls, tokens, index):
+        """Create a view of the tokens selected by a slice.
+
+        :param Sequence tokens: The underlying tokens.
+        :param slice index: The slice. Slices with a step are copied into a
+            list instead.
+        :returns: The `TokenSlice`, or a list if the slice has a step.
+        """
+        start, stop, step = index.indices(len(tokens))
+        if step != 1:
+            return [tokens[i] for i in range(start, stop, step)]
+        return cls(tokens, start, stop)
+
+    def __len__(self):
+        """Get the number of tokens in the view."""
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        """Get a token or a slice of the tokens in the view.
+
+        :param index: An integer index or a slice.
+        :returns: A `Token`, or a `TokenSlice` for a slice.
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return TokenSlice.view(self, start, stop)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+        return self._tokens[self._start + index]
+
+    def value_at(self, index):
+        """Get the value of a token, without creating a `Token` if possible.
+
+        :param int index: The index of the token in the view.
+        :returns str: The value of the token.
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("token index out of range")
+
+        index += self._start
+        value_at = getattr(self._tokens, "value_at", None)
+        if value_at is None:
+            return self._tokens[index].value
+        return value_at(index)
+
+    def __add__(self, other):
+        """Concatenate the tokens with another sequence into a list."""
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        """Concatenate another sequence with the tokens into a list."""
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        """Compare the tokens to those in another sequence."""
+        if (not isinstance(other, collections.abc.Sequence) or
+                isinstance(other, str)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Display the tokens like a list."""
+        return "TokenSlice({!r})".format(list(self))
+
+
+def tokenize(string, *, tab_width=DEFAULT_TAB_WIDTH):
+    """Tokenize a string.
+
+    :param str string: The source code.
+    :param int tab_width: The number of columns between tab stops, used to
+        compute the columns of token positions.
+    :returns TokenTable: The tokens in the string.
+    """
+    return _Tokenizer(string, tab_width=tab_width).tokenize_table()
+
+
+def iter_tokens(buffer, *, tab_width=DEFAULT_TAB_WIDTH):
+    """Tokenize source code lazily, producing tokens as they are found.
+
+    This doesn't copy the source code, so it can be used on very large
+    files, such as those opened with `map_file`.
+
+    :param buffer: The source code, as a string or a bytes-like buffer
+        containing UTF-8 text.
+    :param int tab_width: The number of columns between tab stops, used to
+        compute the columns of token positions.
+    :returns iterator: An iterator over the `Token`s in the source code.
+    """
+    return _make_tokenizer(buffer, tab_width=tab_width).tokenize()
+
+
+Retokenized = collections.namedtuple("Retokenized", [
+    "tokens",
+    "first",
+    "old_stop",
+    "new_stop",
+])
+"""The result of updating a token table after an edit.
+
+The tokens in `tokens[first:new_stop]` replace the tokens in the range
+`first:old_stop` of the previous token table. The tokens before `first` are
+the same, and the tokens after the range are the same but shifted.
+
+:ivar TokenTable tokens: The tokens of the edited source code.
+:ivar int first: The index of the first token that was re-tokenized.
+:ivar int old_stop: The index just past the last replaced token in the
+    previous token table.
+:ivar int new_stop: The index just past the last re-tokenized token in the
+    new token table.
+"""
+
+
+def retokenize(tokens, start, end, text):
+    """Update a token table after an edit to its source code.
+
+    Tokenizing from a token boundary doesn't depend on anything before the
+    boundary, so we re-tokenize from the last token boundary before the edit
+    until a token starts at the same place as one of the tokens after the
+    edit. From then on, the old tokens are reused with their offsets shifted.
+
+    :param TokenTable tokens: The tokens of the source code before the edit.
+    :param int start: The offset of the start of the edited range.
+    :param int end: The offset just past the end of the edited range.
+    :param text: The replacement text for the range, of the same type as the
+        source code.
+    :returns Retokenized: The new tokens and the range which changed.
+    :raises ValueError: The edited source code couldn't be tokenized.
+    """
+    old_lines = tokens.lines
+    old_source = old_lines.source
+    source = old_source[:start] + text + old_source[end:]
+    shift = len(text) - (end - start)
+
+    tokenizer = _make_tokenizer(source, tab_width=old_lines.tab_width)
+    new_tokens = TokenTable(tokenizer._lines)
+    new_tokens._share_values(tokens)
+
+    # A token which ends right where the edit starts may be extended by the
+    # edit, so it has to be re-tokenized as well. So does a run of tokens
+    # with no whitespace between them before it, since they may merge (for
+    # example, `/` `/` followed by an inserted `*` is a comment).
+    first = bisect.bisect_left(tokens._end_offsets, start)
+    restart = start
+    if first < len(tokens):
+        restart = min(restart, tokens._start_offsets[first])
+    while first > 0 and tokens._end_offsets[first - 1] == restart:
+        first -= 1
+        restart = tokens._start_offsets[first]
+    new_tokens._extend(tokens, 0, first, 0)
+
+    # The first old token which starts after the edit. Once the new tokens
+    # reach the start of one of these, the rest of the tokens are the same.
+    old_stop = bisect.bisect_left(tokens._start_offsets, end)
+    for group, token_start, token_end in tokenizer._scan(restart):
+        while (old_stop < len(tokens) and
+               tokens._start_offsets[old_stop] + shift < token_start):
+            old_stop += 1
+        if (old_stop < len(tokens) and
+                tokens._start_offsets[old_stop] + shift == token_start):
+            break
+        new_tokens.append(group,
+                          tokenizer._value(token_start, token_end),
+                          token_start,
+                          token_end)
+    else:
+        old_stop = len(tokens)
+
+    new_stop = len(new_tokens)
+    new_tokens._extend(tokens, old_stop, len(tokens), shift)
+    return Retokenized(tokens=new_tokens,
+                       first=first,
+                       old_stop=old_stop,
+                       new_stop=new_stop)
+
+
+def _make_tokenizer(buffer, *, tab_width):
+    """Create a tokenizer for source code.
+
+    :param buffer: The source code, as a string or a bytes-like buffer.
+    :param int tab_width: The number of columns between tab stops.
+    :returns _Tokenizer: The tokenizer.
+    """
+    if isinstance(buffer, str):
+        return _Tokenizer(buffer, tab_width=tab_width)
+    else:
+        return _BufferTokenizer(buffer, tab_width=tab_width)
+
+
+@contextlib.contextmanager
+def map_file(path):
+    """Memory-map a source file for reading.
+
+    Use this as a context manager:
+
+        with map_file("foo.cpp") as buffer:
+            for token in iter_tokens(buffer):
+                ...
+
+    :param str path: The path to the file.
+    :returns: A read-only buffer with the contents of the file.
+    """
+    with open(path, "rb") as f:
+        # Empty files can't be memory-mapped.
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+class _LazyPattern:
+    """A regex which is only compiled the first time it's used.
+
+    Importing the tokenizer would otherwise compile every token pattern, even
+    if no code is tokenized. Once compiled, the methods of the regex are
+    stored on this object, so they are looked up as quickly as the methods of
+    the compiled regex itself.
+
+    :ivar pattern: The source of the regex, as a string or bytes.
+    :ivar int flags: The flags to compile the regex with.
+    """
+
+    def __init__(self, pattern, flags=0):
+        """Create the regex without compiling it.
+
+        :param pattern: The source of the regex, as a string or bytes.
+        :param int flags: The flags to compile the regex with.
+        """
+        self.pattern = pattern
+        self.flags = flags
+
+    def __getattr__(self, name):
+        """Compile the regex and get an attribute of the compiled regex.
+
+        This is only called for attributes which aren't already stored on
+        this object.
+        """
+        value = getattr(re.compile(self.pattern, self.flags), name)
+        setattr(self, name, value)
+        return value
+
+    def __repr__(self):
+        """Show the source of the regex."""
+        return "_LazyPattern({!r})".format(self.pattern)
+
+
+_TOKEN_PATTERNS = [
+    ("number", r"""
+    [0-9]+
+
+    # Optional decimal point.
+    (\.?[0-9]*)
+    """),
+
+    ("keyword", r"""
+    (
+        auto |
+        break |
+        case |
+        char |
+        const |
+        continue |
+        default |
+        do |
+        double |
+        else |
+        enum |
+        extern |
+        float |
+        for |
+        goto |
+        if |
+        int |
+        long |
+        register |
+        return |
+        short |
+        signed |
+        sizeof |
+        static |
+        struct |
+        switch |
+        typedef |
+        union |
+        unsigned |
+        void |
+        volatile |
+        while
+    )"""),
+
+    ("identifier", r"""
+    # Possibly a preprocessor directive.
+    [#]?
+
+    [_a-zA-Z]([_a-zA-Z0-9]+)?
+    """),
+
+    ("comment", r"""
+    //.+
+    """),
+
+    ("unary_operator", r"""
+    (
+        \+\+ | -- | ! | ~
+    )
+    """),
+
+    # Two-character operators.
+    ("binary_operator", r"""
+    (
+        # Relational.
+        ==  | != | <= | >=
+
+        # Arithmetic.
+        \+= | -= | \*= | /= | %= |
+
+        # Logical.
+        &&  | \|\| |
+
+        # Bitwise.
+        <<= | >>= | &= | \|= | \^= |
+        <<  | >>  |
+    )
+    """),
+
+    # One-character operators.
+    ("binary_operator", r"""
+    [
+        + \- * / %
+        ^ & |
+        < >
+        =
+    ]
+    """),
+
+    ("grouping", r"""
+    (
+        \( | \) |
+        \[ | \] |
+        \{ | \} |
+        ::      |
+        ,  | ;  |
+        \.      |
+        \? | :
+    )
+    """),
+]
+_TOKEN_PATTERNS = [(group, _LazyPattern(pattern, re.VERBOSE))
+                   for group, pattern in _TOKEN_PATTERNS]
+"""The regexes for each token type, in order of priority.
+
+When more than one pattern matches, the longest match wins. Ties go to the
+pattern listed first.
+"""
+
+
+class _Tokenizer:
+    """Tokenize C/C++ code in a single pass.
+
+    Note that tokenizing C++ is really hard. This doesn't even try to be good
+    at it.
+
+    This produces exactly the same tokens as the reference tokenizer in
+    `test/reference_tokenizer.py`, but instead of trying every pattern
+    against a copy of the rest of the file, it looks at the first character
+    of the token to decide which patterns could possibly match, and then
+    matches them in place with `pattern.match(string, pos)`. String literals
+    and multiline comments are found with `str.find`. This keeps
+    tokenization linear in the size of the file.
+    """
+
+    _WHITESPACE_PATTERN = _LazyPattern(r"\s*")
+
+    _NUMBER_PATTERN = dict(_TOKEN_PATTERNS)["number"]
+    _KEYWORD_PATTERN = dict(_TOKEN_PATTERNS)["keyword"]
+    _IDENTIFIER_PATTERN = dict(_TOKEN_PATTERNS)["identifier"]
+    _COMMENT_PATTERN = dict(_TOKEN_PATTERNS)["comment"]
+
+    _OPERATOR_WINDOW = 4
+    """The longest operator we recognize, in characters.
+
+    Operator matches depend only on this many characters, so we can cache the
+    result for each distinct window of text.
+    """
+
+    _WORD_START = frozenset("#_abcdefghijklmnopqrstuvwxyz"
+                            "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    _DIGITS = frozenset("0123456789")
+    _QUOTES = frozenset("\"'")
+    _SLASH = "/"
+    _BACKSLASH = "\\"
+    _MULTILINE_COMMENT_START = "/*"
+    _MULTILINE_COMMENT_END = "*/"
+
+    def __init__(self, string, *, tab_width=DEFAULT_TAB_WIDTH):
+        """Prepare to tokenize the provided code.
+
+        :param str string: The source code, as a string.
+        :param int tab_width: The number of columns between tab stops.
+        """
+        self._string = string
+        self._lines = LineTable(string, tab_width=tab_width)
+
+    def _value(self, start, end):
+        """Get the value of the token between the provided offsets.
+
+        :param int start: The offset of the start of the token.
+        :param int end: The offset just past the end of the token.
+        :returns str: The value of the token.
+        """
+        return self._string[start:end]
 
     def tokenize(self):
         """Tokenize the provided string.
 
-        This assumes that the string is a snippet of valid  code; it is not
+        This assumes that the string is a snippet of valid code; it is not
         guaranteed to work on code that doesn't preserve a semblance of correct
         syntax. It also may not work if the code has nefarious macros that
         upset the syntactic structure (such as a macro that has a closing
         parenthesis but not an opening one).
 
-        :returns list: A list of `Token`s in the string.
+        :yields Token: The tokens in the string.
         """
-        while self._consume_whitespace():
-            token = self._get_next_token()
-            yield token
-            self._advance_cursor()
+        for group, start, end in self._scan():
+            yield Token(type=group,
+                        value=self._value(start, end),
+                        start_offset=start,
+                        end_offset=end,
+                        lines=self._lines)
 
-    def _get_next_token(self):
+    def tokenize_table(self):
+        """Tokenize the provided string into a `TokenTable`.
+
+        This doesn't create a `Token` object for each token.
+
+        :returns TokenTable: The tokens in the string.
+        """
+        table = TokenTable(self._lines)
+        append = table.append
+        for group, start, end in self._scan():
+            append(group, self._value(start, end), start, end)
+        return table
+
+    def _scan(self, start=0):
+        """Find the tokens in the string.
+
+        :param int start: The offset to start scanning at. This must not be in
+            the middle of a token.
+        :yields tuple: The type, start offset, and end offset of each token.
+        """
+        string = self._string
+        length = len(string)
+        cursor = self._WHITESPACE_PATTERN.match(string, start).end()
+        while cursor < length:
+            group, end = self._get_next_token(cursor)
+            yield group, cursor, end
+            cursor = self._WHITESPACE_PATTERN.match(string, end).end()
+
+    def _get_next_token(self, cursor):
         """Get the next token from the input string.
 
-        This leaves the cursor at the last character of the returned token.
+        :param int cursor: The index where the token starts.
+        :returns tuple: The type of the token and the index just past its
+            end.
+        :raises ValueError: There was no valid token at the cursor.
+        """
+        string = self._string
+        char = string[cursor]
+
+        if char in self._QUOTES:
+            quote = string[cursor:cursor + 1]
+            return "string", self._find_string_end(cursor, quote)
+
+        if char in self._WORD_START:
+            match = self._IDENTIFIER_PATTERN.match(string, cursor)
+            if match:
+                end = match.end()
+
+                # Keywords are also identifiers, so a keyword only wins if it
+                # is at least as long as the identifier.
+                keyword = self._KEYWORD_PATTERN.match(string, cursor)
+                if keyword and keyword.end() == end:
+                    return "keyword", end
+                return "identifier", end
+        elif char in self._DIGITS:
+            return "number", self._NUMBER_PATTERN.match(string, cursor).end()
+        elif char == self._SLASH:
+            comment_start = self._MULTILINE_COMMENT_START
+            if string.find(comment_start, cursor, cursor + 2) == cursor:
+                return "comment", self._find_multiline_comment_end(cursor)
+
+            match = self._COMMENT_PATTERN.match(string, cursor)
+            if match:
+                return "comment", match.end()
+
+        window = string[cursor:cursor + self._OPERATOR_WINDOW]
+        match = _match_operator(window)
+        if not match:
+            position = self._lines.position(cursor)
+            raise ValueError("Couldn't parse token at {}"
+                             .format(position.line_display))
+        group, match_length = match
+        return group, cursor + match_length
+
+    def _find_string_end(self, cursor, quote):
+        """Find the end of the string or character literal at the cursor.
 
-        :returns Token: The next token in the input.
+        This handles only string and character literals denoted with single
+        or double quotes. It doesn't handle raw string literals.
+
+        :param int cursor: The index of the opening quotation mark.
+        :param str quote: The quotation mark.
+        :returns int: The index just past the closing quotation mark.
+        :raises ValueError: There was an unterminated string literal.
+        """
+        string = self._string
+        end = cursor
+        while True:
+            end = string.find(quote, end + 1)
+            if end == -1:
+                position = self._lines.position(cursor)
+                raise ValueError("Unterminated string literal at {}"
+                                 .format(position.line_display))
+
+            # The quotation mark is escaped if it's preceded by an odd number
+            # of backslashes.
+            backslash = end - 1
+            while backslash > cursor and string[backslash] == self._BACKSLASH:
+                backslash -= 1
+            if (end - 1 - backslash) % 2 == 0:
+                return end + 1
+
+    def _find_multiline_comment_end(self, cursor):
+        """Find the end of the multiline comment at the cursor.
+
+        :param int cursor: The index of the opening `/*`.
+        :returns int: The index just past the closing `*/`.
+        :raises ValueError: There was an unterminated multiline comment.
         """
-        # Special cases that we need to handle with higher priority or aren't
-        # easily handled by regexes.
-        special_consumers = [self._consume_string,
-                             self._consume_multiline_comment]
-        for consumer in special_consumers:
-            token = consumer()
-            if token:
-                return token
+        # Start looking at the asterisk of the opening `/*`, so that `/*/` is
+        # treated as a complete comment, as the reference tokenizer does.
+        end = self._string.find(self._MULTILINE_COMMENT_END, cursor + 1)
+        if end == -1:
+            position = self._lines.position(cursor)
+            raise ValueError("Unterminated multiline comment at {}"
+                             .format(position.line_display))
+        return end + 2
 
-        # Try to match each of our token patterns
-        token_values = [(group, self._match_pattern(pattern))
-                        for group, pattern in self._TOKEN_PATTERNS]
 
-        # Get only the patterns that successfully matched something.
-        token_values = [(group, value)
-                        for group, value in token_values
-                        if value]
+def _encode_pattern(pattern):
+    """Make a bytes version of a regex for matching against buffers.
 
-        if not token_values:
-            raise ValueError("Couldn't parse token at {}"
-                             .format(self._position().line_display))
-
-        # Maximal munch -- pick the longest token.
-        token_values.sort(key=lambda i: len(i[1]),
-                          reverse=True)
-        group, value = token_values[0]
-
-        start_position = self._position()
-        # Advance our cursor until it reaches the character at the end of the
-        # token.
-        for _ in range(len(value) - 1):
-            self._advance_cursor()
-        end_position = self._position()
-        return Token(type=group,
-                     value=value,
-                     start=start_position,
-                     end=end_position)
-
-    def _match_pattern(self, pattern):
-        """If the pattern appears at the beginning of the stream, return it.
-
-        :param pattern: A compiled regex.
-        :returns str: The matched pattern, or `None` if there was no
-            such token.
-        """
-        match = pattern.match(self._string[self._cursor:])
-        if match:
-            return match.group()
-        else:
-            return None
+    :param _LazyPattern pattern: The regex.
+    :returns _LazyPattern: The bytes regex.
+    """
+    return _LazyPattern(pattern.pattern.encode("ascii"), pattern.flags)
 
-    def _consume_whitespace(self):
-        """Remove whitespace from the beginning of the stream.
 
-        :returns bool: Whether there is anything else left in the stream.
-        """
-        while self._cursor < len(self._string):
-            if self._char().isspace():
-                self._advance_cursor()
-            else:
-                return True
-        return False
+_UNICODE_WHITESPACE = ("\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004"
+                       "\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029"
+                       "\u202f\u205f\u3000")
+"""The non-ASCII characters which are whitespace in a string."""
 
-    def _consume_string(self):
-        """Get a string or character literal from the stream, if possible.
+_BYTES_WHITESPACE_PATTERN = _LazyPattern(
+    rb"(?:[\s\x1c-\x1f]|" +
+    b"|".join(re.escape(i.encode()) for i in _UNICODE_WHITESPACE) +
+    rb")*")
+"""Matches the UTF-8 encoding of the whitespace which `_Tokenizer` skips.
 
-        :returns Token: The string token, or `None` if there was no string at
-            the current position.
-        :raises ValueError: There was an unterminated string literal.
-        """
-        # This handles only string and character literals denoted with single
-        # or double quotes. It doesn't handle raw string literals.
-        if self._char() == '"':
-            quote = '"'
-        elif self._char() == "'":
-            quote = "'"
-        else:
-            return None
+In a bytes pattern, whitespace is only ASCII, and doesn't include the
+separator characters from 0x1c to 0x1f.
+"""
 
-        start_index = self._cursor
-        start_position = self._position()
-
-        # Skip the current quotation mark.
-        self._advance_cursor()
-
-        while self._cursor < len(self._string):
-            if self._char() == "\\":
-                # Ignore backslash escape sequences.
-                self._advance_cursor()
-            elif self._char() == quote:
-                end_index = self._cursor
-                end_position = self._position()
-                break
-            self._advance_cursor()
-        else:
-            raise ValueError("Unterminated string literal at {}"
-                             .format(self._position().line_display))
+_WIDE_BYTE_PATTERN = _LazyPattern(rb"[\t\x80-\xff]")
+"""Matches the bytes which aren't one column wide: tabs, and the bytes of
+non-ASCII characters."""
 
-        return Token(type="string",
-                     value=self._string[start_index:end_index + 1],
-                     start=start_position,
-                     end=end_position)
 
-    def _consume_multiline_comment(self):
-        """Get a multiline comment from the stream, if possible.
+class _BufferTokenizer(_Tokenizer):
+    """Tokenize C/C++ code stored in a bytes-like buffer.
 
-        :returns Token: The multiline comment, or `None` if there was no
-            multiline comment at the current position.
-        :raises ValueError: There was an unterminated multiline comment.
+    This lets us tokenize a memory-mapped file without decoding the whole file
+    into a string. The buffer is assumed to be UTF-8. Token values are decoded
+    one at a time, and token offsets are byte offsets into the buffer.
+    """
+
+    _WHITESPACE_PATTERN = _BYTES_WHITESPACE_PATTERN
+
+    _NUMBER_PATTERN = _encode_pattern(_Tokenizer._NUMBER_PATTERN)
+    _KEYWORD_PATTERN = _encode_pattern(_Tokenizer._KEYWORD_PATTERN)
+    _IDENTIFIER_PATTERN = _encode_pattern(_Tokenizer._IDENTIFIER_PATTERN)
+    _COMMENT_PATTERN = _encode_pattern(_Tokenizer._COMMENT_PATTERN)
+
+    # Indexing into a buffer produces integers rather than characters.
+    _WORD_START = frozenset(i.encode("ascii")[0]
+                            for i in _Tokenizer._WORD_START)
+    _DIGITS = frozenset(i.encode("ascii")[0] for i in _Tokenizer._DIGITS)
+    _QUOTES = frozenset(i.encode("ascii")[0] for i in _Tokenizer._QUOTES)
+    _SLASH = ord(_Tokenizer._SLASH)
+    _BACKSLASH = ord(_Tokenizer._BACKSLASH)
+    _MULTILINE_COMMENT_START = b"/*"
+    _MULTILINE_COMMENT_END = b"*/"
+
+    def _value(self, start, end):
+        """Get the value of the token between the provided offsets.
+
+        :param int start: The offset of the start of the token.
+        :param int end: The offset just past the end of the token.
+        :returns str: The decoded value of the token.
         """
-        def peek_two():
-            # Note that this may result in only one character when at the end
-            # of the stream, which is fine.
-            return self._string[self._cursor:self._cursor + 2]
+        return self._string[start:end].decode("utf-8", "replace")
 
-        if peek_two() != "/*":
-            return None
 
-        start_position = self._position()
-        start_index = self._cursor
+_OPERATOR_PATTERNS = {
+    str: [(group, pattern)
+          for group, pattern in _TOKEN_PATTERNS
+          if group in ["unary_operator", "binary_operator", "grouping"]],
+}
+_OPERATOR_PATTERNS[bytes] = [(group, _encode_pattern(pattern))
+                             for group, pattern in _OPERATOR_PATTERNS[str]]
+"""The patterns for operator and grouping tokens, for strings and buffers."""
 
-        while self._cursor < len(self._string):
-            if peek_two() == "*/":
-                # Move cursor to the "/".
-                self._advance_cursor()
 
-                end_index = self._cursor
-                end_position = self._position()
-                break
-            self._advance_cursor()
-        else:
-            raise ValueError("Unterminated multiline comment at {}"
-                             .format(self._position().line_display))
+@functools.lru_cache(maxsize=1024)
+def _match_operator(window):
+    """Match an operator or grouping token at the start of the window.
 
-        return Token(type="comment",
-                     value=self._string[start_index:end_index + 1],
-                     start=start_position,
-                     end=end_position)
+    :param window: The text at the start of the token, as a string or bytes.
+        It must be at least as long as the longest operator, unless it's at
+        the end of the file.
+    :returns tuple: The type of the token and its length, or `None` if there
+        was no such token.
+    """
+    matches = []
+    for group, pattern in _OPERATOR_PATTERNS[type(window)]:
+        match = pattern.match(window)
+        if match and match.group():
+            matches.append((group, len(match.group())))
+
+    if not matches:
+        return None
+
+    # Maximal munch -- pick the longest token.
+    matches.sort(key=lambda i: i[1], reverse=True)
+    return matches[0]
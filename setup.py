@@ -10,10 +10,12 @@ setup(
     description="C and C++ linter for EECS 381.",
     url="https://github.com/arxanas/lint381",
 
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     entry_points="""
     [console_scripts]
     lint381=lint381.__main__:main
+    lint381-client=lint381.client:main
     """,
+    python_requires=">=3.7",
     install_requires=["click==6.2"],
 )
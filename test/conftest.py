@@ -0,0 +1,48 @@
+"""Shared test fixtures."""
+import subprocess
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    """Keep the lint cache out of the user's home directory.
+
+    :returns py.path.local: The cache directory used by the tests.
+    """
+    path = tmpdir.join("cache")
+    monkeypatch.setenv("LINT381_CACHE_DIR", str(path))
+    return path
+
+
+def git(directory, *args):
+    """Run a git command in a directory.
+
+    :returns str: The output of the command.
+    """
+    return subprocess.run(["git",
+                           "-c", "user.name=Test",
+                           "-c", "user.email=test@example.com",
+                           "-c", "commit.gpgsign=false"] + list(args),
+                          cwd=str(directory),
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          universal_newlines=True,
+                          check=True).stdout
+
+
+@pytest.fixture
+def repo(tmpdir):
+    """Make a git repository with one commit.
+
+    :returns py.path.local: The repository's directory.
+    """
+    repo = tmpdir.mkdir("repo")
+    git(repo, "init", "-q")
+    repo.join("foo.cpp").write("int a;\nint b;\nint c;\nint d;\n")
+    repo.join("bar.cpp").write("int a;\n")
+    repo.join("gone.cpp").write("int a;\n")
+    repo.join(".gitignore").write("ignored.cpp\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "Initial commit")
+    return repo
@@ -0,0 +1,7 @@
+// Comments may have non-ASCII text: café, naïve, 日本語.
+int x; /* éé */ using std::cout;
+int y; unsigned z;　// No-break and ideographic spaces.
+const char* s = "ünïcödé"; float f;
+/* Ends with é */ float g; /* éé
+é */ float h;
+int i; // *** déjà vu é
@@ -0,0 +1,224 @@
+"""The reference tokenizer, which `lint381.tokenizer` is checked against."""
+from lint381.tokenizer import _TOKEN_PATTERNS, Position, Token
+
+
+class ReferenceTokenizer:
+    """Tokenize C/C++ code one character at a time.
+
+    This is the original, straightforward implementation of the tokenizer. It
+    tries every pattern against the rest of the file for every token, so it is
+    quadratic in the size of the file. It is kept with the tests as the
+    specification that `lint381.tokenizer._Tokenizer` is checked against.
+    """
+
+    def __init__(self, string):
+        """Prepare to tokenize the provided code.
+
+        :param str string: The source code, as a string.
+        """
+        assert "\t" not in string, (
+            "Remove tabs from code before attempting to tokenize. "
+            "We don't provide meaningful token positions for code "
+            "that has tabs in it."
+        )
+
+        # Add a dummy whitespace character to end the last token.
+        self._string = string + "\n"
+
+        # The 'cursor' is the index into the source code string where we
+        # currently are. We advance this as we consume tokens.
+        self._cursor = 0
+
+        # The row and column corresponding to the cursor. When we hit a newline
+        # character, the row increments and the column is set to zero.
+        self._row = 0
+        self._column = 0
+
+    def _char(self):
+        """Get the character under the cursor.
+
+        :returns str: The current character.
+        """
+        assert self._cursor >= 0
+        return self._string[self._cursor]
+
+    def _advance_cursor(self):
+        """Advance the cursor by one character."""
+        if self._char() == "\n":
+            self._row += 1
+            self._column = 0
+        else:
+            self._column += 1
+
+        self._cursor += 1
+
+    def _position(self):
+        """Get the position of the cursor.
+
+        :return Position: The position of the cursor.
+        """
+        assert 0 <= self._row < len(self._string)
+        assert 0 <= self._column < len(self._string)
+        return Position(row=self._row, column=self._column)
+
+    def tokenize(self):
+        """Tokenize the provided string.
+
+        This assumes that the string is a snippet of valid  code; it is not
+        guaranteed to work on code that doesn't preserve a semblance of correct
+        syntax. It also may not work if the code has nefarious macros that
+        upset the syntactic structure (such as a macro that has a closing
+        parenthesis but not an opening one).
+
+        :returns list: A list of `Token`s in the string.
+        """
+        while self._consume_whitespace():
+            token = self._get_next_token()
+            yield token
+            self._advance_cursor()
+
+    def _get_next_token(self):
+        """Get the next token from the input string.
+
+        This leaves the cursor at the last character of the returned token.
+
+        :returns Token: The next token in the input.
+        """
+        # Special cases that we need to handle with higher priority or aren't
+        # easily handled by regexes.
+        special_consumers = [self._consume_string,
+                             self._consume_multiline_comment]
+        for consumer in special_consumers:
+            token = consumer()
+            if token:
+                return token
+
+        # Try to match each of our token patterns
+        token_values = [(group, self._match_pattern(pattern))
+                        for group, pattern in _TOKEN_PATTERNS]
+
+        # Get only the patterns that successfully matched something.
+        token_values = [(group, value)
+                        for group, value in token_values
+                        if value]
+
+        if not token_values:
+            raise ValueError("Couldn't parse token at {}"
+                             .format(self._position().line_display))
+
+        # Maximal munch -- pick the longest token.
+        token_values.sort(key=lambda i: len(i[1]),
+                          reverse=True)
+        group, value = token_values[0]
+
+        start_position = self._position()
+        # Advance our cursor until it reaches the character at the end of the
+        # token.
+        for _ in range(len(value) - 1):
+            self._advance_cursor()
+        end_position = self._position()
+        return Token(type=group,
+                     value=value,
+                     start=start_position,
+                     end=end_position)
+
+    def _match_pattern(self, pattern):
+        """If the pattern appears at the beginning of the stream, return it.
+
+        :param pattern: A compiled regex.
+        :returns str: The matched pattern, or `None` if there was no
+            such token.
+        """
+        match = pattern.match(self._string[self._cursor:])
+        if match:
+            return match.group()
+        else:
+            return None
+
+    def _consume_whitespace(self):
+        """Remove whitespace from the beginning of the stream.
+
+        :returns bool: Whether there is anything else left in the stream.
+        """
+        while self._cursor < len(self._string):
+            if self._char().isspace():
+                self._advance_cursor()
+            else:
+                return True
+        return False
+
+    def _consume_string(self):
+        """Get a string or character literal from the stream, if possible.
+
+        :returns Token: The string token, or `None` if there was no string at
+            the current position.
+        :raises ValueError: There was an unterminated string literal.
+        """
+        # This handles only string and character literals denoted with single
+        # or double quotes. It doesn't handle raw string literals.
+        if self._char() == '"':
+            quote = '"'
+        elif self._char() == "'":
+            quote = "'"
+        else:
+            return None
+
+        start_index = self._cursor
+        start_position = self._position()
+
+        # Skip the current quotation mark.
+        self._advance_cursor()
+
+        while self._cursor < len(self._string):
+            if self._char() == "\\":
+                # Ignore backslash escape sequences.
+                self._advance_cursor()
+            elif self._char() == quote:
+                end_index = self._cursor
+                end_position = self._position()
+                break
+            self._advance_cursor()
+        else:
+            raise ValueError("Unterminated string literal at {}"
+                             .format(self._position().line_display))
+
+        return Token(type="string",
+                     value=self._string[start_index:end_index + 1],
+                     start=start_position,
+                     end=end_position)
+
+    def _consume_multiline_comment(self):
+        """Get a multiline comment from the stream, if possible.
+
+        :returns Token: The multiline comment, or `None` if there was no
+            multiline comment at the current position.
+        :raises ValueError: There was an unterminated multiline comment.
+        """
+        def peek_two():
+            # Note that this may result in only one character when at the end
+            # of the stream, which is fine.
+            return self._string[self._cursor:self._cursor + 2]
+
+        if peek_two() != "/*":
+            return None
+
+        start_position = self._position()
+        start_index = self._cursor
+
+        while self._cursor < len(self._string):
+            if peek_two() == "*/":
+                # Move cursor to the "/".
+                self._advance_cursor()
+
+                end_index = self._cursor
+                end_position = self._position()
+                break
+            self._advance_cursor()
+        else:
+            raise ValueError("Unterminated multiline comment at {}"
+                             .format(self._position().line_display))
+
+        return Token(type="comment",
+                     value=self._string[start_index:end_index + 1],
+                     start=start_position,
+                     end=end_position)
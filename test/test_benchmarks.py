@@ -0,0 +1,146 @@
+"""Test the benchmark suite on a tiny corpus."""
+import json
+
+from click.testing import CliRunner
+import pytest
+
+from benchmarks.__main__ import main
+from benchmarks.corpus import generate_corpus, read_snippets, VARIANTS
+from benchmarks.suite import compare, format_comparisons
+from lint381.tokenizer import tokenize
+
+
+def result(rate):
+    """Make the result of a benchmark.
+
+    :param float rate: The rate.
+    :returns dict:
+    """
+    return {"rate": rate, "unit": "tokens/s", "seconds": 1.0, "count": rate}
+
+
+def test_read_snippets():
+    """Ensure that we read the snippets of each language."""
+    snippets = read_snippets("cpp")
+    assert "using namespace std;\n\nusing std::cout;\n" in "".join(snippets)
+    assert not any("error:" in i for i in snippets)
+
+
+def test_generate_corpus():
+    """Ensure that we generate the same corpus for the same seed."""
+    corpus = list(generate_corpus(scale=0.05))
+    assert corpus == list(generate_corpus(scale=0.05))
+    assert corpus != list(generate_corpus(scale=0.05, seed=1))
+    assert {(variant, lang) for variant, lang, _, _ in corpus} == {
+        (variant, lang) for variant in VARIANTS for lang in ["c", "cpp"]}
+
+    for variant, lang, path, code in corpus:
+        assert path.startswith(variant)
+        assert path.endswith("." + lang)
+        # The snippets still tokenize when they're joined together.
+        assert tokenize(code)
+
+    # The size of the corpus scales.
+    small = list(generate_corpus(scale=0.1, variants=["small"],
+                                 langs=["c"]))
+    large = list(generate_corpus(scale=0.2, variants=["small"],
+                                 langs=["c"]))
+    assert len(large) == 2 * len(small)
+    assert len(large[0][3]) > len(small[0][3])
+
+    includes = list(generate_corpus(scale=0.05, variants=["includes"],
+                                    langs=["c"]))
+    assert includes[0][3].count("#include") >= VARIANTS["includes"].includes
+
+
+@pytest.mark.parametrize("old, new, change, regressed", [
+    (100.0, 100.0, 0.0, False),
+    (100.0, 95.0, -0.05, False),
+    (100.0, 80.0, -0.2, True),
+    (100.0, 150.0, 0.5, False),
+    (0.0, 10.0, None, False),
+])
+def test_compare(old, new, change, regressed):
+    """Ensure that we flag benchmarks which got slower than the baseline."""
+    comparison, = compare({"a": result(old)}, {"a": result(new)},
+                          threshold=0.1)
+    assert comparison.change == pytest.approx(change)
+    assert comparison.regressed == regressed
+    assert ("REGRESSION" in format_comparisons([comparison])) == regressed
+
+
+def test_compare_missing():
+    """Ensure that we report benchmarks only in one of the results."""
+    comparisons = compare({"old": result(1.0)}, {"new": result(1.0)},
+                          threshold=0.1)
+    assert [(i.name, i.change, i.regressed) for i in comparisons] == [
+        ("new", None, False),
+        ("old", None, False),
+    ]
+    lines = format_comparisons(comparisons).splitlines()
+    assert lines[1].split() == ["new", "-", "1.0", "new"]
+    assert lines[2].split() == ["old", "1.0", "-", "missing"]
+
+
+def test_run(tmpdir):
+    """Ensure that we run the benchmarks and compare them to a baseline."""
+    runner = CliRunner()
+    baseline = str(tmpdir.join("baseline.json"))
+    corpus = tmpdir.join("corpus")
+    result = runner.invoke(main, ["run", "--scale", "0.01", "--repeat", "1",
+                                  "--variant", "small",
+                                  "--corpus", str(corpus),
+                                  "--output", baseline])
+    assert result.exit_code == 0, result.output
+    log = json.loads(tmpdir.join("baseline.json").read())
+    assert log["corpus"] == {"scale": 0.01, "seed": 0, "files": 4}
+    assert corpus.join("small", "cpp", "file0000.cpp").check()
+
+    results = log["results"]
+    assert set(results) >= {
+        "tokenize/c/small",
+        "tokenize/cpp/small",
+        "match_tokens/cpp/small",
+        "cli/small",
+    }
+    assert any(i.startswith("rule/c/") for i in results)
+    assert any(i.startswith("rule/cpp/") for i in results)
+    assert results["cli/small"]["unit"] == "files/s"
+    assert results["cli/small"]["count"] == 4
+    assert all(i["rate"] > 0 for i in results.values())
+
+    # Make every benchmark much faster in the baseline.
+    for i in results.values():
+        i["rate"] *= 10
+    slow = str(tmpdir.join("slow.json"))
+    tmpdir.join("slow.json").write(json.dumps(log))
+
+    result = runner.invoke(main, ["compare", baseline, baseline])
+    assert result.exit_code == 0
+    assert "REGRESSION" not in result.output
+    result = runner.invoke(main, ["compare", slow, baseline])
+    assert result.exit_code == 1
+    assert "REGRESSION" in result.output
+
+
+def test_run_options(tmpdir):
+    """Ensure that we only run the chosen benchmarks."""
+    runner = CliRunner()
+    output = tmpdir.join("results.json")
+    result = runner.invoke(main, ["run", "--scale", "0.01", "--repeat", "1",
+                                  "--benchmark", "tokenize",
+                                  "--seed", "3",
+                                  "--output", str(output)])
+    assert result.exit_code == 0, result.output
+    log = json.loads(output.read())
+    assert {i.split("/")[0] for i in log["results"]} == {"tokenize"}
+
+    # The corpus is different, so the results are compared with a warning.
+    baseline = tmpdir.join("baseline.json")
+    log["corpus"]["seed"] = 0
+    baseline.write(json.dumps(log))
+    result = runner.invoke(main, ["compare", str(baseline), str(output)])
+    assert "corpora differ" in result.output
+
+    result = runner.invoke(main, ["run", "--scale", "0"])
+    assert result.exit_code == 2
@@ -0,0 +1,138 @@
+"""Test the on-disk cache of linting errors."""
+import os
+
+from lint381.cache import (
+    CachedResult,
+    default_directory,
+    LintCache,
+    rule_names,
+)
+from lint381.cpp import linter as cpp_linter
+from lint381.linter import Linter
+
+
+def test_default_directory(monkeypatch):
+    """Ensure that we find the cache directory from the environment."""
+    monkeypatch.setenv("LINT381_CACHE_DIR", "/foo")
+    assert default_directory() == "/foo"
+
+    monkeypatch.delenv("LINT381_CACHE_DIR")
+    monkeypatch.setenv("XDG_CACHE_HOME", "/bar")
+    assert default_directory() == os.path.join("/bar", "lint381")
+
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    monkeypatch.setenv("HOME", "/baz")
+    assert default_directory() == os.path.join("/baz", ".cache", "lint381")
+
+
+def test_key():
+    """Ensure that the key depends on the content and the other fields."""
+    cache = LintCache("unused")
+    key = cache.key(b"foo", lang="cpp")
+    assert key == cache.key(b"foo", lang="cpp")
+    assert key != cache.key(b"bar", lang="cpp")
+    assert key != cache.key(b"foo", lang="c")
+    assert key != cache.key(b"foo", lang="cpp", filename="foo.cpp")
+
+
+def test_rule_names():
+    """Ensure that the rule set is identified by the linting functions."""
+    names = rule_names(cpp_linter)
+    assert "lint381.cpp.deprecated_tokens" in names
+    assert "lint381.c.user_includes_before_system_includes" in names
+    assert rule_names(Linter()) == []
+
+
+def test_get_put(tmpdir):
+    """Ensure that we can store and load errors."""
+    cache = LintCache(str(tmpdir.join("cache")))
+    key = cache.key(b"unsigned x;", lang="cpp")
+    assert cache.get(key) is None
+
+    errors = cpp_linter.lint("foo.cpp", "unsigned x;\n/* a\n*** */")
+    cache.put(key, CachedResult(errors=errors, failure=None))
+    result = cache.get(key)
+    assert result.failure is None
+    assert [i.message for i in result.errors] == [i.message for i in errors]
+    assert [i.rule for i in result.errors] == [i.rule for i in errors]
+    for loaded, error in zip(result.errors, errors):
+        assert [(i.type, i.value, i.start, i.end) for i in loaded.tokens] == \
+            [(i.type, i.value, i.start, i.end) for i in error.tokens]
+
+    cache.put(key, CachedResult(errors=[], failure="Couldn't parse token"))
+    assert cache.get(key) == CachedResult(errors=[],
+                                          failure="Couldn't parse token")
+
+
+def test_corrupt_entry(tmpdir):
+    """Ensure that entries which can't be read are ignored."""
+    cache = LintCache(str(tmpdir))
+    tmpdir.join("foo.json").write("{")
+    tmpdir.join("bar.json").write("{}")
+    assert cache.get("foo") is None
+    assert cache.get("bar") is None
+
+
+def test_put_unwritable(tmpdir):
+    """Ensure that failing to store an entry isn't an error."""
+    path = tmpdir.join("file")
+    path.write("")
+    cache = LintCache(str(path.join("cache")))
+    cache.put("foo", CachedResult(errors=[], failure=None))
+    assert cache.get("foo") is None
+    assert cache.prune() == 0
+
+
+def test_prune(tmpdir):
+    """Ensure that we evict the least-recently-used entries."""
+    cache = LintCache(str(tmpdir))
+    result = CachedResult(errors=[], failure=None)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, result)
+        os.utime(str(tmpdir.join(key + ".json")), (i, i))
+    tmpdir.join("unrelated").write("x" * 100)
+
+    entry_size = tmpdir.join("a.json").size()
+    cache.max_size = 2 * entry_size
+    assert cache.prune() == 1
+    assert cache.get("a") is None
+
+    # Using an entry keeps it from being evicted.
+    assert cache.get("b") is not None
+    cache.max_size = entry_size
+    assert cache.prune() == 1
+    assert cache.get("b") is not None
+    assert cache.get("c") is None
+    assert tmpdir.join("unrelated").check()
+
+    cache.max_size = 0
+    assert cache.prune() == 1
+    assert cache.get("b") is None
+
+
+def test_prune_after_put(tmpdir, monkeypatch):
+    """Ensure that we only look at the entries after more are written."""
+    cache = LintCache(str(tmpdir))
+    result = CachedResult(errors=[], failure=None)
+    cache.put("a", result)
+    assert cache.prune() == 0
+
+    scanned = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir",
+                        lambda path: scanned.append(path) or scandir(path))
+    assert cache.get("a") is not None
+    assert cache.prune() == 0
+    assert scanned == []
+
+    # As if the cache was pruned long before the entry was written.
+    cache.put("b", result)
+    os.utime(str(tmpdir.join("size")), (0, 0))
+    assert cache.prune() == 0
+    assert scanned == [str(tmpdir)]
+    assert cache.prune() == 0
+    assert scanned == [str(tmpdir)]
+
+    tmpdir.join("size").write("x")
+    assert cache.prune() == 0
+    assert len(scanned) == 2
@@ -0,0 +1,89 @@
+"""Test finding the lines changed since a git commit."""
+import os.path
+
+import pytest
+
+from conftest import git
+from lint381.changes import _parse_diff, changed_rows
+
+
+def test_parse_diff():
+    """Ensure that we find the added and changed rows of each file."""
+    diff = """\
+diff --git a/foo.cpp b/foo.cpp
+index 1111111..2222222 100644
+--- a/foo.cpp
++++ b/foo.cpp
+@@ -1,0 +2 @@ int a;
+++++ x;
+@@ -5,2 +6,3 @@ int b;
++a
++b
++c
+@@ -9 +10,0 @@ int c;
+-d
+diff --git a/gone.cpp b/gone.cpp
+deleted file mode 100644
+--- a/gone.cpp
++++ /dev/null
+@@ -1 +0,0 @@
+-int a;
+diff --git a/removed.cpp b/removed.cpp
+--- a/removed.cpp
++++ b/removed.cpp
+@@ -3 +2,0 @@
+-int a;
+@@ garbage
+"""
+    assert _parse_diff(diff, "/repo") == {
+        os.path.realpath("/repo/foo.cpp"): [(1, 1), (5, 7)],
+    }
+
+
+def test_changed_rows(repo):
+    """Ensure that we find the changes since a commit."""
+    assert changed_rows("HEAD", str(repo)) == {}
+
+    repo.join("foo.cpp").write("int a;\nint x;\nint c;\nint d;\nint e;\n")
+    repo.join("gone.cpp").remove()
+    repo.join("new.cpp").write("int a;\n")
+    repo.join("ignored.cpp").write("int a;\n")
+    subdir = repo.mkdir("subdir")
+    git(repo, "add", "foo.cpp")
+
+    assert changed_rows("HEAD", str(subdir)) == {
+        os.path.realpath(str(repo.join("foo.cpp"))): [(1, 1), (4, 4)],
+        os.path.realpath(str(repo.join("new.cpp"))): None,
+    }
+
+
+@pytest.mark.parametrize("ref", ["nonexistent", "--foo", "HEAD:foo.cpp"])
+def test_changed_rows_invalid(repo, ref):
+    """Ensure that we report when git fails."""
+    with pytest.raises(ValueError) as e:
+        changed_rows(ref, str(repo))
+    assert str(e.value) == "Unknown commit: {}".format(ref)
+
+
+def test_changed_rows_option(repo, tmpdir):
+    """Ensure that a ref starting with a dash isn't passed as an option."""
+    output = tmpdir.join("output")
+    with pytest.raises(ValueError):
+        changed_rows("--output={}".format(output), str(repo))
+    assert not output.check()
+
+
+def test_changed_rows_not_a_repo(tmpdir, monkeypatch):
+    """Ensure that we report when we're not in a git repository."""
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmpdir))
+    with pytest.raises(ValueError) as e:
+        changed_rows("HEAD", str(tmpdir))
+    assert "not a git repository" in str(e.value)
+
+
+def test_git_missing(tmpdir, monkeypatch):
+    """Ensure that we report when git isn't installed."""
+    monkeypatch.setenv("PATH", str(tmpdir))
+    with pytest.raises(ValueError) as e:
+        changed_rows("HEAD", str(tmpdir))
+    assert "Couldn't run git" in str(e.value)
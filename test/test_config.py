@@ -0,0 +1,81 @@
+"""Test reading options from configuration files."""
+import pytest
+
+from lint381.config import find_config, load_config, parse_names
+
+
+def test_find_config(tmpdir):
+    """Ensure that we find the nearest file with a [lint381] section."""
+    subdir = tmpdir.mkdir("foo").mkdir("bar")
+    tmpdir.join("setup.cfg").write("[lint381]\nlang = c\n")
+    subdir.join("setup.cfg").write("[flake8]\nignore = E501\n")
+    assert find_config(str(subdir)) == str(tmpdir.join("setup.cfg"))
+
+    tmpdir.join("foo", "lint381.cfg").write("[lint381]\n")
+    assert find_config(str(subdir)) == str(tmpdir.join("foo", "lint381.cfg"))
+
+    with tmpdir.as_cwd():
+        assert find_config() == str(tmpdir.join("setup.cfg"))
+
+
+def test_find_config_invalid(tmpdir):
+    """Ensure that we skip files which can't be parsed."""
+    subdir = tmpdir.mkdir("foo")
+    tmpdir.join("setup.cfg").write("[lint381]\nlang = c\n")
+    subdir.join("setup.cfg").write("[metadata\n")
+    subdir.join("lint381.cfg").write("lang = c\n")
+    assert find_config(str(subdir)) == str(tmpdir.join("setup.cfg"))
+
+
+def test_find_config_missing(tmpdir, monkeypatch):
+    """Ensure that we find nothing if there's no configuration file."""
+    monkeypatch.setattr("lint381.config.CONFIG_FILES", ["missing.cfg"])
+    assert find_config(str(tmpdir)) is None
+
+
+def test_load_config(tmpdir):
+    """Ensure that we read the options in the [lint381] section."""
+    path = tmpdir.join("setup.cfg")
+    path.write("""\
+[lint381]
+lang = c
+tab-width = 8
+ignore =
+    enum_members_all_caps,
+    comparison_to_null
+
+[flake8]
+ignore = E501
+""")
+    assert load_config(str(path)) == {
+        "lang": "c",
+        "tab_width": "8",
+        "ignore": "\nenum_members_all_caps,\ncomparison_to_null",
+    }
+
+    path.write("[flake8]\n")
+    assert load_config(str(path)) == {}
+    assert load_config(None) == {}
+
+
+@pytest.mark.parametrize("contents", [None, "lang = c\n", "[lint381\n"])
+def test_load_config_invalid(tmpdir, contents):
+    """Ensure that we reject files which can't be read."""
+    path = tmpdir.join("setup.cfg")
+    if contents is not None:
+        path.write(contents)
+    with pytest.raises(ValueError) as e:
+        load_config(str(path))
+    assert str(path) in str(e.value)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", ()),
+    ("foo", ("foo",)),
+    ("foo,bar", ("foo", "bar")),
+    (" foo, bar\nbaz ", ("foo", "bar", "baz")),
+])
+def test_parse_names(value, expected):
+    """Ensure that we split lists of checks on commas and whitespace."""
+    assert parse_names(value) == expected
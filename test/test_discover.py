@@ -0,0 +1,270 @@
+"""Test finding the files to lint and detecting their language."""
+import os
+
+import pytest
+
+from lint381.discover import (
+    _IgnoreRule,
+    detect_language,
+    is_source_file,
+    iter_file_list,
+    iter_files,
+)
+
+
+def relative_files(root, *args, **kwargs):
+    """Find the files to lint in a directory.
+
+    :param py.path.local root: The directory.
+    :returns list: The path of each file found, relative to `root`.
+    """
+    return [os.path.relpath(i, str(root))
+            for i in iter_files([str(root)], *args, **kwargs)]
+
+
+@pytest.mark.parametrize("name, code, lang", [
+    ("foo.c", "", "c"),
+    ("foo.cpp", "", "cpp"),
+    ("foo.txt", "", None),
+    ("foo.h", "int x;\n", None),
+    ("foo.h", "class Foo {};\n", "cpp"),
+    ("foo.h", "#include <vector>\n", "cpp"),
+    ("foo.h", "#include <stdio.h>\n", None),
+    ("foo.h", "int x = std::max(1, 2);\n", "cpp"),
+    ("foo.h", "/* class Foo */\n// namespace\nint x;\n", None),
+    ("foo.h", "/* unterminated class", None),
+])
+def test_detect_language(tmpdir, name, code, lang):
+    """Ensure that we detect the language of a file."""
+    path = tmpdir.join(name)
+    path.write(code)
+    assert detect_language(str(path)) == lang
+    assert detect_language(str(path), default="x") == (lang or "x")
+
+
+@pytest.mark.parametrize("sibling, lang", [
+    ("foo.c", "c"),
+    ("foo.cpp", "cpp"),
+    ("bar.c", "cpp"),
+])
+def test_detect_language_sibling(tmpdir, sibling, lang):
+    """Ensure that we detect the language of a header by its source file."""
+    tmpdir.join(sibling).write("")
+    path = tmpdir.join("foo.h")
+    path.write("int x;\n")
+    assert detect_language(str(path), default="cpp") == lang
+
+
+def test_detect_language_code(tmpdir):
+    """Ensure that we detect the language of code which isn't saved."""
+    path = str(tmpdir.join("foo.h"))
+    assert detect_language(path, code="namespace foo {}\n") == "cpp"
+    assert detect_language(path, code="int x;\n") is None
+
+
+def test_detect_language_unreadable(tmpdir):
+    """Ensure that we fall back if a header can't be read."""
+    assert detect_language(str(tmpdir.join("missing.h"))) is None
+
+
+@pytest.mark.parametrize("path, options, expected", [
+    ("foo.cpp", {}, True),
+    ("foo.c", {}, True),
+    ("foo.h", {}, True),
+    ("foo.txt", {}, False),
+    ("foo.c", {"lang": "cpp"}, False),
+    ("foo.h", {"lang": "c"}, True),
+    ("foo.txt", {"include": ["*.txt"]}, True),
+    ("foo.cpp", {"include": ["*.txt"]}, False),
+    ("src/foo.cpp", {"include": ["src/*"]}, True),
+    ("foo.cpp", {"exclude": ["foo.*"]}, False),
+    ("src/foo.cpp", {"exclude": ["foo.cpp"]}, False),
+    ("src/lib/foo.cpp", {"exclude": ["lib"]}, False),
+    ("src/lib/foo.cpp", {"exclude": ["src/lib"]}, False),
+    ("src/lib/foo.cpp", {"exclude": ["src/lib/bar.cpp"]}, True),
+    ("src/foo.cpp", {"include": ["*.cpp"], "exclude": ["src/*"]}, False),
+])
+def test_is_source_file(path, options, expected):
+    """Ensure that we choose which files to lint."""
+    assert is_source_file(path, **options) == expected
+
+
+def test_iter_files(tmpdir):
+    """Ensure that we walk directories in order of name."""
+    root = tmpdir.mkdir("root")
+    root.join("b.cpp").write("")
+    root.join("a.c").write("")
+    root.join("notes.txt").write("")
+    root.mkdir("lib").join("z.h").write("")
+    root.join("lib").mkdir("deep").join("x.cpp").write("")
+    root.mkdir("a").join("y.cpp").write("")
+    root.mkdir(".git").join("HEAD.cpp").write("")
+
+    assert relative_files(root) == [
+        os.path.join("a", "y.cpp"),
+        "a.c",
+        "b.cpp",
+        os.path.join("lib", "deep", "x.cpp"),
+        os.path.join("lib", "z.h"),
+    ]
+    assert relative_files(root, lang="c") == [
+        "a.c",
+        os.path.join("lib", "z.h"),
+    ]
+    assert relative_files(root, include=["*.txt"]) == ["notes.txt"]
+    assert relative_files(root, exclude=["lib", "a.c"]) == [
+        os.path.join("a", "y.cpp"),
+        "b.cpp",
+    ]
+    assert relative_files(root, exclude=["lib/deep"]) == [
+        os.path.join("a", "y.cpp"),
+        "a.c",
+        "b.cpp",
+        os.path.join("lib", "z.h"),
+    ]
+
+    # Files and standard input are passed through as they are.
+    paths = ["-", str(root.join("notes.txt"))]
+    assert list(iter_files(paths)) == paths
+
+
+def test_iter_files_symlinks(tmpdir):
+    """Ensure that we don't follow symbolic links to directories."""
+    root = tmpdir.mkdir("root")
+    root.join("foo.cpp").write("")
+    root.join("loop").mksymlinkto(root)
+    root.join("bar.cpp").mksymlinkto(root.join("foo.cpp"))
+    assert relative_files(root) == ["bar.cpp", "foo.cpp"]
+
+
+def test_iter_files_unreadable(tmpdir, monkeypatch):
+    """Ensure that we skip directories which can't be read."""
+    root = tmpdir.mkdir("root")
+    root.mkdir("secret").join("foo.cpp").write("")
+    root.join("bar.cpp").write("")
+    scandir = os.scandir
+
+    def fake_scandir(path):
+        if path.endswith("secret"):
+            raise PermissionError(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, "scandir", fake_scandir)
+    assert relative_files(root) == ["bar.cpp"]
+
+
+def test_gitignore(tmpdir):
+    """Ensure that we skip the files ignored by `.gitignore` files."""
+    root = tmpdir.mkdir("root")
+    root.join(".gitignore").write("""\
+# Comments and blank lines are skipped.
+
+*.gen.cpp
+!keep.gen.cpp
+/top.cpp
+build/
+docs/**/*.h
+\\#hash.cpp
+""")
+    for name in ["a.gen.cpp", "keep.gen.cpp", "top.cpp", "#hash.cpp",
+                 "ok.cpp"]:
+        root.join(name).write("")
+    root.mkdir("build").join("out.cpp").write("")
+    sub = root.mkdir("sub")
+    sub.join("top.cpp").write("")
+    sub.join("b.gen.cpp").write("")
+    sub.join("build").write("")
+    sub.join(".gitignore").write("[ab].cpp\n!/b.gen.cpp\n")
+    sub.join("a.cpp").write("")
+    root.mkdir("docs").mkdir("api").mkdir("v1").join("x.h").write("")
+    root.join("docs").join("y.h").write("")
+
+    assert relative_files(root) == [
+        "keep.gen.cpp",
+        "ok.cpp",
+        os.path.join("sub", "b.gen.cpp"),
+        os.path.join("sub", "top.cpp"),
+    ]
+
+
+def test_gitignore_parent(repo):
+    """Ensure that `.gitignore` files above the directory are applied."""
+    repo.join(".gitignore").write("*.gen.cpp\n")
+    src = repo.mkdir("src")
+    src.join("a.gen.cpp").write("")
+    src.join("b.cpp").write("")
+    assert relative_files(src) == ["b.cpp"]
+
+    # Outside a repository, only the directory's own files apply.
+    repo.join(".git").move(repo.join("not-git"))
+    assert relative_files(src) == ["a.gen.cpp", "b.cpp"]
+
+
+def test_gitignore_unreadable(tmpdir):
+    """Ensure that a `.gitignore` file which can't be read is skipped."""
+    root = tmpdir.mkdir("root")
+    root.join(".gitignore").write_binary(b"\xff*.cpp\n")
+    root.join("foo.cpp").write("")
+    assert relative_files(root) == ["foo.cpp"]
+
+
+@pytest.mark.parametrize("line, path, is_dir, expected", [
+    ("foo", "/r/foo", False, True),
+    ("foo", "/r/a/foo", True, True),
+    ("foo", "/other/foo", False, False),
+    ("foo/", "/r/foo", False, False),
+    ("foo/", "/r/foo", True, True),
+    ("a/foo", "/r/a/foo", False, True),
+    ("a/foo", "/r/b/a/foo", False, False),
+    ("**/foo", "/r/b/a/foo", False, True),
+    ("a/**", "/r/a/b/c", False, True),
+    ("f?o", "/r/fao", False, True),
+    ("f?o", "/r/a/o", False, False),
+    ("f[!a]o", "/r/fao", False, False),
+    ("f[!a]o", "/r/fbo", False, True),
+    ("f[a", "/r/f[a", False, True),
+    ("!foo", "/r/foo", False, True),
+])
+def test_ignore_rule(line, path, is_dir, expected):
+    """Ensure that we match paths against `.gitignore` patterns."""
+    rule = _IgnoreRule("/r", line)
+    assert rule.matches(path, is_dir) == expected
+    assert rule.negated == line.startswith("!")
+
+
+class Chunks:
+    """A binary file which is read in fixed chunks, like a pipe.
+
+    :ivar list chunks: The chunks which haven't been read.
+    """
+
+    def __init__(self, chunks):
+        """Make a file which returns each of some chunks in turn."""
+        self.chunks = list(chunks)
+
+    def read1(self, size):
+        """Read the next chunk, or an empty string at the end."""
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+@pytest.mark.parametrize("chunks, expected", [
+    ([], []),
+    ([b"foo.cpp\nbar.cpp\n"], ["foo.cpp", "bar.cpp"]),
+    ([b"foo.cpp\r\n\nbar.cpp"], ["foo.cpp", "bar.cpp"]),
+    ([b"fo", b"o.cpp\nb", b"ar.cpp\n"], ["foo.cpp", "bar.cpp"]),
+    ([b"foo bar.cpp\0new\nline.cpp\0"], ["foo bar.cpp", "new\nline.cpp"]),
+    ([b"foo.c", b"pp\0bar.cpp"], ["foo.cpp", "bar.cpp"]),
+    ([b"foo.cpp"], ["foo.cpp"]),
+    ([b"caf\xe9.cpp\n"], ["caf\udce9.cpp"]),
+])
+def test_iter_file_list(chunks, expected):
+    """Ensure that we read lists of files separated by newlines or NULs."""
+    assert list(iter_file_list(Chunks(chunks))) == expected
+
+
+def test_iter_file_list_lazy():
+    """Ensure that we yield each path as soon as it's read."""
+    f = Chunks([b"foo.cpp\nbar", b".cpp\n"])
+    paths = iter_file_list(f)
+    assert next(paths) == "foo.cpp"
+    assert f.chunks == [b".cpp\n"]
@@ -0,0 +1,186 @@
+"""Test running many linting functions in a single pass."""
+import glob
+import os.path
+
+import pytest
+
+from lint381.c import linter as c_linter
+from lint381.cpp import linter as cpp_linter
+from lint381.linter import Error, Linter, SourceCode
+from lint381.matcher import match_regex, match_type, with_matched_tokens
+from lint381.matcher.dispatch import Dispatcher
+from lint381.tokenizer import tokenize
+
+
+def _integ_source_files():
+    """Get the source files of the integration tests, with their linters.
+
+    :returns list: Pairs of linter and filename.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    files = []
+    for language, linter in [("c", c_linter), ("cpp", cpp_linter)]:
+        pattern = os.path.join(script_dir, "integ", language, "*")
+        files.extend((linter, i) for i in sorted(glob.glob(pattern))
+                     if not i.endswith(".out"))
+    return files
+
+
+@pytest.mark.parametrize("linter, filename", _integ_source_files())
+def test_dispatch_matches_each_function(linter, filename):
+    """Ensure that we find the same errors as calling each function."""
+    with open(filename) as f:
+        code = f.read()
+    source = SourceCode(filename=os.path.basename(filename),
+                        tokens=tokenize(code))
+
+    expected = [error._replace(rule=func.__name__)
+                for func in linter.linters for error in func(source)]
+    assert Dispatcher(linter.linters).lint(source) == expected
+
+
+def test_dispatch():
+    """Ensure that we offer each kind of start condition the right tokens."""
+    def start(token):
+        return token.value == "c"
+
+    @with_matched_tokens(start=start)
+    def custom(source, *, match):
+        yield "custom {}".format(match[0].value)
+
+    @with_matched_tokens(start=match_type("number"))
+    def number(source, *, match):
+        yield "number {}".format(match[0].value)
+
+    @with_matched_tokens(sequence=["a", "b"], lookahead=1)
+    def sequence(source, *, match):
+        yield "sequence {}".format(" ".join(i.value for i in match))
+
+    @with_matched_tokens(sequence=["a", "b", "c"])
+    def longer_sequence(source, *, match):
+        yield "longer sequence"
+
+    def whole_file(source):
+        yield "whole file"
+
+    dispatcher = Dispatcher([whole_file,
+                             sequence,
+                             number,
+                             longer_sequence,
+                             custom])
+    tokens = tokenize("a b c 1 a b")
+    for source_tokens in [tokens, list(tokens)]:
+        source = SourceCode(filename="foo.cpp", tokens=source_tokens)
+        assert dispatcher.lint(source) == [
+            "whole file",
+            "sequence a b c",
+            "number 1",
+            "longer sequence",
+            "custom c",
+        ]
+
+
+def test_linter_rebuilds_dispatcher():
+    """Ensure that we dispatch to functions registered after linting."""
+    linter = Linter()
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^foo$"))
+    def foo(source, *, match):
+        yield "foo"
+
+    assert linter.lint("foo.cpp", "foo bar") == ["foo"]
+    dispatcher = linter.dispatcher
+    assert linter.dispatcher is dispatcher
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^bar$"))
+    def bar(source, *, match):
+        yield "bar"
+
+    assert linter.lint("foo.cpp", "foo bar") == ["foo", "bar"]
+    assert linter.dispatcher is not dispatcher
+
+
+@pytest.mark.parametrize("max_errors, expected", [
+    (1, ["number 1"]),
+    (2, ["number 1", "number 2"]),
+    (3, ["number 1", "number 2", "number 3"]),
+    (4, ["number 1", "number 2", "number 3", "whole file 0"]),
+    (10, ["number 1", "number 2", "number 3", "whole file 0",
+          "whole file 1"]),
+])
+def test_max_errors(max_errors, expected):
+    """Ensure that we stop linting once enough errors are found."""
+    matched = []
+    pulled = []
+
+    @with_matched_tokens(start=match_type("number"))
+    def number(source, *, match):
+        matched.append(match[0].value)
+        yield "number {}".format(match[0].value)
+
+    def whole_file(source):
+        for i in range(2):
+            pulled.append(i)
+            yield "whole file {}".format(i)
+
+    linter = Linter()
+    linter.register(number)
+    linter.register(whole_file)
+    errors = linter.lint("foo.c", "1 2 3", max_errors=max_errors)
+    assert errors == expected
+    assert len(matched) == min(max_errors, 3)
+    assert len(pulled) == max(min(max_errors - 3, 2), 0)
+
+
+@pytest.mark.parametrize("linter, filename", _integ_source_files())
+def test_iter_lint(linter, filename):
+    """Ensure that we yield the same errors as `lint`, in token order."""
+    with open(filename) as f:
+        code = f.read()
+    expected = linter.lint("foo.cpp", code)
+    expected.sort(key=lambda error: error.tokens[0].start)
+    assert list(linter.iter_lint("foo.cpp", code)) == expected
+
+
+def test_iter_lint_lazy():
+    """Ensure that we only lint as far as the errors are consumed."""
+    scanned = []
+    pulled = []
+
+    @with_matched_tokens(start=match_type("number"))
+    def number(source, *, match):
+        scanned.append(match[0].value)
+        yield Error(message="number", tokens=match)
+
+    def whole_file(source):
+        for i in [1, 3]:
+            pulled.append(i)
+            yield Error(message="whole file", tokens=[source.tokens[i]])
+
+    linter = Linter()
+    linter.register(number)
+    linter.register(whole_file)
+
+    # The errors on the same token are in the order of the functions.
+    errors = linter.iter_lint("foo.c", "1 2\n3\n4\n5")
+    assert [(i.message, i.tokens[0].value) for i in errors] == [
+        ("number", "1"),
+        ("number", "2"),
+        ("whole file", "2"),
+        ("number", "3"),
+        ("number", "4"),
+        ("whole file", "4"),
+        ("number", "5"),
+    ]
+
+    scanned.clear()
+    pulled.clear()
+    errors = linter.iter_lint("foo.c", "1 2\n3\n4\n5")
+    assert next(errors).tokens[0].value == "1"
+    assert scanned == ["1", "2"]
+    assert pulled == [1]
+
+    with pytest.raises(ValueError):
+        linter.iter_lint("foo.c", "/* ")
@@ -1,5 +1,14 @@
 """Test the linter tools."""
-from lint381.linter import Linter, SourceCode
+import pytest
+
+from lint381 import get_linter
+from lint381.c import linter as c_linter
+from lint381.cpp import linter as cpp_linter
+from lint381.linter import analysis, Error, Linter, SourceCode
+from lint381.matcher import match_regex, with_matched_tokens
+from lint381.matcher.include import with_includes
+from lint381.profiling import AnalysisStats, Profile
+from lint381.tokenizer import iter_tokens, tokenize
 
 
 def test_linter():
@@ -25,6 +34,41 @@ def test_linter():
     ]
 
 
+def test_select():
+    """Ensure that deselected linting functions are left out entirely."""
+    names = [i.__name__ for i in c_linter.linters]
+    linter = c_linter.select(ignore=["user_includes_before_system_includes",
+                                     "module_header_not_first"])
+    assert [i.__name__ for i in linter.linters] == [
+        i for i in names if "include" not in i and "module" not in i
+    ]
+
+    # Only the deselected functions ask for the includes, so they're never
+    # found.
+    profile = Profile()
+    linter.lint("foo.c", '#include "foo.h"\n#include <stdio.h>\nint x;\n',
+                profile=profile)
+    assert profile.analyses.misses["includes"] == 0
+
+    linter = c_linter.select(select=["cast_malloc", "sizeof_char"],
+                             ignore=["sizeof_char"])
+    assert [i.__name__ for i in linter.linters] == ["cast_malloc"]
+    assert c_linter.select().linters == c_linter.linters
+
+    with pytest.raises(ValueError) as e:
+        c_linter.select(select=["remove_comments", "foo"])
+    assert str(e.value) == "Unknown check(s): foo, remove_comments"
+
+
+def test_get_selected_linter():
+    """Ensure that linters for a selection of checks are reused."""
+    linter = get_linter("cpp", ignore=["unused_using"])
+    assert linter is get_linter("cpp", ignore=("unused_using",) * 2)
+    assert linter is not get_linter("cpp")
+    assert len(linter.linters) == len(cpp_linter.linters) - 1
+    assert get_linter("cpp", select=[]).linters == []
+
+
 def test_is_header_file():
     """Ensure that we can distinguish header from source files."""
     source = SourceCode(filename="foo.cpp", tokens=[])
@@ -32,3 +76,269 @@ def test_is_header_file():
 
     source = SourceCode(filename="foo.h", tokens=[])
     assert source.is_header_file
+
+
+def test_source_code_indexes():
+    """Ensure that we can look up tokens by value and by row."""
+    source = SourceCode(filename="foo.cpp",
+                        tokens=tokenize("a b a\n\nc /* x\ny */ a\n"))
+    assert source.indices_of(["a"]) == [0, 2, 5]
+    assert source.indices_of(["c", "b", "d"]) == [1, 3]
+    assert source.indices_of([]) == []
+    assert source.value_index is source.value_index
+
+    assert [i.value for i in source.tokens_on_row(0)] == ["a", "b", "a"]
+    assert [i.value for i in source.tokens_on_row(1)] == []
+    assert [i.value for i in source.tokens_on_row(2)] == ["c", "/* x\ny */"]
+    assert [i.value for i in source.tokens_on_row(3)] == ["a"]
+    assert source.row_index is source.row_index
+
+    # Matchers which look at more than values can't use the index.
+    source = SourceCode(filename="foo.cpp", tokens=list(source.tokens))
+    assert source.candidates(match_regex("a")) is None
+
+
+def test_analyze():
+    """Ensure that analyses are computed once per file and counted."""
+    calls = []
+
+    @analysis("test_analysis")
+    def test_analysis(source):
+        calls.append(source.filename)
+        return len(source.tokens)
+
+    stats = AnalysisStats()
+    assert stats.hit_rate() is None
+
+    foo = SourceCode(filename="foo.c", tokens=tokenize("a b"),
+                     analysis_stats=stats)
+    bar = SourceCode(filename="bar.c", tokens=tokenize("a"),
+                     analysis_stats=stats)
+    assert foo.analyze("test_analysis") == 2
+    assert foo.analyze("test_analysis") == 2
+    assert bar.analyze("test_analysis") == 1
+    assert calls == ["foo.c", "bar.c"]
+
+    assert stats.hits == {"test_analysis": 1}
+    assert stats.misses == {"test_analysis": 2}
+    assert stats.hit_rate("test_analysis") == 1 / 3
+    assert stats.hit_rate("value_index") is None
+
+    foo.value_index
+    foo.value_index
+    assert stats.hit_rate() == 2 / 5
+
+    with pytest.raises(KeyError):
+        foo.analyze("nonexistent")
+
+    # Without counters, nothing is counted.
+    baz = SourceCode(filename="baz.c", tokens=tokenize("a"))
+    assert baz.analyze("test_analysis") == 1
+    assert baz.analyze("test_analysis") == 1
+    assert stats.hit_rate() == 2 / 5
+
+
+def test_includes_shared():
+    """Ensure that includes are found once and shared between functions."""
+    linter = Linter()
+    seen = []
+
+    for _ in range(2):
+        @linter.register
+        @with_includes
+        def find(source, *, includes):
+            seen.append(includes)
+            return []
+
+    profile = Profile()
+    linter.lint("foo.c", '#include <stdio.h>\n#include "foo.h"\n',
+                profile=profile)
+    assert seen[0] is seen[1]
+    assert [i.include_file for i in seen[0]] == ["stdio.h", "foo.h"]
+    assert profile.analyses.misses["includes"] == 1
+    assert profile.analyses.hits["includes"] == 1
+
+    # Each run is counted separately.
+    profile = Profile()
+    list(linter.iter_lint("foo.c", '#include <stdio.h>\n', profile=profile))
+    assert profile.analyses.misses["includes"] == 1
+    assert profile.analyses.hits["includes"] == 1
+
+
+def test_lint_stream():
+    """Ensure that we lint a stream of tokens using only a window."""
+    linter = Linter()
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^foo$"), lookahead=1)
+    def foo(source, *, match):
+        assert source.tokens is None
+        yield [i.value for i in match]
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^bar$"),
+                         end=match_regex("^baz$"),
+                         length=2)
+    def bar(source, *, match):
+        yield [i.value for i in match]
+
+    code = "foo bar baz foo"
+    assert list(linter.lint_stream("code.cpp", iter_tokens(code))) == [
+        ["foo", "bar"],
+        ["bar", "baz"],
+    ]
+
+
+def test_lint_stream_whole_file():
+    """Ensure that we collect the tokens if a function needs all of them."""
+    linter = Linter()
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^foo$"), local=False)
+    def foo(source, *, match):
+        yield len(source.tokens)
+
+    @linter.register
+    def bar(source):
+        yield "bar"
+
+    code = "foo bar foo"
+    assert list(linter.lint_stream("code.cpp", iter_tokens(code))) == [
+        3,
+        3,
+        "bar",
+    ]
+
+
+def _error_locations(errors):
+    """Get the messages and token offsets of errors, to compare them.
+
+    :param list errors: The errors.
+    :returns list: The messages and offsets.
+    """
+    return [(i.message, [(j.start_offset, j.end_offset) for j in i.tokens])
+            for i in errors]
+
+
+_RELINT_CODE = """\
+#include <stdio.h>
+#define _foo 1
+struct bar { int x; };
+enum baz { a, B };
+int main() {
+    if (p == NULL) {
+        unsigned x = sizeof(char);
+    }
+    while (1) {}
+    catch (Foo e) {}
+    using std::string;
+    float y = (int*) malloc(4);
+}
+"""
+
+
+@pytest.mark.parametrize("linter", [c_linter, cpp_linter])
+@pytest.mark.parametrize("start, end, text", [
+    (0, 0, "// "),
+    (27, 31, "FOO"),
+    (27, 27, "x\n#define "),
+    (41, 44, "Bar"),
+    (62, 65, "Baz_e"),
+    (96, 96, "/* x */"),
+    (138, 142, "int"),
+    (162, 163, "0"),
+    (179, 179, "const "),
+    (183, 183, "&"),
+    (204, 210, "vector"),
+    (226, 232, ""),
+    (233, 239, "calloc"),
+    (len(_RELINT_CODE), len(_RELINT_CODE), "unsigned"),
+])
+def test_relint(linter, start, end, text):
+    """Ensure that re-linting after an edit agrees with linting."""
+    state = linter.lint_state("foo.c", _RELINT_CODE)
+    assert (_error_locations(state.errors) ==
+            _error_locations(linter.lint("foo.c", _RELINT_CODE)))
+
+    new_code = _RELINT_CODE[:start] + text + _RELINT_CODE[end:]
+    state = linter.relint(state, start, end, text)
+    assert (_error_locations(state.errors) ==
+            _error_locations(linter.lint("foo.c", new_code)))
+
+
+def test_relint_reuses_errors():
+    """Ensure that we only re-run linting functions around an edit."""
+    linter = Linter()
+    matches = []
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^foo$"), lookahead=1)
+    def foo(source, *, match):
+        matches.append(match[0].start_offset)
+        yield Error(message="foo", tokens=match)
+
+    @linter.register
+    def bar(source):
+        yield "bar"
+
+    state = linter.lint_state("code.cpp", "foo x foo x foo x foo y")
+    assert matches == [0, 6, 12, 18]
+
+    del matches[:]
+    state = linter.relint(state, 12, 12, "foo ")
+    assert matches == [6, 12]
+    assert _error_locations(state.errors[:-1]) == [
+        ("foo", [(0, 3), (4, 5)]),
+        ("foo", [(6, 9), (10, 11)]),
+        ("foo", [(12, 15), (16, 19)]),
+        ("foo", [(22, 25), (26, 27)]),
+    ]
+    assert state.errors[-1] == "bar"
+
+
+def test_lint_range():
+    """Ensure that we only report errors in the range."""
+    linter = Linter()
+    matches = []
+
+    @linter.register
+    @with_matched_tokens(start=match_regex("^foo$"))
+    def foo(source, *, match):
+        matches.append(match[0].start_offset)
+        yield Error(message="foo", tokens=match)
+
+    @linter.register
+    def bar(source):
+        yield Error(message="bar", tokens=[])
+        yield Error(message="bar", tokens=source.tokens[:1])
+
+    errors = linter.lint_range("code.cpp", "foo foo x foo", 5, 9)
+    assert matches == [4]
+    assert _error_locations(errors) == [
+        ("foo", [(4, 7)]),
+        ("bar", []),
+    ]
+
+
+@pytest.mark.parametrize("mode", ["lint", "iter_lint", "lint_stream",
+                                  "lint_range", "relint"])
+def test_error_rule(mode):
+    """Ensure that errors record the linting function which found them."""
+    code = "unsigned x;\n#define FOO 1\n"
+    if mode == "lint":
+        errors = cpp_linter.lint("foo.cpp", code)
+    elif mode == "iter_lint":
+        errors = list(cpp_linter.iter_lint("foo.cpp", code))
+    elif mode == "lint_stream":
+        errors = list(cpp_linter.lint_stream("foo.cpp",
+                                             iter_tokens(code.encode())))
+    elif mode == "lint_range":
+        errors = cpp_linter.lint_range("foo.cpp", code, 0, len(code))
+    else:
+        state = cpp_linter.lint_state("foo.cpp", "")
+        state = cpp_linter.relint(state, 0, 0, code)
+        errors = [error for results in state.results
+                  for _, match_errors in results for error in match_errors]
+    assert sorted(i.rule for i in errors) == ["prohibited_types",
+                                              "use_const_not_define"]
+    assert Error(message="foo", tokens=[]).rule is None
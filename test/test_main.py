@@ -1,10 +1,15 @@
 """Test the main executable by running it on actual source files."""
+import json
 import os.path
 
+import click
 from click.testing import CliRunner
 import pytest
 
-from lint381.__main__ import main
+from conftest import git
+from lint381.__main__ import _lint_file_eagerly, _lint_source, main
+from lint381.cpp import linter as cpp_linter
+from lint381.tokenizer import LineTable
 
 
 def source_code_files(language):
@@ -34,10 +39,11 @@ def source_code_files(language):
 
 @pytest.mark.parametrize("language, input, output",
                          source_code_files("c") + source_code_files("cpp"))
-def test_integ(language, input, output):
+@pytest.mark.parametrize("options", [[], ["--mmap"]])
+def test_integ(language, input, output, options):
     """Run integration tests."""
     runner = CliRunner()
-    result = runner.invoke(main, ["--lang", language, input])
+    result = runner.invoke(main, ["--lang", language, input] + options)
     with open(output) as f:
         expected_output = f.read()
         assert result.output == expected_output
@@ -45,3 +51,922 @@ def test_integ(language, input, output):
             assert result.exit_code != 0
         else:
             assert result.exit_code == 0
+
+
+def test_stdin():
+    """Ensure that we can lint code from standard input."""
+    runner = CliRunner()
+    result = runner.invoke(main, ["-"], input="unsigned x;\n")
+    assert result.output == """\
+<stdin>:1:1: error: Prohibited type 'unsigned'
+unsigned x;
+^^^^^^^^
+"""
+    assert result.exit_code == 1
+
+
+def test_mmap_empty_file(tmpdir):
+    """Ensure that we can memory-map empty files."""
+    path = tmpdir.join("empty.cpp")
+    path.write("")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--mmap", str(path)])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+
+def test_tabs(tmpdir):
+    """Ensure that we lint files with tabs and line up the underlines."""
+    path = tmpdir.join("tabs.cpp")
+    path.write("int\tx;\n\tunsigned\ty;\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--tab-width", "8", str(path)])
+    assert result.output == """\
+tabs.cpp:2:9: error: Prohibited type 'unsigned'
+        unsigned        y;
+        ^^^^^^^^
+"""
+    assert result.exit_code == 1
+
+
+def test_range(tmpdir):
+    """Ensure that we only report errors in the range."""
+    path = tmpdir.join("range.cpp")
+    path.write("unsigned x;\nfloat y;\nunsigned z;\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--range", "12:17", str(path)])
+    assert result.output == """\
+range.cpp:2:1: error: Prohibited type 'float'
+float y;
+^^^^^
+"""
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--mmap", "--range", "9:10", str(path)])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("value", ["12", "a:b", "17:12"])
+def test_range_invalid(tmpdir, value):
+    """Ensure that we reject invalid ranges."""
+    path = tmpdir.join("range.cpp")
+    path.write("")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--range", value, str(path)])
+    assert "START:END" in result.output
+    assert result.exit_code == 2
+
+
+@pytest.mark.parametrize("jobs", ["1", "3"])
+def test_jobs(tmpdir, jobs):
+    """Ensure that linting in parallel keeps the output in file order."""
+    paths = []
+    for i, code in enumerate(["unsigned a;\n",
+                              "float b;\n" * 50,
+                              "x = @;\n",
+                              "int c;\n",
+                              "unsigned d;\n" * 10]):
+        path = tmpdir.join("{}.cpp".format(i))
+        path.write(code)
+        paths.append(str(path))
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["--jobs", jobs] + paths + ["-"],
+                           input="float e;\n")
+    expected = runner.invoke(main, ["--jobs", "1", "--mmap"] + paths + ["-"],
+                             input="float e;\n")
+    assert result.output == expected.output
+    assert result.exit_code == expected.exit_code == 1
+
+    lines = result.output.splitlines()
+    assert lines[0] == "0.cpp:1:1: error: Prohibited type 'unsigned'"
+    assert lines[3] == "1.cpp:1:1: error: Prohibited type 'float'"
+    assert ("2.cpp: error: Couldn't parse token at line 1, column 5"
+            in lines)
+    assert lines[-3] == "<stdin>:1:1: error: Prohibited type 'float'"
+    assert len(lines) == 3 * (1 + 50 + 10 + 1) + 1
+
+
+def test_unparseable_file(tmpdir):
+    """Ensure that a file which can't be tokenized is reported."""
+    path = tmpdir.join("bad.cpp")
+    path.write("int x; /* abc\n")
+    runner = CliRunner()
+    result = runner.invoke(main, [str(path)])
+    assert result.output == ("bad.cpp: error: Unterminated multiline comment "
+                             "at line 1, column 8\n")
+    assert result.exit_code == 1
+
+
+def test_cache(tmpdir, cache_dir, monkeypatch):
+    """Ensure that unchanged files are answered from the cache."""
+    paths = []
+    for name in ["foo.cpp", "bar.cpp"]:
+        path = tmpdir.join(name)
+        path.write("unsigned x;\n")
+        paths.append(str(path))
+    bad = tmpdir.join("bad.cpp")
+    bad.write("x = @;\n")
+    paths.append(str(bad))
+
+    runner = CliRunner()
+    expected = runner.invoke(main, ["--jobs", "1"] + paths)
+    assert len(cache_dir.listdir("*.json")) == 3
+
+    def fail(*args, **kwargs):
+        raise AssertionError("file was linted")
+
+    monkeypatch.setattr(cpp_linter, "iter_lint", fail)
+    result = runner.invoke(main, ["--jobs", "1"] + paths)
+    assert result.output == expected.output
+    assert result.exit_code == expected.exit_code == 1
+
+    # Changing a file means that it's linted again.
+    tmpdir.join("bar.cpp").write("float x;\n")
+    result = runner.invoke(main, ["--jobs", "1"] + paths)
+    assert isinstance(result.exception, AssertionError)
+
+    monkeypatch.undo()
+    result = runner.invoke(main, ["--no-cache", "--jobs", "1"] + paths)
+    assert "Prohibited type 'float'" in result.output
+    assert len(cache_dir.listdir("*.json")) == 3
+
+
+@pytest.mark.parametrize("options", [
+    [],
+    ["--jobs", "2"],
+    ["--mmap"],
+    ["--range", "0:5"],
+])
+def test_profile(tmpdir, options):
+    """Ensure that we print the time spent in each stage."""
+    paths = []
+    for name in ["foo.cpp", "bar.cpp"]:
+        path = tmpdir.join(name)
+        path.write("unsigned x;\n")
+        paths.append(str(path))
+
+    output = str(tmpdir.join("lint.prof"))
+    runner = CliRunner()
+    result = runner.invoke(main, ["--profile", "--profile-output", output] +
+                           options + paths + paths)
+    lines = result.output.splitlines()
+    assert lines[:3] == [
+        "foo.cpp:1:1: error: Prohibited type 'unsigned'",
+        "unsigned x;",
+        "^^^^^^^^",
+    ]
+    assert lines[12].split()[:2] == ["stage", "calls"]
+    end = lines.index("") if "" in lines else len(lines)
+    stages = {i.split()[0]: int(i.split()[1]) for i in lines[13:end]}
+    assert stages["render"] == 4
+    analyses = {i.split()[0]: i.split()[1:3] for i in lines[end + 2:]}
+
+    # The second time each file is linted, it's found in the cache, except
+    # with --range. In parallel, it may be linted again before it's cached.
+    if options == []:
+        assert stages["read"] == 4
+        assert stages["tokenize"] == 2
+        assert stages["rule:prohibited_types"] == 2
+        assert stages["cache"] == 6
+        # Both files were linted in the same run, and each found its
+        # includes once.
+        assert analyses["includes"] == ["2", "2"]
+    elif options == ["--jobs", "2"]:
+        assert stages["read"] == 4
+        assert 2 <= stages["tokenize"] <= 4
+        assert analyses["includes"][1] == str(stages["tokenize"])
+    elif options == ["--mmap"]:
+        assert stages["lint"] == 2
+    else:
+        assert stages["lint"] == 4
+
+    assert os.path.exists(output)
+
+
+def test_profile_without_output(tmpdir):
+    """Ensure that we can print the timings without writing them out."""
+    path = tmpdir.join("foo.cpp")
+    path.write("int x;\n")
+    result = CliRunner().invoke(main, ["--profile", str(path)])
+    assert result.output.startswith("stage ")
+    assert result.exit_code == 0
+
+
+def test_select(tmpdir):
+    """Ensure that we only run the selected checks."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\n#define FOO 1\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--select", "use_const_not_define",
+                                  str(path)])
+    assert result.output.startswith("foo.cpp:2:1: error: Use 'const'")
+    assert "Prohibited" not in result.output
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--ignore", "prohibited_types,"
+                                  "use_const_not_define", str(path)])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+    result = runner.invoke(main, ["--select", "foo", str(path)])
+    assert "Unknown check(s): foo" in result.output
+    assert result.exit_code == 2
+
+
+def test_config(tmpdir, monkeypatch):
+    """Ensure that we read the defaults of options from a config file."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\n#define FOO 1\n")
+    tmpdir.join("setup.cfg").write("""\
+[lint381]
+lang = c
+ignore = prohibited_types
+""")
+    monkeypatch.chdir(tmpdir)
+    runner = CliRunner()
+    result = runner.invoke(main, [str(path)])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+    # Options on the command-line take precedence.
+    result = runner.invoke(main, ["--ignore", "", str(path)])
+    assert "Prohibited type 'unsigned'" in result.output
+    assert result.exit_code == 1
+
+    other = tmpdir.join("other.cfg")
+    other.write("[lint381]\nselect = use_const_not_define\n")
+    result = runner.invoke(main, ["--config", str(other), str(path)])
+    assert result.output.startswith("foo.cpp:2:1: error: Use 'const'")
+
+    other.write("[lint381\n")
+    result = runner.invoke(main, ["--config", str(other), str(path)])
+    assert "Couldn't read" in result.output
+    assert result.exit_code == 2
+
+    # Only a file passed with `--config` has to parse.
+    tmpdir.join("setup.cfg").write("[lint381\n")
+    result = runner.invoke(main, [str(path)])
+    assert "Prohibited type 'unsigned'" in result.output
+    assert result.exit_code == 1
+
+
+def test_cache_key_content(tmpdir, monkeypatch):
+    """Ensure that files are only encoded for the cache key with a cache."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\n")
+    contents = []
+
+    def record(lint, content, *args, **kwargs):
+        contents.append(content)
+        return _lint_source(lint, content, *args, **kwargs)
+
+    monkeypatch.setattr("lint381.__main__._lint_source", record)
+    runner = CliRunner()
+    runner.invoke(main, ["--jobs", "1", "--no-cache", str(path)])
+    runner.invoke(main, ["--jobs", "1", str(path)])
+    assert contents == [None, b"unsigned x;\n"]
+
+
+@pytest.mark.parametrize("options", [
+    ["--jobs", "1"],
+    ["--jobs", "2"],
+    ["--jobs", "1", "--mmap"],
+    ["--jobs", "1", "--range", "0:100"],
+])
+def test_max_errors(tmpdir, cache_dir, options):
+    """Ensure that we stop once enough errors have been reported."""
+    paths = []
+    for name, code in [("a.cpp", "unsigned x;\nfloat y;\n"),
+                       ("b.cpp", "int x;\n"),
+                       ("c.cpp", "unsigned z;\n"),
+                       ("d.cpp", "unsigned z;\n")]:
+        path = tmpdir.join(name)
+        path.write(code)
+        paths.append(str(path))
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["--max-errors", "3"] + options + paths)
+    assert [i for i in result.output.splitlines() if "error" in i] == [
+        "a.cpp:1:1: error: Prohibited type 'unsigned'",
+        "a.cpp:2:1: error: Prohibited type 'float'",
+        "c.cpp:1:1: error: Prohibited type 'unsigned'",
+    ]
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--fail-fast"] + options + paths)
+    assert result.output.splitlines() == [
+        "a.cpp:1:1: error: Prohibited type 'unsigned'",
+        "unsigned x;",
+        "^^^^^^^^",
+    ]
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--max-errors", "10"] + options + paths)
+    assert result.output.count("error:") == 4
+
+    result = runner.invoke(main, ["--fail-fast"] + options + paths[1:2])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("options", [[], ["--mmap"], ["--jobs", "2"]])
+def test_max_errors_order(tmpdir, options):
+    """Ensure that we report the first errors in the file, by position."""
+    path = tmpdir.join("foo.c")
+    path.write('#include <stdio.h>\n#include "foo.h"\nint x;\n'
+               '#define bad 1\n')
+    result = CliRunner().invoke(main, ["--no-cache", "--max-errors", "1"] +
+                                options + [str(path)])
+    assert errors_of(result.output) == [
+        "foo.c:2:10: error: User include 'foo.h' should be before system "
+        "includes",
+    ]
+
+
+def test_fail_fast_stops_linting(tmpdir, cache_dir, monkeypatch):
+    """Ensure that we don't lint any more files once we fail."""
+    paths = []
+    for name in ["a.cpp", "b.cpp", "c.cpp"]:
+        path = tmpdir.join(name)
+        path.write("unsigned x;\nfloat y;\n")
+        paths.append(str(path))
+
+    linted = []
+    iter_lint = cpp_linter.iter_lint
+
+    def record(filename, code, **kwargs):
+        for error in iter_lint(filename, code, **kwargs):
+            linted.append((filename, error.message))
+            yield error
+
+    monkeypatch.setattr(cpp_linter, "iter_lint", record)
+    runner = CliRunner()
+    result = runner.invoke(main, ["--jobs", "1", "--fail-fast"] + paths)
+    assert result.output.count("error:") == 1
+    assert linted == [("a.cpp", "Prohibited type 'unsigned'")]
+
+    # Only complete results are cached.
+    assert not cache_dir.check()
+    result = runner.invoke(main, ["--jobs", "1"] + paths)
+    assert result.output.count("error:") == 6
+    assert len(cache_dir.listdir("*.json")) == 3
+
+
+def test_lint_file_eagerly(tmpdir):
+    """Ensure that worker processes return the whole output of a file."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\nfloat y;\n")
+    output, profile = _lint_file_eagerly(str(path), None, None,
+                                         lang="cpp",
+                                         select=None,
+                                         ignore=None,
+                                         stdin_filename=None,
+                                         use_mmap=False,
+                                         tab_width=4,
+                                         output_format="text",
+                                         color=True,
+                                         code_range=None,
+                                         max_errors=None,
+                                         cache_dir=None,
+                                         use_profile=True)
+    assert len(output) == 2
+    assert "\x1b[" in output[0]
+    assert click.unstyle(output[0]).startswith(
+        "foo.cpp:1:1: error: Prohibited type")
+    assert profile.stats["tokenize"][0] == 1
+
+    output, _ = _lint_file_eagerly(str(path), None, [(1, 1)],
+                                   lang="cpp",
+                                   select=None,
+                                   ignore=None,
+                                   stdin_filename=None,
+                                   use_mmap=False,
+                                   tab_width=4,
+                                   output_format="text",
+                                   color=False,
+                                   code_range=None,
+                                   max_errors=1,
+                                   cache_dir=None,
+                                   use_profile=False)
+    assert len(output) == 1
+    assert "'float'" in output[0]
+
+
+def test_errors_streamed(tmpdir, monkeypatch):
+    """Ensure that each error is printed as soon as it's found."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\nfloat y;\n")
+    events = []
+
+    iter_lint = cpp_linter.iter_lint
+
+    def record(filename, code, **kwargs):
+        for error in iter_lint(filename, code, **kwargs):
+            events.append("found")
+            yield error
+
+    get_text_stream = click.get_text_stream
+
+    class Recorder:
+        """Records what's written to standard output."""
+
+        def __init__(self, stream):
+            """Wrap a text stream."""
+            self.stream = stream
+
+        def write(self, text):
+            """Record and write some text."""
+            events.append("printed")
+            self.stream.write(text)
+
+        def flush(self):
+            """Record and flush the written text."""
+            events.append("flushed")
+            self.stream.flush()
+
+        def isatty(self):
+            """Check whether the stream is a terminal."""
+            return self.stream.isatty()
+
+    monkeypatch.setattr(cpp_linter, "iter_lint", record)
+    monkeypatch.setattr(click, "get_text_stream",
+                        lambda name: Recorder(get_text_stream(name)))
+    result = CliRunner().invoke(main, ["--jobs", "1", str(path)])
+    assert result.output.count("error:") == 2
+    # The output is only flushed once per file.
+    assert events == ["found", "printed", "found", "printed", "flushed"]
+
+
+def test_diff(repo, monkeypatch):
+    """Ensure that we only report errors on lines changed since a commit."""
+    repo.join("foo.cpp").write("unsigned a;\nint b;\nfloat c;\nint d;\n")
+    repo.join("bar.cpp").write("unsigned a;\n")
+    repo.join("baz.h").write("unsigned a;\n")
+    repo.join("notes.txt").write("unsigned a;\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "Add errors")
+    repo.join("foo.cpp").write("unsigned a;\nint b;\nfloat c;\nfloat d;\n")
+    repo.join("new.cpp").write("float x;\n")
+    monkeypatch.chdir(repo)
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["--diff", "HEAD"])
+    assert [i for i in result.output.splitlines() if "error" in i] == [
+        "foo.cpp:4:1: error: Prohibited type 'float'",
+        "new.cpp:1:1: error: Prohibited type 'float'",
+    ]
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--diff", "HEAD~", "--jobs", "2"])
+    assert [i for i in result.output.splitlines() if "error" in i] == [
+        "bar.cpp:1:1: error: Prohibited type 'unsigned'",
+        "baz.h:1:1: error: Prohibited type 'unsigned'",
+        "foo.cpp:1:1: error: Prohibited type 'unsigned'",
+        "foo.cpp:3:1: error: Prohibited type 'float'",
+        "foo.cpp:4:1: error: Prohibited type 'float'",
+        "new.cpp:1:1: error: Prohibited type 'float'",
+    ]
+
+    # Files which didn't change aren't linted at all.
+    def fail(*args, **kwargs):
+        raise AssertionError("file was read")
+
+    result = runner.invoke(main, ["--diff", "HEAD", "bar.cpp", "foo.cpp"])
+    assert result.output.startswith("foo.cpp:4:1: error: Prohibited type")
+    # The size of the cache is read when it's pruned, so it isn't used here.
+    monkeypatch.setattr("builtins.open", fail)
+    result = runner.invoke(main, ["--diff", "HEAD", "--mmap", "--no-cache",
+                                  "bar.cpp"])
+    assert result.output == ""
+    assert result.exit_code == 0
+
+
+@pytest.mark.parametrize("options", [[], ["--mmap"], ["--jobs", "2"]])
+def test_diff_max_errors(repo, monkeypatch, options):
+    """Ensure that we only count the errors on changed lines."""
+    repo.join("foo.cpp").write("unsigned a;\nint b;\nint c;\n")
+    git(repo, "add", "foo.cpp")
+    git(repo, "commit", "-q", "-m", "Add errors")
+    repo.join("foo.cpp").write("unsigned a;\nint b;\nunsigned c;\n")
+    monkeypatch.chdir(repo)
+
+    result = CliRunner().invoke(main, ["--diff", "HEAD", "--max-errors", "1",
+                                       "--no-cache"] + options)
+    assert errors_of(result.output) == [
+        "foo.cpp:3:1: error: Prohibited type 'unsigned'",
+    ]
+    assert result.exit_code == 1
+
+
+def test_diff_cache(repo, cache_dir, monkeypatch):
+    """Ensure that all of a file's errors are cached, whichever we report."""
+    repo.join("foo.cpp").write("unsigned a;\nfloat b;\n")
+    git(repo, "add", "foo.cpp")
+    git(repo, "commit", "-q", "-m", "Add errors")
+    repo.join("foo.cpp").write("unsigned a;\nfloat b;\nfloat c;\n")
+    monkeypatch.chdir(repo)
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["--diff", "HEAD", "--max-errors", "5"])
+    assert result.output.count("error:") == 1
+    result = runner.invoke(main, ["--diff", "HEAD"])
+    assert result.output.count("error:") == 1
+    result = runner.invoke(main, ["foo.cpp"])
+    assert result.output.count("error:") == 3
+    assert len(cache_dir.listdir("*.json")) == 1
+
+
+@pytest.mark.parametrize("args, message", [
+    (["--diff", "nonexistent"], "Invalid value for --diff"),
+    (["--diff", "HEAD", "--range", "0:1", "foo.cpp"], "can't be used"),
+    (["--diff", "HEAD", "-"], "can't be used"),
+])
+def test_diff_invalid(repo, monkeypatch, args, message):
+    """Ensure that we reject invalid uses of --diff."""
+    monkeypatch.chdir(repo)
+    result = CliRunner().invoke(main, args)
+    assert message in result.output
+    assert result.exit_code == 2
+
+
+@pytest.fixture
+def tree(tmpdir):
+    """Make a directory of C and C++ files.
+
+    :returns py.path.local: The directory.
+    """
+    tree = tmpdir.mkdir("tree")
+    code = "unsigned x;\n#define FOO 1\n"
+    tree.join("a.c").write(code)
+    tree.join("b.cpp").write(code)
+    tree.join("c.h").write("class Foo {};\n#define FOO 1\n")
+    tree.join("notes.txt").write(code)
+    tree.mkdir("gen").join("d.cpp").write(code)
+    return tree
+
+
+def errors_of(output):
+    """Get the error messages in the output of lint381.
+
+    :param str output: The output.
+    :returns list: Each line with an error.
+    """
+    return [i for i in output.splitlines() if ": error: " in i]
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_directory(tree, jobs):
+    """Ensure that we lint directories, detecting the language of files."""
+    result = CliRunner().invoke(main, ["--jobs", jobs, str(tree)])
+    # C allows constants to be defined with `#define`.
+    assert errors_of(result.output) == [
+        "a.c:1:1: error: Prohibited type 'unsigned'",
+        "b.cpp:1:1: error: Prohibited type 'unsigned'",
+        "b.cpp:2:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+        "c.h:2:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+        "d.cpp:1:1: error: Prohibited type 'unsigned'",
+        "d.cpp:2:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+    ]
+    assert result.exit_code == 1
+
+
+@pytest.mark.parametrize("args, expected", [
+    (["--lang", "c"], ["a.c:1:1", "c.h:1:1"]),
+    (["--exclude", "gen", "--exclude", "*.c"],
+     ["b.cpp:1:1", "b.cpp:2:1", "c.h:1:1"]),
+    (["--include", "*.txt"], ["notes.txt:1:1", "notes.txt:2:1"]),
+    (["--select", "use_const_not_define"], ["b.cpp:2:1", "d.cpp:2:1"]),
+    (["--ignore", "use_const_not_define,cast_malloc"],
+     ["a.c:1:1", "b.cpp:1:1", "c.h:1:1", "d.cpp:1:1"]),
+])
+def test_directory_options(tree, args, expected):
+    """Ensure that we choose the files and checks for directories."""
+    tree.join("c.h").write("unsigned x;\n")
+    result = CliRunner().invoke(main, args + [str(tree)])
+    assert [i.split(": ")[0] for i in errors_of(result.output)] == expected
+
+    result = CliRunner().invoke(main, ["--select", "cast_malloc",
+                                       "--lang", "cpp", str(tree)])
+    assert "Unknown check(s): cast_malloc" in result.output
+    assert result.exit_code == 2
+
+
+def test_diff_directory(repo, monkeypatch):
+    """Ensure that we only lint the changed files in directories."""
+    src = repo.mkdir("src")
+    src.join("a.c").write("int x;\n")
+    src.join("b.cpp").write("int x;\n")
+    repo.join("c.c").write("int x;\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "Add files")
+    src.join("a.c").write("float x;\n#define FOO 1\n")
+    repo.join("c.c").write("float x;\n")
+    monkeypatch.chdir(repo)
+
+    runner = CliRunner()
+    result = runner.invoke(main, ["--diff", "HEAD", "src"])
+    assert errors_of(result.output) == [
+        "a.c:1:1: error: Prohibited type 'float'",
+    ]
+
+    result = runner.invoke(main, ["--diff", "HEAD", "--exclude", "src"])
+    assert errors_of(result.output) == [
+        "c.c:1:1: error: Prohibited type 'float'",
+    ]
+
+
+@pytest.mark.parametrize("options", [
+    ["--jobs", "1"],
+    ["--jobs", "2"],
+    ["--jobs", "1", "--mmap"],
+])
+def test_not_utf8(tmpdir, monkeypatch, options):
+    """Ensure that a file which isn't UTF-8 doesn't stop the other files."""
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("a.c").write_binary(b"unsigned x; // caf\xe9\n")
+    tmpdir.join("b.c").write("float y;\n")
+    result = CliRunner().invoke(main, options + ["a.c", "b.c"])
+    assert errors_of(result.output) == [
+        "a.c:1:1: error: Prohibited type 'unsigned'",
+        "b.c:1:1: error: Prohibited type 'float'",
+    ]
+    assert result.exit_code == 1
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+@pytest.mark.parametrize("separator", ["\n", "\0"])
+def test_files_from(tree, monkeypatch, jobs, separator):
+    """Ensure that we lint the files listed in a file."""
+    monkeypatch.chdir(tree)
+    tree.join("list.txt").write(separator.join(["b.cpp", "gen", "a.c"]))
+    runner = CliRunner()
+    args = ["--jobs", jobs, "--files-from"]
+    result = runner.invoke(main, args + ["list.txt", "c.h"])
+    assert [i.split(": ")[0] for i in errors_of(result.output)] == [
+        "c.h:2:1", "b.cpp:1:1", "b.cpp:2:1", "d.cpp:1:1", "d.cpp:2:1",
+        "a.c:1:1",
+    ]
+    assert result.exit_code == 1
+
+    result = runner.invoke(main, args + ["-"],
+                           input="a.c{0}missing.cpp{0}".format(separator))
+    assert errors_of(result.output) == [
+        "a.c:1:1: error: Prohibited type 'unsigned'",
+        "missing.cpp: error: Couldn't read file: No such file or directory",
+    ]
+
+    result = runner.invoke(main, args + ["-", "--mmap"], input="missing.c\n")
+    assert "missing.c: error: Couldn't read file" in result.output
+    assert result.exit_code == 1
+
+
+def test_files_from_many(tmpdir, monkeypatch):
+    """Ensure that we keep the order of more files than are queued."""
+    monkeypatch.chdir(tmpdir)
+    names = ["{}.cpp".format(i) for i in range(20)]
+    for name in names:
+        tmpdir.join(name).write("unsigned x;\n")
+    result = CliRunner().invoke(main, ["--jobs", "2", "--files-from", "-"],
+                                input="\n".join(names))
+    assert [i.split(":")[0] for i in errors_of(result.output)] == names
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_files_from_not_utf8(tmpdir, monkeypatch, jobs):
+    """Ensure that a listed file which isn't UTF-8 is still linted."""
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("a.c").write_binary(b"unsigned x; // caf\xe9\n")
+    tmpdir.join("b.c").write("float y;\n")
+    result = CliRunner().invoke(main, ["--jobs", jobs, "--files-from", "-"],
+                                input="a.c\nmissing.c\nb.c\n")
+    assert errors_of(result.output) == [
+        "a.c:1:1: error: Prohibited type 'unsigned'",
+        "missing.c: error: Couldn't read file: No such file or directory",
+        "b.c:1:1: error: Prohibited type 'float'",
+    ]
+    assert result.exit_code == 1
+
+
+@pytest.mark.parametrize("args", [
+    ["--files-from", "-", "-"],
+    ["--files-from", "-", "--stdin"],
+])
+def test_files_from_stdin(args):
+    """Ensure that standard input can't be read twice."""
+    result = CliRunner().invoke(main, args, input="foo.cpp\n")
+    assert "--files-from - can't be used" in result.output
+    assert result.exit_code == 2
+
+
+@pytest.mark.parametrize("name, message", [
+    ("missing.txt", "does not exist"),
+    (".", "is a directory"),
+])
+def test_files_from_invalid(tmpdir, monkeypatch, name, message):
+    """Ensure that the list of files must be a file."""
+    monkeypatch.chdir(tmpdir)
+    result = CliRunner().invoke(main, ["--files-from", name])
+    assert message in result.output
+    assert result.exit_code == 2
+
+
+def test_files_from_diff(repo, monkeypatch):
+    """Ensure that we only lint the changed files in a list."""
+    repo.join("foo.cpp").write("unsigned a;\n")
+    repo.join("bar.cpp").write("unsigned a;\n")
+    git(repo, "add", ".")
+    git(repo, "commit", "-q", "-m", "Add errors")
+    repo.join("foo.cpp").write("float a;\n")
+    monkeypatch.chdir(repo)
+
+    result = CliRunner().invoke(main, ["--diff", "HEAD~", "--files-from", "-"],
+                                input="bar.cpp\nfoo.cpp\n")
+    assert errors_of(result.output) == [
+        "bar.cpp:1:1: error: Prohibited type 'unsigned'",
+        "foo.cpp:1:1: error: Prohibited type 'float'",
+    ]
+
+
+CODE = "unsigned x;\n#define FOO 1\n"
+"""Code with an error in C, and another in C++."""
+
+
+@pytest.mark.parametrize("args, code, expected", [
+    (["--stdin"], CODE, [
+        "<stdin>:1:1: error: Prohibited type 'unsigned'",
+        "<stdin>:2:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+    ]),
+    (["--stdin", "--stdin-filename", "src/foo.c"], CODE, [
+        "foo.c:1:1: error: Prohibited type 'unsigned'",
+    ]),
+    (["-", "--stdin-filename", "foo.c", "--lang", "cpp"], CODE, [
+        "foo.c:1:1: error: Prohibited type 'unsigned'",
+        "foo.c:2:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+    ]),
+    (["--stdin", "--stdin-filename", "foo.h"], CODE, [
+        "foo.h:1:1: error: Prohibited type 'unsigned'",
+    ]),
+    # The language of headers is detected from the code being linted.
+    (["--stdin", "--stdin-filename", "foo.h"], "class Foo {};\n" + CODE, [
+        "foo.h:2:1: error: Prohibited type 'unsigned'",
+        "foo.h:3:1: error: Use 'const' or 'constexpr' to create constant "
+        "'FOO', not '#define'",
+    ]),
+])
+def test_stdin_filename(tmpdir, monkeypatch, args, code, expected):
+    """Ensure that we lint standard input as the file it's named after."""
+    tmpdir.join("foo.c").write("")
+    monkeypatch.chdir(tmpdir)
+    result = CliRunner().invoke(main, args, input=code)
+    assert errors_of(result.output) == expected
+
+
+@pytest.mark.parametrize("options", [
+    [],
+    ["--mmap"],
+    ["--jobs", "2"],
+    ["--tab-width", "8"],
+])
+def test_format_jsonl(tmpdir, options):
+    """Ensure that we print errors as JSON Lines."""
+    path = tmpdir.join("foo.cpp")
+    # Columns count characters, whatever the tab width.
+    path.write("int x;\n/*\xe9*/\tunsigned\ty;\n")
+    tmpdir.join("bad.cpp").write("'")
+    args = ["--format", "jsonl"] + options + [str(path),
+                                              str(tmpdir.join("bad.cpp"))]
+    runner = CliRunner()
+    for _ in range(2):
+        # The second time, the errors are found in the cache.
+        result = runner.invoke(main, args)
+        records = [json.loads(i) for i in result.output.splitlines()]
+        assert records[0] == {
+            "path": str(path),
+            "row": 2,
+            "column": 7,
+            "end_row": 2,
+            "end_column": 14,
+            "rule": "prohibited_types",
+            "message": "Prohibited type 'unsigned'",
+        }
+        assert records[1]["path"] == str(tmpdir.join("bad.cpp"))
+        assert records[1]["row"] is None
+        assert records[1]["rule"] is None
+        assert len(records) == 2
+        assert result.exit_code == 1
+
+    result = runner.invoke(main, ["--format", "jsonl", "--stdin"],
+                           input="unsigned x;\n")
+    assert json.loads(result.output)["path"] == "<stdin>"
+    result = runner.invoke(main, ["--format", "jsonl", "--stdin",
+                                  "--stdin-filename", "src/foo.cpp"],
+                           input="unsigned x;\n")
+    assert json.loads(result.output)["path"] == "src/foo.cpp"
+
+
+def test_format_sarif(tmpdir, monkeypatch):
+    """Ensure that we print errors as a SARIF log."""
+    monkeypatch.chdir(tmpdir)
+    tmpdir.join("my foo.cpp").write("unsigned x;\n#define FOO 1\n")
+    runner = CliRunner()
+    result = runner.invoke(main, ["--format", "sarif", "my foo.cpp",
+                                  "--files-from", "-"],
+                           input="missing.cpp\n")
+    log = json.loads(result.output)
+    assert log["version"] == "2.1.0"
+    assert log["runs"][0]["tool"]["driver"]["name"] == "lint381"
+    assert log["runs"][0]["columnKind"] == "unicodeCodePoints"
+    results = log["runs"][0]["results"]
+    assert [i.get("ruleId") for i in results] == [
+        "prohibited_types", "use_const_not_define", None]
+    assert results[0] == {
+        "ruleId": "prohibited_types",
+        "level": "error",
+        "message": {"text": "Prohibited type 'unsigned'"},
+        "locations": [{"physicalLocation": {
+            "artifactLocation": {"uri": "my%20foo.cpp"},
+            "region": {
+                "startLine": 1,
+                "startColumn": 1,
+                "endLine": 1,
+                "endColumn": 9,
+            },
+        }}],
+    }
+    assert results[2]["message"]["text"].startswith("Couldn't read file")
+    assert "region" not in results[2]["locations"][0]["physicalLocation"]
+    assert result.exit_code == 1
+
+    # The log is complete even if linting stops early.
+    result = runner.invoke(main, ["--format", "sarif", "--fail-fast",
+                                  "my foo.cpp"])
+    assert len(json.loads(result.output)["runs"][0]["results"]) == 1
+
+    tmpdir.join("ok.cpp").write("int x;\n")
+    result = runner.invoke(main, ["--format", "sarif", "ok.cpp"])
+    assert json.loads(result.output)["runs"][0]["results"] == []
+    assert result.exit_code == 0
+
+
+def test_color(tmpdir, monkeypatch):
+    """Ensure that we only style the output for a terminal."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\n")
+    runner = CliRunner()
+    result = runner.invoke(main, [str(path)])
+    assert "\x1b[" not in result.output
+
+    get_text_stream = click.get_text_stream
+
+    class Terminal:
+        """A text stream which is a terminal."""
+
+        def __init__(self, stream):
+            """Wrap a text stream."""
+            self.write = stream.write
+            self.flush = stream.flush
+
+        def isatty(self):
+            """Check whether the stream is a terminal."""
+            return True
+
+    monkeypatch.setattr(click, "get_text_stream",
+                        lambda name: Terminal(get_text_stream(name)))
+    result = runner.invoke(main, [str(path)])
+    assert "\x1b[" in result.output
+    assert click.unstyle(result.output).startswith(
+        "foo.cpp:1:1: error: Prohibited type 'unsigned'\nunsigned x;\n^")
+
+
+def test_render_line_table(tmpdir, monkeypatch):
+    """Ensure that we find the lines of a file once, however many errors."""
+    path = tmpdir.join("foo.cpp")
+    path.write("unsigned x;\n" * 1000)
+    line_starts = LineTable.line_starts.fget
+    calls = []
+
+    def record(self):
+        if self._line_starts is None:
+            calls.append(self)
+        return line_starts(self)
+
+    monkeypatch.setattr(LineTable, "line_starts", property(record))
+    for args in [[], ["--mmap"], ["--range", "0:100"]]:
+        result = CliRunner().invoke(main, ["--no-cache", str(path)] + args)
+        assert result.output.count("error:") in (1000, 9)
+        assert len(calls) == 1
+        calls.clear()
+
+    # Errors from the cache don't have a line table.
+    CliRunner().invoke(main, [str(path)])
+    calls.clear()
+    result = CliRunner().invoke(main, [str(path)])
+    assert result.output.count("error:") == 1000
+    assert len(calls) == 1
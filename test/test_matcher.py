@@ -1,12 +1,19 @@
 """Test the token matcher."""
 from lint381.linter import SourceCode
+import pytest
+
 from lint381.matcher import (
+    match_bracket,
     match_regex,
     match_tokens,
     match_type,
+    match_value,
+    StreamMatcher,
+    window_size,
     with_matched_tokens,
 )
-from lint381.tokenizer import Token, tokenize
+from lint381.matcher.include import find_includes
+from lint381.tokenizer import Token, tokenize, TokenSlice, TokenTable
 
 
 def test_match_regex():
@@ -41,6 +48,27 @@ foo bar
                                   end=match_regex("bar"))]
 
 
+def test_match_tokens_views(monkeypatch):
+    """Ensure that matches are views, and scanning doesn't create tokens."""
+    tokens = tokenize("foo qux bar foo bar")
+    for source in [tokens, list(tokens)]:
+        matches = list(match_tokens(source,
+                                    start=match_value("foo"),
+                                    end=match_value("bar")))
+        assert all(isinstance(i, TokenSlice) for i in matches)
+        assert [len(i) for i in matches] == [3, 2]
+
+    def fail(self, index):
+        raise AssertionError("created token {}".format(index))
+
+    monkeypatch.setattr(TokenTable, "__getitem__", fail)
+    matches = list(match_tokens(tokens,
+                                start=match_value("foo"),
+                                end=match_value("bar"),
+                                length=3))
+    assert [len(i) for i in matches] == [3]
+
+
 def test_no_matching_token():
     """Ensure that we handle cases when there is no match."""
     code = """
@@ -92,3 +120,177 @@ foo bar
     source_code = SourceCode(filename="foo.cpp",
                              tokens=tokenize(code))
     assert list(func(source_code)) == ["baz"]
+
+
+def test_match_value():
+    """Ensure that we can match exact token values."""
+    token = Token(type="identifier", value="foo", start=None, end=None)
+    assert match_value("foo")(token)
+    assert not match_value("fo")(token)
+    assert match_value("foo").value_matcher("foo")
+
+
+def test_match_sequence():
+    """Ensure that we can match exact sequences of token values."""
+    tokens = tokenize("a . size ( ) == 0 ; b . size ( ) == 1 . size")
+    matches = match_tokens(tokens,
+                           sequence=[".", "size", "(", ")", "==", "0"],
+                           lookahead=1)
+    assert [[i.value for i in match] for match in matches] == [
+        [".", "size", "(", ")", "==", "0", ";"],
+    ]
+    matches = match_tokens(tokens, sequence=[".", "size"])
+    assert len(list(matches)) == 3
+
+
+def test_match_candidates():
+    """Ensure that we only look for matches starting at the candidates."""
+    tokens = tokenize("foo bar foo bar baz foo foo bar")
+    source_code = SourceCode(filename="foo.cpp", tokens=tokens)
+    start = match_regex("^fo+$")
+    candidates = source_code.candidates(start)
+    assert candidates == [0, 2, 5, 6]
+
+    for kwargs in [dict(end=match_regex("bar")),
+                   dict(end=match_regex("bar"), length=2),
+                   dict(lookahead=1)]:
+        assert (list(match_tokens(tokens, start=start, **kwargs)) ==
+                list(match_tokens(tokens,
+                                  start=start,
+                                  candidates=candidates,
+                                  **kwargs)))
+
+    # Only some of the matches are found if we leave out candidates.
+    matches = match_tokens(tokens, start=start, candidates=[5])
+    assert [i[0].start_offset for i in matches] == [20]
+    assert source_code.candidates(match_type("identifier")) is None
+
+
+def test_match_bracket():
+    """Ensure that we can end matches at matching brackets."""
+    tokens = tokenize("""
+if (a (b) c) x; if if (d; if [(e)] y ( z
+""")
+    matches = match_tokens(tokens,
+                           start=match_regex("^if$"),
+                           end=match_bracket("("),
+                           lookahead=1)
+    assert [" ".join(i.value for i in match) for match in matches] == [
+        "if ( a ( b ) c ) x",
+        "if [ ( e ) ]",
+    ]
+
+    matches = match_tokens(tokens,
+                           start=match_regex(r"^\($"),
+                           end=match_bracket("("))
+    assert [" ".join(i.value for i in match) for match in matches] == [
+        "( a ( b ) c )",
+        "( b )",
+        "( e )",
+    ]
+
+    # There's no bracket to match.
+    matches = match_tokens(tokenize("if x"),
+                           start=match_regex("^if$"),
+                           end=match_bracket("("))
+    assert list(matches) == []
+
+    # A matching bracket at the end can't have lookahead.
+    matches = match_tokens(tokenize("(a)"),
+                           start=match_regex(r"^\($"),
+                           end=match_bracket("("),
+                           lookahead=1)
+    assert list(matches) == []
+
+    assert match_bracket("{")(Token(type="grouping",
+                                    value="}",
+                                    start=None,
+                                    end=None))
+
+
+def test_window_size():
+    """Ensure that we know which matches have a bounded size."""
+    foo = match_regex("foo")
+    assert window_size(start=foo) == 1
+    assert window_size(start=foo, lookahead=2) == 3
+    assert window_size(start=foo, end=foo, length=3, lookahead=1) == 4
+    assert window_size(start=foo, end=foo) is None
+    assert window_size(sequence=["a", "b"], lookahead=1) == 3
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(start=match_regex("foo")),
+    dict(start=match_regex("foo"), lookahead=1),
+    dict(start=match_regex("foo"), end=match_regex("bar"), length=2),
+    dict(start=match_regex("foo"),
+         end=match_regex("bar"),
+         length=3,
+         lookahead=1),
+    dict(sequence=["foo", "bar"]),
+    dict(sequence=["foo", "qux", "bar"], lookahead=1),
+    dict(sequence=["foo", "foo", "bar"]),
+])
+def test_stream_matcher(kwargs):
+    """Ensure that we find the same matches in a stream of tokens."""
+    tokens = tokenize("""
+foo foo bar foo qux bar foo bar foo
+foo
+""")
+    matcher = StreamMatcher(**kwargs)
+    matches = [matcher.feed(token) for token in tokens]
+    assert ([i for i in matches if i is not None] ==
+            list(match_tokens(tokens, **kwargs)))
+
+
+def test_stream_matcher_resume():
+    """Ensure that we know where matching can start mid-stream."""
+    tokens = tokenize("foo foo bar foo")
+    matcher = StreamMatcher(start=match_regex("foo"), lookahead=1)
+    assert matcher.can_resume_at(tokens, 0)
+    assert not matcher.can_resume_at(tokens, 1)
+    assert not matcher.can_resume_at(tokens, 2)
+    assert matcher.can_resume_at(tokens, 3)
+
+    matcher = StreamMatcher(start=match_regex("foo"),
+                            end=match_regex("bar"),
+                            length=2)
+    assert matcher.can_resume_at(tokens, 1)
+
+
+def test_stream_matcher_unbounded():
+    """Ensure that we can't stream matches of unbounded size."""
+    with pytest.raises(ValueError):
+        StreamMatcher(start=match_regex("foo"), end=match_regex("bar"))
+
+
+def test_with_matching_tokens_window():
+    """Ensure that we know how many tokens a linting function needs."""
+    @with_matched_tokens(start=match_regex("foo"), length=2,
+                         end=match_regex("bar"))
+    def bounded(source, *, match):
+        yield "baz"  # pragma: no cover
+
+    @with_matched_tokens(start=match_regex("foo"), local=False)
+    def not_local(source, *, match):
+        yield "baz"  # pragma: no cover
+
+    assert bounded.matched_tokens.window == 2
+    assert not_local.matched_tokens.window is None
+
+
+def test_find_includes():
+    """Ensure that we find includes with or without the value index."""
+    code = """
+#include "foo.h"
+#include <bar.h>
+#include <baz.h
+#include
+"""
+    tokens = tokenize(code)
+    source_code = SourceCode(filename="foo.cpp", tokens=tokens)
+    candidates = source_code.indices_of(["#include"])
+    assert candidates == [0, 2, 8, 13]
+    for includes in [find_includes(tokens),
+                     find_includes(list(tokens)),
+                     find_includes(tokens, candidates)]:
+        assert [i.include_file for i in includes] == ["foo.h", "bar.h"]
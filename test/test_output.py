@@ -0,0 +1,23 @@
+"""Test rendering linting errors."""
+from lint381 import get_linter
+from lint381.output import format_errors
+from lint381.tokenizer import LineTable
+
+
+def test_format_errors():
+    """Ensure that we render errors in order, leaving the list alone."""
+    code = "unsigned x;\nusing std::cout;\n"
+    errors = get_linter("cpp").lint("foo.cpp", code)
+    errors.reverse()
+    messages = [i.message for i in errors]
+
+    output = format_errors(errors, "foo.cpp", LineTable(code), color=False)
+    assert output == """\
+foo.cpp:1:1: error: Prohibited type 'unsigned'
+unsigned x;
+^^^^^^^^
+foo.cpp:2:12: error: Unused symbol 'cout'
+using std::cout;
+           ^^^^
+"""
+    assert [i.message for i in errors] == messages
@@ -0,0 +1,135 @@
+"""Test timing the stages of linting."""
+import pstats
+
+from lint381.c import user_includes_before_system_includes
+from lint381.cpp import linter as cpp_linter
+from lint381.profiling import Profile, timer
+
+
+def test_profile():
+    """Ensure that nested stages are counted in the enclosing stage."""
+    profile = Profile()
+    with profile.time("outer"):
+        for _ in range(2):
+            with profile.time("inner"):
+                pass
+    with timer(profile, "outer"):
+        pass
+    with timer(None, "ignored"):
+        pass
+
+    assert sorted(profile.stats) == ["inner", "outer"]
+    calls, own_time, total_time = profile.stats["outer"]
+    assert calls == 2
+    inner_calls, inner_own_time, inner_total_time = profile.stats["inner"]
+    assert inner_calls == 2
+    assert inner_own_time == inner_total_time
+    assert abs(own_time + inner_total_time - total_time) < 1e-9
+
+
+def test_wrap():
+    """Ensure that linting functions are timed and located."""
+    profile = Profile()
+
+    def func(x):
+        yield x
+        yield x + 1
+    assert profile.wrap("func", func)(1) == [1, 2]
+    assert profile.stats["func"][0] == 1
+    assert profile.locations["func"] == (__file__,
+                                         func.__code__.co_firstlineno)
+
+    profile.wrap("rule", user_includes_before_system_includes)
+    filename, _ = profile.locations["rule"]
+    assert filename.endswith("c.py")
+
+    profile.wrap("builtin", len)
+    assert "builtin" not in profile.locations
+
+
+def test_time_iter():
+    """Ensure that only producing each item is timed, as one call."""
+    profile = Profile()
+
+    def produce():
+        with profile.time("inner"):
+            yield 1
+        yield 2
+
+    items = []
+    for item in profile.time_iter("outer", produce()):
+        with profile.time("consumer"):
+            items.append(item)
+    assert items == [1, 2]
+    assert profile.stats["outer"][0] == 1
+    assert profile.stats["consumer"][0] == 2
+    assert profile.stats["outer"][2] < sum(
+        i[2] for i in profile.stats.values())
+
+
+def test_merge():
+    """Ensure that profiles from several workers are added together."""
+    first = Profile()
+    first.add("a", 1.0, 2.0)
+    second = Profile()
+    second.add("a", 0.5, 0.5, calls=3)
+    second.add("b", 1.0, 1.0)
+    second.locations["b"] = ("foo.py", 10)
+    first.analyses.hits["includes"] += 1
+    second.analyses.hits["includes"] += 2
+    second.analyses.misses["includes"] += 1
+
+    first.merge(second)
+    assert first.stats == {"a": [4, 1.5, 2.5], "b": [1, 1.0, 1.0]}
+    assert first.locations == {"b": ("foo.py", 10)}
+    assert first.analyses.hits == {"includes": 3}
+    assert first.analyses.misses == {"includes": 1}
+
+
+def test_format_table():
+    """Ensure that the table is sorted by the time spent in each stage."""
+    profile = Profile()
+    profile.add("tokenize", 1.0, 1.0)
+    profile.add("rule:remove_comments", 2.0, 2.0, calls=10)
+    lines = profile.format_table().splitlines()
+    assert lines[0].split() == ["stage", "calls", "own", "(s)", "total", "(s)"]
+    assert lines[1].split() == ["rule:remove_comments", "10",
+                                "2.000000", "2.000000"]
+    assert lines[2].split() == ["tokenize", "1", "1.000000", "1.000000"]
+    assert len(set(len(i) for i in lines)) == 1
+
+    assert Profile().format_table().split() == ["stage", "calls", "own",
+                                                "(s)", "total", "(s)"]
+
+
+def test_format_table_analyses():
+    """Ensure that we list how often each analysis was reused."""
+    profile = Profile()
+    profile.add("tokenize", 1.0, 1.0)
+    profile.analyses.hits["value_index"] += 3
+    profile.analyses.misses["value_index"] += 1
+    profile.analyses.misses["includes"] += 1
+    lines = profile.format_table().splitlines()
+    assert lines[2] == ""
+    assert lines[3].split() == ["analysis", "hits", "misses", "hit", "rate"]
+    assert lines[4].split() == ["includes", "0", "1", "0.0%"]
+    assert lines[5].split() == ["value_index", "3", "1", "75.0%"]
+    assert len(set(len(i) for i in lines[3:])) == 1
+
+
+def test_dump_stats(tmpdir):
+    """Ensure that the timings can be loaded with pstats."""
+    profile = Profile()
+    errors = cpp_linter.lint("foo.cpp", "unsigned x;\n", profile=profile)
+    assert errors == cpp_linter.lint("foo.cpp", "unsigned x;\n")
+    assert profile.stats["rule:prohibited_types"][0] == 1
+    assert profile.stats["tokenize"][0] == 1
+    assert profile.stats["match"][0] == 1
+
+    path = str(tmpdir.join("lint.prof"))
+    profile.dump_stats(path)
+    stats = pstats.Stats(path).stats
+    assert ("~", 0, "tokenize") in stats
+    assert any(name == "rule:prohibited_types" and filename.endswith("c.py")
+               for filename, _, name in stats)
+    assert stats[("~", 0, "match")][:2] == (1, 1)
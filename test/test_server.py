@@ -0,0 +1,351 @@
+"""Test the lint server and its client."""
+import io
+import json
+import os
+import socket
+import stat
+import threading
+
+from click.testing import CliRunner
+import pytest
+
+from lint381 import client, get_linter
+from lint381.__main__ import main
+from lint381.server import _diff, LintServer, LintService
+
+
+CODE = """\
+#include <stdio.h>
+#include "foo.h"
+unsigned x;
+enum foo { a, b };
+"""
+
+
+def request(code, **kwargs):
+    """Make a request to lint some code."""
+    message = {
+        "path": "/foo/foo.cpp",
+        "filename": "foo.cpp",
+        "code": code,
+        "lang": "cpp",
+    }
+    message.update(kwargs)
+    return message
+
+
+def cli_output(code, tmpdir, *args):
+    """Get the output of `lint381` for some code."""
+    path = tmpdir.join("foo.cpp")
+    path.write(code)
+    result = CliRunner().invoke(main, ["--no-cache", str(path)] + list(args))
+    return result.output
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    ("abc", "abc", (3, 3, "")),
+    ("abc", "abxc", (2, 2, "x")),
+    ("abc", "ac", (1, 2, "")),
+    ("aaa", "aaaa", (3, 3, "a")),
+    ("", "abc", (0, 0, "abc")),
+    ("abc", "xyz", (0, 3, "xyz")),
+])
+def test_diff(old, new, expected):
+    """Ensure that we find the edit between two strings."""
+    assert _diff(old, new) == expected
+    start, end, text = _diff(old, new)
+    assert old[:start] + text + old[end:] == new
+
+
+def test_service(tmpdir):
+    """Ensure that the service renders the same output as `lint381`."""
+    service = LintService()
+    response = service.handle(request(CODE))
+    assert response == {
+        "had_errors": True,
+        "output": cli_output(CODE, tmpdir),
+    }
+
+    # Lint edited versions of the file, reusing the earlier results.
+    for code in [CODE.replace("unsigned", "int"),
+                 CODE.replace("foo {", "Foo_e {"),
+                 CODE + "/* *** */\n",
+                 CODE + "/* ",
+                 CODE]:
+        response = service.handle(request(code))
+        assert response["output"] == cli_output(code, tmpdir)
+        assert response["had_errors"] == bool(response["output"])
+
+    response = service.handle(request("int x;\n"))
+    assert response == {"had_errors": False, "output": ""}
+
+
+def test_service_options(tmpdir):
+    """Ensure that the service handles the same options as `lint381`."""
+    service = LintService()
+
+    response = service.handle(request(CODE, range=[40, 60]))
+    assert response["output"] == cli_output(CODE, tmpdir, "--range", "40:60")
+
+    code = "\tunsigned x;\n"
+    response = service.handle(request(code, tab_width=8, lang="c"))
+    assert response["output"] == cli_output(code, tmpdir,
+                                            "--tab-width", "8",
+                                            "--lang", "c")
+
+    response = service.handle(request(code, color=True))
+    assert "\x1b[" in response["output"]
+
+    response = service.handle(request(CODE, ignore=["prohibited_types"]))
+    assert response["output"] == cli_output(CODE, tmpdir,
+                                            "--ignore", "prohibited_types")
+    assert len(service._states) == 3
+
+    response = service.handle(request(CODE, select=["prohibited_types"]))
+    assert response["output"] == cli_output(CODE, tmpdir,
+                                            "--select", "prohibited_types")
+
+
+def test_service_forgets_states():
+    """Ensure that only the most recently linted files are remembered."""
+    service = LintService(max_states=2)
+    for path in ["a", "b", "c", "b"]:
+        service.handle(request(CODE, path=path))
+    assert [i[0] for i in service._states] == ["c", "b"]
+
+    # A file with a different name isn't an edit of the same file.
+    response = service.handle(request(CODE, path="b", filename="bar.cpp"))
+    assert "should be first include" not in response["output"]
+    assert "bar.cpp:3:1: error: Prohibited type" in response["output"]
+
+
+@pytest.mark.parametrize("message", [
+    {},
+    {"lang": "cpp"},
+    {"filename": "foo.cpp", "code": "", "lang": "java"},
+    {"filename": "foo.cpp", "code": "", "lang": "cpp", "select": ["foo"]},
+    [],
+])
+def test_service_invalid_request(message):
+    """Ensure that we reject invalid requests."""
+    assert "error" in LintService().handle(message)
+
+
+@pytest.fixture
+def server(tmpdir):
+    """Run a server on a socket in the background.
+
+    :returns LintServer:
+    """
+    socket_path = str(tmpdir.join("sock"))
+    tmpdir.join("sock").write("stale")
+    server = LintServer(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+    assert not tmpdir.join("sock").check()
+
+
+def run_client(args, capsys):
+    """Run the client.
+
+    :returns tuple: The exit code and the output.
+    """
+    with pytest.raises(SystemExit) as e:
+        client.main(args)
+    return e.value.code, capsys.readouterr().out
+
+
+def test_client(server, tmpdir, capsys, monkeypatch):
+    """Ensure that the client prints the same output as `lint381`."""
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    args = ["--socket", server.server_address, "--lang=cpp", str(path)]
+
+    assert run_client(args, capsys) == (1, cli_output(CODE, tmpdir))
+    assert len(server.service._states) == 1
+
+    path.write("int x;\n")
+    assert run_client(args, capsys) == (0, "")
+
+    monkeypatch.setattr("sys.stdin.read", lambda: CODE)
+    code, output = run_client(["--socket=" + server.server_address,
+                               "--tab-width", "8",
+                               "--range", "40:60",
+                               "-"],
+                              capsys)
+    assert code == 1
+    assert output.startswith("<stdin>:3:1: error: Prohibited type")
+
+
+def test_client_config(server, tmpdir, capsys, monkeypatch):
+    """Ensure that the client sends the options from the config file."""
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    tmpdir.join("lint381.cfg").write("""\
+[lint381]
+tab-width = 8
+ignore = prohibited_types
+""")
+    monkeypatch.chdir(tmpdir)
+    args = ["--socket", server.server_address, str(path)]
+    assert run_client(args, capsys) == (
+        1, cli_output(CODE, tmpdir, "--ignore", "prohibited_types"))
+    assert run_client(args + ["--ignore="], capsys) == (
+        1, cli_output(CODE, tmpdir, "--ignore="))
+    assert len(server.service._states) == 2
+    assert all(i[2] == 8 for i in server.service._states)
+
+
+def test_client_detects_language(server, tmpdir, capsys):
+    """Ensure that the client detects the language of each file."""
+    tmpdir.join("foo.c").write("#define FOO 1\n")
+    tmpdir.join("foo.h").write("#define BAR 1\n")
+    args = ["--socket", server.server_address, str(tmpdir.join("foo.c")),
+            str(tmpdir.join("foo.h"))]
+    assert run_client(args, capsys) == (0, "")
+    assert [i[1] for i in server.service._states] == [get_linter("c")] * 2
+
+    code, output = run_client(args[:-1] + ["--lang=cpp"], capsys)
+    assert code == 1
+    assert output.startswith("foo.c:1:1: error: Use 'const'")
+
+
+def test_client_stdin_filename(server, tmpdir, capsys, monkeypatch):
+    """Ensure that the client lints standard input as the file it names."""
+    monkeypatch.setattr("sys.stdin.read", lambda: "#define FOO 1\n")
+    path = tmpdir.join("foo.c")
+    args = ["--socket", server.server_address, "--stdin",
+            "--stdin-filename", str(path)]
+    assert run_client(args, capsys) == (0, "")
+    assert list(server.service._states)[0][:2] == (str(path),
+                                                   get_linter("c"))
+
+    code, output = run_client(args + ["--lang", "cpp"], capsys)
+    assert code == 1
+    assert output.startswith("foo.c:1:1: error: Use 'const'")
+
+
+@pytest.mark.parametrize("options, exit_code", [
+    (["--mmap"], 1),
+    (["--jobs", "2"], 1),
+    (["--range", "foo"], 2),
+    (["--lang"], 2),
+    (["--lang"], None),
+    (["--tab-width", "x"], 2),
+    (["--config", "missing.cfg"], 2),
+    (["--select", "foo"], 2),
+])
+def test_client_fallback(server, tmpdir, capsys, options, exit_code):
+    """Ensure that the client lints in-process when it has to."""
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    args = ["--socket", server.server_address] + options + [str(path)]
+    if exit_code is None:
+        # The option is missing its value.
+        args = args[:-2] + args[-1:] + args[-2:-1]
+        exit_code = 2
+
+    code, output = run_client(args, capsys)
+    assert code == exit_code
+    assert not server.service._states
+    if exit_code == 1:
+        assert output == cli_output(CODE, tmpdir)
+
+
+def test_client_no_server(tmpdir, capsys, monkeypatch):
+    """Ensure that the client lints in-process without a server."""
+    monkeypatch.setenv("LINT381_SOCKET", str(tmpdir.join("missing")))
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    monkeypatch.setattr("sys.argv", ["lint381-client", str(path)])
+    assert run_client(None, capsys) == (1, cli_output(CODE, tmpdir))
+
+
+def test_client_no_server_stdin(tmpdir, capsys, monkeypatch):
+    """Ensure that standard input is linted in-process without a server."""
+    monkeypatch.setenv("LINT381_SOCKET", str(tmpdir.join("missing")))
+    monkeypatch.setattr("sys.stdin", io.StringIO("using std::cout;\n"))
+    code, output = run_client(["--stdin", "--stdin-filename", "foo.cpp"],
+                              capsys)
+    assert code == 1
+    assert output.startswith("foo.cpp:1:12: error: Unused symbol 'cout'")
+
+
+def test_client_bad_response(server, tmpdir, capsys, monkeypatch):
+    """Ensure that the client lints in-process if the server fails."""
+    monkeypatch.setattr(server.service, "handle",
+                        lambda request: {"error": "oops"})
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    args = ["--socket", server.server_address, str(path)]
+    assert run_client(args, capsys) == (1, cli_output(CODE, tmpdir))
+
+
+def test_invalid_json(server):
+    """Ensure that the server rejects requests which aren't JSON."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.server_address)
+        sock.sendall(b"{\n")
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline().decode())
+    assert "Invalid request" in response["error"]
+
+
+def test_default_socket_path(monkeypatch):
+    """Ensure that we find the socket path from the environment."""
+    monkeypatch.setenv("LINT381_SOCKET", "/foo.sock")
+    assert client.default_socket_path() == "/foo.sock"
+
+    monkeypatch.delenv("LINT381_SOCKET")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user")
+    assert client.default_socket_path() == "/run/user/lint381.sock"
+
+    # Otherwise, each user has a directory in the temporary directory.
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr("tempfile.tempdir", "/tmp")
+    expected = "/tmp/lint381-{}/lint381.sock".format(os.getuid())
+    assert client.default_socket_path() == expected
+
+
+def test_server_permissions(tmpdir):
+    """Ensure that only the user can access the socket."""
+    socket_path = str(tmpdir.join("run", "sock"))
+    server = LintServer(socket_path)
+    server.server_close()
+    assert stat.S_IMODE(tmpdir.join("run").stat().mode) == 0o700
+
+    # The socket was created with the user's umask restricted.
+    umask = os.umask(0o022)
+    server = LintServer(socket_path)
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+    assert os.umask(umask) == 0o022
+    server.server_close()
+
+
+def test_client_other_user(server, tmpdir, capsys, monkeypatch):
+    """Ensure that the client doesn't use another user's socket."""
+    monkeypatch.setattr(server.service, "handle",
+                        lambda request: {"had_errors": False, "output": ""})
+    uid = os.getuid()
+    monkeypatch.setattr("os.getuid", lambda: uid + 1)
+    path = tmpdir.join("foo.cpp")
+    path.write(CODE)
+    args = ["--socket", server.server_address, str(path)]
+    assert run_client(args, capsys) == (1, cli_output(CODE, tmpdir))
+
+
+def test_serve(tmpdir, monkeypatch):
+    """Ensure that `lint381 --serve` runs the server until interrupted."""
+    def serve_forever(self):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(LintServer, "serve_forever", serve_forever)
+    socket_path = str(tmpdir.join("sock"))
+    result = CliRunner().invoke(main, ["--serve", "--socket", socket_path])
+    assert result.exit_code == 0
+    assert socket_path in result.output
+    assert not tmpdir.join("sock").check()
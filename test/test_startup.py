@@ -0,0 +1,106 @@
+"""Test how much work is done when lint381 starts up."""
+import re
+import subprocess
+import sys
+
+import pytest
+
+import lint381
+from lint381 import get_linter, LANGUAGES
+
+
+STARTUP_BUDGETS = {
+    "lint381.client": 100,
+    "lint381.__main__": 400,
+}
+"""The most time, in milliseconds, that importing each module may take.
+
+This is measured with `python -X importtime`. These are several times the
+time taken on a typical machine, so that the test isn't flaky, but they
+catch an expensive import being added.
+"""
+
+
+def run(code):
+    """Run some code in a new interpreter.
+
+    :param str code: The code to run.
+    :returns tuple: The cumulative import time of each module imported, in
+        milliseconds, and the set of modules loaded by the end.
+    """
+    code += "\nimport sys\nprint('modules:', *sys.modules, file=sys.stderr)"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            universal_newlines=True,
+                            check=True)
+
+    times = {}
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r"^import time:\s+\d+ \|\s+(\d+) \| *(\S+)$", line)
+        if match:
+            times[match.group(2)] = int(match.group(1)) / 1000
+        elif line.startswith("modules:"):
+            modules.update(line.split()[1:])
+    return times, modules
+
+
+@pytest.mark.parametrize("module, budget", sorted(STARTUP_BUDGETS.items()))
+def test_startup_budget(module, budget):
+    """Ensure that importing lint381 is fast."""
+    times, _ = run("import {}".format(module))
+    assert times[module] < budget
+
+
+def test_client_imports():
+    """Ensure that the client only imports the standard library."""
+    _, modules = run("import lint381.client")
+    assert "click" not in modules
+    assert "lint381.linter" not in modules
+    assert "lint381.tokenizer" not in modules
+
+
+def test_cli_imports(tmpdir):
+    """Ensure that the CLI only loads what it needs."""
+    path = tmpdir.join("foo.c")
+    path.write("unsigned x;\n")
+    _, modules = run("""
+from lint381.__main__ import main
+try:
+    main(["--lang", "c", "--no-cache", {!r}])
+except SystemExit:
+    pass
+""".format(str(path)))
+    assert "lint381.c" in modules
+    assert "lint381.cpp" not in modules
+    assert "lint381.server" not in modules
+    assert "lint381.changes" not in modules
+    assert "multiprocessing" not in modules
+
+
+def test_lazy_token_patterns():
+    """Ensure that importing the tokenizer doesn't compile its regexes."""
+    run("""
+import re
+compile = re.compile
+def fail(*args, **kwargs):
+    raise AssertionError("compiled a regex at import")
+re.compile = fail
+import lint381.tokenizer
+re.compile = compile
+assert [i.value for i in lint381.tokenizer.tokenize("a b")] == ["a", "b"]
+assert "\\s*" in repr(lint381.tokenizer._Tokenizer._WHITESPACE_PATTERN)
+""")
+
+
+def test_get_linter():
+    """Ensure that we can load the linter for each language."""
+    for lang in LANGUAGES:
+        linter = get_linter(lang)
+        assert linter is get_linter(lang)
+        assert linter.linters
+
+    with pytest.raises(KeyError):
+        get_linter("java")
+    assert lint381.__version__
@@ -1,7 +1,24 @@
 """Test the code-manipulation functions."""
+import glob
+import os.path
+import re
+
 import pytest
+from reference_tokenizer import ReferenceTokenizer
 
-from lint381.tokenizer import Position, Token, tokenize
+from lint381.tokenizer import (
+    _LazyPattern,
+    BracketTable,
+    iter_tokens,
+    LineTable,
+    map_file,
+    Position,
+    retokenize,
+    Token,
+    TokenSlice,
+    TokenTable,
+    tokenize,
+)
 
 
 def test_tokenize():
@@ -153,3 +170,485 @@ def test_tokenize_unterminated_multiline_comment():
     """Ensure that we reject unterminated multiline comments."""
     with pytest.raises(ValueError):
         tokenize("/*")
+
+
+def test_token_offsets():
+    """Ensure that tokens record the offsets of their characters."""
+    code = "foo\n  /* bar\nbaz */ qux"
+    assert [(i.start_offset, i.end_offset) for i in tokenize(code)] == [
+        (0, 3),
+        (6, 19),
+        (20, 23),
+    ]
+    assert [code[i.start_offset:i.end_offset]
+            for i in tokenize(code)] == ["foo", "/* bar\nbaz */", "qux"]
+
+
+def test_token_positions_are_lazy():
+    """Ensure that we only build the line table when positions are needed."""
+    lines = LineTable("foo\nbar")
+    token = Token(type="identifier",
+                  value="bar",
+                  start_offset=4,
+                  end_offset=7,
+                  lines=lines)
+    assert lines._line_starts is None
+
+    assert token.start == Position(row=1, column=0)
+    assert token.end == Position(row=1, column=2)
+    assert list(lines.line_starts) == [0, 4]
+
+
+def test_line_table():
+    """Ensure that we convert offsets into positions correctly."""
+    lines = LineTable("ab\n\ncd\n")
+    assert lines.position(0) == Position(row=0, column=0)
+    assert lines.position(2) == Position(row=0, column=2)
+    assert lines.position(3) == Position(row=1, column=0)
+    assert lines.position(5) == Position(row=2, column=1)
+    assert lines.position(7) == Position(row=3, column=0)
+    assert lines.row(6) == 2
+
+
+def test_line_table_lines():
+    """Ensure that we can get the text of each line."""
+    lines = LineTable("foo\r\nbar\n\nbaz")
+    assert [lines.line(i) for i in range(4)] == ["foo", "bar", "", "baz"]
+
+    lines = LineTable(b"foo\n\xc3\xa9\n")
+    assert [lines.line(i) for i in range(3)] == ["foo", "\xe9", ""]
+
+
+def test_tokenize_tabs():
+    """Ensure that we compute columns from tab stops."""
+    code = "\tfoo\tbar\n  \tbaz"
+    assert [i.start for i in tokenize(code)] == [
+        Position(row=0, column=4),
+        Position(row=0, column=8),
+        Position(row=1, column=4),
+    ]
+    assert [i.start for i in tokenize(code, tab_width=8)] == [
+        Position(row=0, column=8),
+        Position(row=0, column=16),
+        Position(row=1, column=8),
+    ]
+    assert [i.start for i in iter_tokens(code.encode("utf-8"))] == [
+        Position(row=0, column=4),
+        Position(row=0, column=8),
+        Position(row=1, column=4),
+    ]
+
+
+def test_line_table_buffer():
+    """Ensure that columns in buffers count characters rather than bytes."""
+    code = "a\t\xe9\u65e5 b\n\xe9\n"
+    lines = LineTable(code.encode("utf-8"))
+    assert [lines.position(i) for i in [0, 1, 2, 3, 4, 5, 7, 8, 9, 11]] == [
+        Position(row=0, column=0),
+        Position(row=0, column=1),
+        Position(row=0, column=4),
+        # The offsets in a character are at the position of the character.
+        Position(row=0, column=4),
+        Position(row=0, column=5),
+        Position(row=0, column=5),
+        Position(row=0, column=6),
+        Position(row=0, column=7),
+        Position(row=0, column=8),
+        Position(row=1, column=0),
+    ]
+    assert lines.position(12) == Position(row=1, column=1)
+
+
+@pytest.mark.parametrize("space", [
+    "\x1c", "\x85", "\xa0", "\u2028", "\u3000", "\u00a0\u2003 ",
+])
+def test_iter_tokens_buffer_whitespace(space):
+    """Ensure that we skip the same whitespace in buffers as in strings."""
+    code = "int{}x;".format(space)
+    expected = tokenize(code)
+    actual = list(iter_tokens(code.encode("utf-8")))
+    assert actual == expected
+    assert [i.start for i in actual] == [i.start for i in expected]
+
+
+def test_line_table_tabs():
+    """Ensure that we expand tabs when displaying lines."""
+    lines = LineTable("a\tb\n", tab_width=8)
+    assert lines.line(0) == "a       b"
+    assert lines.position(2) == Position(row=0, column=8)
+
+
+@pytest.mark.parametrize("code", ["a\tb\t\tc\r\nd", b"a\tb\t\tc\r\nd"])
+def test_line_table_character_column(code):
+    """Ensure that we count the characters before a position."""
+    lines = LineTable(code, tab_width=8)
+    assert [lines.character_column(lines.position(i))
+            for i in [0, 1, 2, 3, 4, 5, 8]] == [0, 1, 2, 3, 4, 5, 0]
+    assert lines.character_column(Position(row=0, column=40)) == 6
+
+
+def test_token_equality():
+    """Ensure that tokens compare equal regardless of how they were made."""
+    token, = tokenize("foo")
+    same = Token(type="identifier",
+                 value="foo",
+                 start=Position(row=0, column=0),
+                 end=Position(row=0, column=2))
+    different = Token(type="identifier",
+                      value="foo",
+                      start=Position(row=1, column=0),
+                      end=Position(row=1, column=2))
+    assert token == same
+    assert not token != same
+    assert token != different
+    assert hash(token) == hash(same)
+    assert token != "foo"
+    assert repr(token) == repr(same)
+
+    first, second = tokenize("foo foo")
+    assert first == first
+    assert first != second
+
+
+def _integ_source_files():
+    """Get the source files used by the integration tests.
+
+    :returns list: A list of source code filenames.
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    pattern = os.path.join(script_dir, "integ", "*", "*")
+    return sorted(i for i in glob.glob(pattern) if not i.endswith(".out"))
+
+
+def _reference_tokenize(string):
+    """Tokenize a string with the reference tokenizer.
+
+    :returns list: A list of `Token`s in the string.
+    """
+    return list(ReferenceTokenizer(string).tokenize())
+
+
+@pytest.mark.parametrize("filename", _integ_source_files())
+def test_tokenize_matches_reference_on_integ(filename):
+    """Ensure that the tokenizer agrees with the reference tokenizer."""
+    with open(filename) as f:
+        code = f.read()
+    assert tokenize(code) == _reference_tokenize(code)
+
+
+@pytest.mark.parametrize("code", [
+    "double d = 1.5;",
+    "int integer = 0x10;",
+    "a >= b; a += 1; a >=+= b; x <<= 2; y >>= 1 << 3;",
+    "a->b; --a; !a != ~b; p::q ? r : s;",
+    "a // b\nc //\nd /",
+    "/*/ foo */ /**/ /* multi\nline */ x",
+    r"""'\'' "a\\" "b\\\"c" '\\'""",
+    "\"multi\nline\" x",
+    "#include <stdio.h>\n#define FOO(x) (x)",
+    "1.2.3 .5 42.",
+    "",
+    "   \n  ",
+])
+def test_tokenize_matches_reference(code):
+    """Ensure that the tokenizer agrees with the reference on edge cases."""
+    assert tokenize(code) == _reference_tokenize(code)
+
+
+@pytest.mark.parametrize("code", [
+    r"`",
+    "# include",
+    '"foo',
+    r'"foo\"',
+    "/*",
+    "/* foo *",
+])
+def test_tokenize_errors_match_reference(code):
+    """Ensure that both tokenizers reject the same malformed code."""
+    with pytest.raises(ValueError):
+        tokenize(code)
+    with pytest.raises(ValueError):
+        _reference_tokenize(code)
+
+
+@pytest.mark.parametrize("filename", _integ_source_files())
+def test_iter_tokens_buffer(filename):
+    """Ensure that we tokenize buffers the same way as strings."""
+    with open(filename, "rb") as f:
+        buffer = f.read()
+    code = buffer.decode("utf-8")
+
+    expected = tokenize(code)
+    actual = list(iter_tokens(buffer))
+    assert actual == expected
+
+    # The offsets into buffers are in bytes.
+    def byte_offset(offset):
+        return len(code[:offset].encode("utf-8"))
+    assert ([(i.start_offset, i.end_offset) for i in actual] ==
+            [(byte_offset(i.start_offset), byte_offset(i.end_offset))
+             for i in expected])
+
+
+@pytest.mark.parametrize("code", [
+    r"`",
+    "# include",
+    '"foo',
+    "/* foo *",
+])
+def test_iter_tokens_buffer_errors(code):
+    """Ensure that we reject malformed code in buffers."""
+    with pytest.raises(ValueError):
+        list(iter_tokens(code.encode("utf-8")))
+
+
+def test_map_file(tmpdir):
+    """Ensure that we can tokenize memory-mapped files."""
+    path = tmpdir.join("foo.cpp")
+    path.write("int foo; // \xe9\n")
+    with map_file(str(path)) as buffer:
+        assert [i.value for i in iter_tokens(buffer)] == [
+            "int",
+            "foo",
+            ";",
+            "// \xe9",
+        ]
+
+    path = tmpdir.join("empty.cpp")
+    path.write("")
+    with map_file(str(path)) as buffer:
+        assert list(iter_tokens(buffer)) == []
+
+
+def test_token_table():
+    """Ensure that the token table behaves like a list of tokens."""
+    tokens = tokenize("foo ( bar ) foo")
+    assert isinstance(tokens, TokenTable)
+    assert len(tokens) == 5
+    assert [i.value for i in tokens] == ["foo", "(", "bar", ")", "foo"]
+    assert [i.type for i in tokens] == [
+        "identifier",
+        "grouping",
+        "identifier",
+        "grouping",
+        "identifier",
+    ]
+    assert tokens[-1] == tokens[4]
+    assert tokens[-1].start == Position(row=0, column=12)
+    with pytest.raises(IndexError):
+        tokens[5]
+
+    # Values are only stored once.
+    assert tokens._values == ["foo", "(", "bar", ")"]
+
+    assert tokens.index(tokens[2]) == 2
+    assert tokens.index(Token(type="grouping",
+                              value=")",
+                              start=Position(row=0, column=10),
+                              end=Position(row=0, column=10))) == 3
+    with pytest.raises(ValueError):
+        tokens.index(tokenize("qux")[0])
+
+    assert tokens != "foo"
+    assert not tokens != list(tokens)
+    assert repr(tokenize("foo")) == "TokenTable([{!r}])".format(
+        tokenize("foo")[0])
+
+
+def test_token_table_from_tokens():
+    """Ensure that we can collect streamed tokens into a table."""
+    code = "foo bar"
+    tokens = TokenTable.from_tokens(iter_tokens(code))
+    assert tokens == tokenize(code)
+    assert tokens[1].start == Position(row=0, column=4)
+    assert len(TokenTable.from_tokens([])) == 0
+
+
+def test_token_neighbors():
+    """Ensure that token views can find their neighbors."""
+    tokens = tokenize("foo ( bar )")
+    bar = tokens[2]
+    assert bar.index == 2
+    assert bar.prev().value == "("
+    assert bar.next().value == ")"
+    assert tokens[0].prev() is None
+    assert tokens[-1].next() is None
+    assert [i.value for i in bar.slice(2)] == ["bar", ")"]
+    assert [i.value for i in bar.slice(5)] == ["bar", ")"]
+
+    token = Token(type="identifier", value="foo")
+    with pytest.raises(ValueError):
+        token.prev()
+    with pytest.raises(ValueError):
+        token.slice(2)
+
+
+def test_lazy_pattern():
+    """Ensure that lazy regexes are compiled on first use."""
+    pattern = _LazyPattern(r"a+", re.I)
+    assert repr(pattern) == "_LazyPattern('a+')"
+    assert "match" not in vars(pattern)
+    assert pattern.match("AAb").group() == "AA"
+    assert "match" in vars(pattern)
+    assert pattern.search("bab").start() == 1
+
+
+def test_token_slice():
+    """Ensure that slices of tokens are views which behave like lists."""
+    tokens = tokenize("a b c d e")
+    view = tokens[1:4]
+    assert isinstance(view, TokenSlice)
+    assert [i.value for i in view] == ["b", "c", "d"]
+    assert len(view) == 3
+    assert view[-1].value == "d"
+    with pytest.raises(IndexError):
+        view[3]
+
+    assert isinstance(view[1:], TokenSlice)
+    assert [i.value for i in view[1:]] == ["c", "d"]
+    assert [i.value for i in view[::2]] == ["b", "d"]
+    assert [i.value for i in tokens[::-2]] == ["e", "c", "a"]
+    assert len(tokens[4:2]) == 0
+
+    assert view == list(view)
+    assert not view != list(view)
+    assert view != "foo"
+    assert [i.value for i in [tokens[0]] + view] == ["a", "b", "c", "d"]
+    assert [i.value for i in view + [tokens[4]]] == ["b", "c", "d", "e"]
+    assert repr(tokens[0:1]) == "TokenSlice([{!r}])".format(tokens[0])
+
+
+def test_token_slice_view():
+    """Ensure that views of views refer to the underlying tokens."""
+    tokens = tokenize("a b c d e")
+    view = TokenSlice.view(tokens, 1, 10)
+    assert [i.value for i in view] == ["b", "c", "d", "e"]
+
+    inner = TokenSlice.view(view, 1, 3)
+    assert inner._tokens is tokens
+    assert [i.value for i in inner] == ["c", "d"]
+
+    listed = TokenSlice.view(list(tokens), 3, 5)
+    assert [i.value for i in listed] == ["d", "e"]
+
+
+def test_value_at():
+    """Ensure that we can look up token values by index."""
+    tokens = tokenize("a b c d e")
+    assert [tokens.value_at(i) for i in range(5)] == list("abcde")
+
+    view = tokens[1:4]
+    assert [view.value_at(i) for i in range(3)] == ["b", "c", "d"]
+    with pytest.raises(IndexError):
+        view.value_at(3)
+
+    listed = TokenSlice.view(list(tokens), 1, 4)
+    assert [listed.value_at(i) for i in range(3)] == ["b", "c", "d"]
+
+
+@pytest.mark.parametrize("start, end, text", [
+    # Inside a token, and extending a token.
+    (5, 6, "abc"),
+    (7, 7, "z"),
+    # Merging tokens into a comment.
+    (13, 14, ""),
+    (13, 13, "*"),
+    (3, 4, "//"),
+    # Opening a comment which swallows the rest of the line.
+    (0, 0, "// "),
+    # Inside a string and a comment.
+    (20, 21, "x"),
+    (34, 36, "*/ a /*"),
+    # Deleting and replacing everything.
+    (0, 48, ""),
+    (0, 48, "int x;"),
+    # At the end of the file.
+    (48, 48, " foo"),
+    (48, 48, "/"),
+])
+def test_retokenize(start, end, text):
+    """Ensure that re-tokenizing after an edit agrees with tokenizing."""
+    code = 'int foo = 1 / / 2; "str ing" /* comment */ bar;'
+    code = code + "\n"
+    tokens = tokenize(code)
+    new_code = code[:start] + text + code[end:]
+
+    edit = retokenize(tokens, start, end, text)
+    expected = tokenize(new_code)
+    assert edit.tokens == expected
+    assert ([(i.start_offset, i.end_offset) for i in edit.tokens] ==
+            [(i.start_offset, i.end_offset) for i in expected])
+    assert edit.tokens.lines.source == new_code
+
+    # Only the tokens in the returned range changed.
+    assert edit.tokens[:edit.first] == tokens[:edit.first]
+    assert ([i.value for i in edit.tokens[edit.new_stop:]] ==
+            [i.value for i in tokens[edit.old_stop:]])
+
+
+def test_retokenize_reuses_tokens():
+    """Ensure that only the tokens around an edit are re-tokenized."""
+    tokens = tokenize("a b c d e f")
+    edit = retokenize(tokens, 4, 5, "xyz")
+    assert [i.value for i in edit.tokens] == ["a", "b", "xyz", "d", "e", "f"]
+    assert (edit.first, edit.old_stop, edit.new_stop) == (2, 3, 3)
+    assert edit.tokens[3].start_offset == 8
+
+
+def test_retokenize_merges_tokens():
+    """Ensure that we re-tokenize tokens which can merge with an edit."""
+    tokens = tokenize("a //")
+    assert [i.value for i in tokens] == ["a", "/", "/"]
+    edit = retokenize(tokens, 4, 4, "*")
+    assert [i.value for i in edit.tokens] == ["a", "//*"]
+    assert edit.first == 1
+
+
+def test_retokenize_error():
+    """Ensure that we reject edits which can't be tokenized."""
+    tokens = tokenize("a b c")
+    with pytest.raises(ValueError):
+        retokenize(tokens, 2, 2, "/*")
+
+
+def test_token_table_span():
+    """Ensure that we find the tokens overlapping a range."""
+    tokens = tokenize("foo bar baz")
+    assert tokens.span(0, 11) == range(0, 3)
+    assert tokens.span(5, 6) == range(1, 2)
+    assert tokens.span(3, 4) == range(0, 2)
+    assert tokens.span(4, 4) == range(1, 2)
+    assert tokenize("").span(0, 0) == range(0, 0)
+
+
+def test_token_table_indexes():
+    """Ensure that we index the tokens by value and by row."""
+    tokens = tokenize("x y\n\nx /* a\nb */ z\n")
+    assert tokens.value_index() == {
+        "x": [0, 2],
+        "y": [1],
+        "/* a\nb */": [3],
+        "z": [4],
+    }
+    assert tokens.row_index() == [0, 2, 2, 4, 5, 5]
+    assert tokenize("").row_index() == [0, 0]
+
+
+def test_bracket_table():
+    """Ensure that we match up each kind of bracket separately."""
+    tokens = tokenize("f(a[0], {b}) ] ( [ ) { }")
+    for brackets in [BracketTable.from_tokens(tokens),
+                     BracketTable.from_tokens(list(tokens))]:
+        assert brackets.match(1) == 10
+        assert brackets.match(10) == 1
+        assert brackets.match(3) == 5
+        assert brackets.match(7) == 9
+        assert brackets.match(11) is None
+        assert brackets.match(12) == 14
+        assert brackets.match(13) is None
+        assert brackets.match(0) is None
+
+        assert brackets.next_opener("(", 0) == 1
+        assert brackets.next_opener("(", 2) == 12
+        assert brackets.next_opener("{", 10) == 15
+        assert brackets.next_opener("[", 14) is None
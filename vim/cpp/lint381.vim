@@ -20,6 +20,10 @@
     " Of course, precede 'lint381' with any other linters you may wish to use, e.g.:
       " let g:syntastic_cpp_checkers = ['cppcheck', 'lint381']
 
+  " Checks are faster if you keep a lint381 server running, by running
+  " `lint381 --serve &` when you log in. Otherwise, the client lints the file
+  " itself.
+
   " Note that if you have multiple checkers enabled, the default behavior of Syntastic
   " is to run them in sequence, continuing with the next checker ONLY once the previous
   " checker returns no errors. 
@@ -76,7 +80,10 @@ function! SyntaxCheckers_cpp_lint381_GetLocList() dict
                         \'Preprocess': 'Basenames_to_absolute_paths' })
 endfunction
 
-call g:SyntasticRegistry.CreateAndRegisterChecker({ 'filetype': 'cpp', 'name': 'lint381' })
+call g:SyntasticRegistry.CreateAndRegisterChecker({
+  \ 'filetype': 'cpp',
+  \ 'name': 'lint381',
+  \ 'exec': 'lint381-client'})
 
 let &cpo = s:save_cpo
 unlet s:save_cpo